@@ -0,0 +1,435 @@
+"""
+Admission control for every model call made by this process.
+
+Chat, single-task analysis, timer ticks and the background analysis passes
+started after each mutation all go through one AdmissionController, so they
+share the provider quota instead of racing for it:
+
+- Each model has a token bucket with AI_RPM requests per minute (AI_RPM_LIMITS
+  overrides it per model). Calls wait for a token instead of drawing a 429.
+  The limits are for the whole deployment: every one of the WEB_CONCURRENCY
+  worker processes gets an equal share.
+- At most AI_MAX_CONCURRENCY calls run at once. AI_INTERACTIVE_RESERVE of
+  those slots are kept for interactive calls.
+- Waiting calls are admitted by priority class (interactive, then timer,
+  then background). Within a class, users take turns, so one user's burst
+  does not starve everyone else.
+- Background calls are shed rather than queued past AI_SHED_QUEUE_DEPTH
+  waiting calls, and queued background calls are dropped to make room for
+  higher classes. Every class gives up after its AI_QUEUE_TIMEOUT.
+
+The class is taken from the caller's context (`priority()`), the user from
+AI usage attribution (`ai_usage.attribute()`). Both follow work into
+threads started with `app_logging.start_thread`.
+
+Environment:
+    AI_MAX_CONCURRENCY: Model calls in flight at once, default 64
+    AI_INTERACTIVE_RESERVE: Slots only interactive calls may use, default 8
+    AI_RPM: Requests per minute per model across all workers, default 1000;
+        0 turns rate limiting off
+    AI_RPM_LIMITS: JSON {"model": rpm} overriding AI_RPM per model
+    WEB_CONCURRENCY: Worker processes sharing the limits, default 1. A timer
+        sidecar (SCHEDULER_MODE=off) counts as one more; leave it room in AI_RPM
+    AI_RATE_BURST_SECONDS: Bucket capacity, in seconds of rate, default 10
+    AI_SHED_QUEUE_DEPTH: Queued calls beyond which background calls are shed, default 32
+    AI_QUEUE_TIMEOUT: JSON {"class": seconds} of longest waits, default
+        interactive 30, timer 60, background 120
+"""
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from ai_usage import current_user
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE, TIMER, BACKGROUND = 'interactive', 'timer', 'background'
+# Admission order
+CLASSES = (INTERACTIVE, TIMER, BACKGROUND)
+
+DEFAULT_QUEUE_TIMEOUTS = {INTERACTIVE: 30.0, TIMER: 60.0, BACKGROUND: 120.0}
+
+# Requests per minute per model for the whole deployment (a paid-tier Flash quota)
+DEFAULT_RPM = 1000
+
+# Longest a waiter sleeps before re-checking the buckets itself
+_POLL_SECONDS = 0.25
+
+_current_priority = contextvars.ContextVar('ai_priority', default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def priority(klass):
+    """Admit every model call made inside the block with priority class `klass`."""
+    if klass not in CLASSES:
+        raise ValueError(f"Unknown priority class: {klass}")
+    token = _current_priority.set(klass)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority():
+    return _current_priority.get()
+
+
+class AdmissionRejected(Exception):
+    """A model call was refused: shed under load or timed out waiting."""
+
+    def __init__(self, klass, reason):
+        super().__init__(f"{klass} model call {reason}")
+        self.klass = klass
+        self.reason = reason
+
+
+def _load_json_env(name):
+    raw = os.getenv(name)
+    if not raw:
+        return {}
+    try:
+        return dict(json.loads(raw))
+    except (ValueError, TypeError) as e:
+        logger.warning("Ignoring invalid %s: %s", name, e)
+        return {}
+
+
+class TokenBucket:
+    """
+    Requests-per-minute limit with a burst allowance.
+
+    Args:
+        rpm (float): Sustained requests per minute
+        burst_seconds (float): Capacity, as seconds' worth of the rate (at least one request)
+    """
+
+    def __init__(self, rpm, burst_seconds=10.0):
+        self.rate = rpm / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def wait_time(self, now):
+        """Seconds until a token is available."""
+        self._refill(now)
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+
+class _Ticket:
+    """A call waiting for admission, woken through an Event (threads) or a Future (coroutines)."""
+
+    __slots__ = ('model', 'klass', 'user', 'enqueued', 'state', 'event', 'future', 'loop')
+
+    def __init__(self, model, klass, user, loop=None):
+        self.model = model
+        self.klass = klass
+        self.user = user
+        self.enqueued = time.monotonic()
+        self.state = None  # 'granted' or a rejection reason
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def notify(self):
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionController:
+    """
+    Process-wide gate in front of the model API.
+
+    Use `admit(model)` around a blocking call or `admit_async(model)` around
+    an awaited one. Both raise AdmissionRejected when the call is shed or
+    times out waiting, and either way it never reaches the provider.
+
+    Args:
+        max_concurrency (int): Calls in flight at once
+        interactive_reserve (int): Slots other classes may not take
+        rpm (float): Default requests per minute per model across all workers, 0 for no limit
+        rpm_limits (dict): Model -> requests per minute, overriding `rpm`
+        workers (int): Processes sharing the limits, each allowed an equal share
+        burst_seconds (float): Token bucket capacity in seconds of rate
+        shed_depth (int): Queue depth at which background calls are shed
+        queue_timeouts (dict): Class -> longest wait in seconds
+        metrics: Metrics module exposing the ai_admission_* metrics
+    """
+
+    def __init__(self, max_concurrency=None, interactive_reserve=None, rpm=None, rpm_limits=None,
+                 burst_seconds=None, shed_depth=None, queue_timeouts=None, metrics=None, workers=None):
+        self.max_concurrency = max(1, max_concurrency or int(os.getenv('AI_MAX_CONCURRENCY', 64)))
+        reserve = interactive_reserve if interactive_reserve is not None else \
+            int(os.getenv('AI_INTERACTIVE_RESERVE', 8))
+        self.interactive_reserve = max(0, min(reserve, self.max_concurrency - 1))
+        self.rpm = float(rpm if rpm is not None else os.getenv('AI_RPM', DEFAULT_RPM))
+        self.rpm_limits = rpm_limits if rpm_limits is not None else _load_json_env('AI_RPM_LIMITS')
+        self.workers = max(1, workers or int(os.getenv('WEB_CONCURRENCY', 1)))
+        self.burst_seconds = float(burst_seconds or os.getenv('AI_RATE_BURST_SECONDS', 10))
+        self.shed_depth = shed_depth if shed_depth is not None else int(os.getenv('AI_SHED_QUEUE_DEPTH', 32))
+        self.queue_timeouts = dict(DEFAULT_QUEUE_TIMEOUTS)
+        self.queue_timeouts.update(queue_timeouts if queue_timeouts is not None else _load_json_env('AI_QUEUE_TIMEOUT'))
+        self.metrics = metrics
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._buckets = {}
+        # Class -> user -> FIFO of tickets; users are served round-robin
+        self._queues = {klass: OrderedDict() for klass in CLASSES}
+        self._queued = {klass: 0 for klass in CLASSES}
+        self._retry_in = None
+        self._admitted = {klass: 0 for klass in CLASSES}
+        self._rejected = {}
+
+    # --- Public API ---
+
+    @contextlib.contextmanager
+    def admit(self, model):
+        """Hold an admission slot for one blocking model call."""
+        self.acquire(model)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextlib.asynccontextmanager
+    async def admit_async(self, model):
+        """`admit` for coroutines; waiting does not block the event loop."""
+        await self.acquire_async(model)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self, model):
+        ticket = self._enter(model, None)
+        if ticket is None:
+            return
+        deadline = ticket.enqueued + self.queue_timeouts[ticket.klass]
+        while True:
+            ticket.event.wait(self._wait_time(deadline))
+            if self._settle(ticket, deadline):
+                return
+
+    async def acquire_async(self, model):
+        ticket = self._enter(model, asyncio.get_running_loop())
+        if ticket is None:
+            return
+        deadline = ticket.enqueued + self.queue_timeouts[ticket.klass]
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(asyncio.shield(ticket.future), self._wait_time(deadline))
+                except asyncio.TimeoutError:
+                    pass
+                if self._settle(ticket, deadline):
+                    return
+        except asyncio.CancelledError:
+            self._abandon(ticket)
+            raise
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch()
+        if self.metrics:
+            self.metrics.ai_admission_in_flight.dec()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': self._in_flight,
+                'max_concurrency': self.max_concurrency,
+                'interactive_reserve': self.interactive_reserve,
+                'queued': dict(self._queued),
+                'admitted': dict(self._admitted),
+                'rejected': {f"{klass}:{reason}": count for (klass, reason), count in self._rejected.items()},
+                'rate_limits': {model: round(bucket.rate * 60, 3) for model, bucket in self._buckets.items()
+                                if bucket is not None},
+            }
+
+    # --- Queueing ---
+
+    def _enter(self, model, loop):
+        """Admit at once when possible, otherwise queue a ticket. Returns None when admitted."""
+        klass, user = current_priority(), current_user()
+        ticket = _Ticket(model, klass, user, loop)
+        with self._lock:
+            if klass == BACKGROUND and self._depth() >= self.shed_depth:
+                self._count_rejection(klass, 'shed')
+                raise AdmissionRejected(klass, 'shed')
+            queue = self._queues[klass].setdefault(user, deque())
+            queue.append(ticket)
+            self._queued[klass] += 1
+            shed = self._shed_background()
+            self._dispatch()
+        for other in shed:
+            other.notify()
+        if ticket.state == 'granted':
+            self._granted(ticket)
+            return None
+        self._set_queue_gauges()
+        return ticket
+
+    def _settle(self, ticket, deadline):
+        """After a wake-up: True when admitted, raises when rejected, False to keep waiting."""
+        with self._lock:
+            if ticket.state is None:
+                self._dispatch()
+            if ticket.state is None and time.monotonic() >= deadline:
+                self._remove(ticket)
+                ticket.state = 'timeout'
+                self._count_rejection(ticket.klass, 'timeout')
+        if ticket.state is None:
+            return False
+        self._set_queue_gauges()
+        if ticket.state == 'granted':
+            self._granted(ticket)
+            return True
+        raise AdmissionRejected(ticket.klass, ticket.state)
+
+    def _abandon(self, ticket):
+        """A waiting coroutine was cancelled: drop its ticket, or hand back the slot it was given."""
+        with self._lock:
+            if ticket.state is None:
+                self._remove(ticket)
+                ticket.state = 'cancelled'
+            granted = ticket.state == 'granted'
+        if granted:
+            if self.metrics:
+                self.metrics.ai_admission_in_flight.inc()
+            self.release()
+        self._set_queue_gauges()
+
+    def _wait_time(self, deadline):
+        remaining = max(0.0, deadline - time.monotonic())
+        retry_in = self._retry_in if self._retry_in is not None else _POLL_SECONDS
+        return max(0.001, min(remaining, retry_in, _POLL_SECONDS))
+
+    def _depth(self):
+        return sum(self._queued.values())
+
+    def _remove(self, ticket):
+        users = self._queues[ticket.klass]
+        queue = users.get(ticket.user)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            self._queued[ticket.klass] -= 1
+            if not queue:
+                del users[ticket.user]
+
+    def _shed_background(self):
+        """Drop the newest queued background calls while the queue is past `shed_depth`."""
+        shed = []
+        users = self._queues[BACKGROUND]
+        while self._depth() > self.shed_depth and users:
+            user = next(reversed(users))
+            ticket = users[user][-1]
+            self._remove(ticket)
+            ticket.state = 'shed'
+            self._count_rejection(BACKGROUND, 'shed')
+            shed.append(ticket)
+        return shed
+
+    def _bucket(self, model):
+        if model not in self._buckets:
+            rpm = float(self.rpm_limits.get(model, self.rpm)) / self.workers
+            self._buckets[model] = TokenBucket(rpm, self.burst_seconds) if rpm > 0 else None
+        return self._buckets[model]
+
+    def _dispatch(self):
+        """Grant free slots to waiting tickets in class, then per-user round-robin, order. Caller holds the lock."""
+        now = time.monotonic()
+        granted = []
+        retry_in = None
+        while self._in_flight < self.max_concurrency:
+            ticket, wait = self._next_ticket(now)
+            if wait is not None:
+                retry_in = wait if retry_in is None else min(retry_in, wait)
+            if ticket is None:
+                break
+            ticket.state = 'granted'
+            self._in_flight += 1
+            granted.append(ticket)
+        self._retry_in = retry_in
+        for ticket in granted:
+            ticket.notify()
+
+    def _next_ticket(self, now):
+        """Pop the next admissible ticket. Returns (ticket, seconds until a rate-limited one could go)."""
+        wait = None
+        for klass in CLASSES:
+            if klass != INTERACTIVE and self._in_flight >= self.max_concurrency - self.interactive_reserve:
+                break
+            users = self._queues[klass]
+            for user in list(users):
+                queue = users[user]
+                # Oldest call of this user whose model has a token; a
+                # rate-limited model does not hold up calls to the others
+                limited = set()
+                for ticket in queue:
+                    if ticket.model in limited:
+                        continue
+                    bucket = self._bucket(ticket.model)
+                    if bucket is None or bucket.take(now):
+                        break
+                    limited.add(ticket.model)
+                    bucket_wait = bucket.wait_time(now)
+                    wait = bucket_wait if wait is None else min(wait, bucket_wait)
+                else:
+                    continue
+                queue.remove(ticket)
+                self._queued[klass] -= 1
+                if queue:
+                    users.move_to_end(user)  # Next turn goes to the other users
+                else:
+                    del users[user]
+                return ticket, wait
+        return None, wait
+
+    # --- Accounting ---
+
+    def _granted(self, ticket):
+        with self._lock:
+            self._admitted[ticket.klass] += 1
+        if self.metrics:
+            self.metrics.ai_admission_in_flight.inc()
+            self.metrics.observe_ai_admission(ticket.klass, time.monotonic() - ticket.enqueued)
+
+    def _count_rejection(self, klass, reason):
+        """Caller holds the lock."""
+        self._rejected[(klass, reason)] = self._rejected.get((klass, reason), 0) + 1
+        if self.metrics:
+            self.metrics.observe_ai_rejection(klass, reason)
+        if reason == 'shed':
+            logger.warning("Shedding %s model call: %d calls queued", klass, self._depth())
+
+    def _set_queue_gauges(self):
+        if not self.metrics:
+            return
+        with self._lock:
+            queued = dict(self._queued)
+        for klass, count in queued.items():
+            self.metrics.ai_admission_queued.set(count, priority=klass)
@@ -0,0 +1,230 @@
+"""
+Deadlines, retries, hedging and circuit breaking for AIService model calls.
+
+Every call gets a deadline per method (DEFAULT_DEADLINES), enforced as the
+request timeout passed to the SDK and, for coroutines, by cancelling it.
+Within that deadline:
+
+- Errors a retry can fix (429, 5xx, timeouts, dropped connections) are
+  retried up to AI_RETRY_ATTEMPTS times. Waits use full-jitter exponential
+  backoff, so callers that failed together do not retry together.
+- With AI_HEDGE_DELAY_MS set, an interactive call (HEDGED_METHODS) still
+  running after that long gets a duplicate request, and the first answer
+  wins.
+- A model whose calls keep failing has its circuit opened for
+  AI_BREAKER_COOLDOWN_SECONDS. Calls to it fail fast instead of queuing up
+  behind a degraded provider; one probe call then decides whether to
+  close the circuit.
+
+Methods whose answer is written back to tasks return AIUnavailable when no
+answer was obtained, never an empty answer, so a failed analysis cannot
+clear labels (see analysis.py).
+
+Environment:
+    AI_DEADLINES: JSON {"method": seconds} overriding DEFAULT_DEADLINES
+    AI_RETRY_ATTEMPTS: Attempts per call, the first included, default 3
+    AI_RETRY_BASE_SECONDS: Backoff before the first retry, default 0.5
+    AI_RETRY_MAX_SECONDS: Longest backoff, default 8
+    AI_HEDGE_DELAY_MS: Hedge interactive calls slower than this, default 0 (off)
+    AI_BREAKER_FAILURES: Consecutive failures that open a model's circuit, default 5
+    AI_BREAKER_COOLDOWN_SECONDS: How long an open circuit fails fast, default 30
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds from the first attempt until the caller gets an answer or a fallback
+DEFAULT_DEADLINES = {
+    'analyze_task': 30,
+    'chat_with_task_context': 30,
+    'generate_mindset_map': 45,
+    'name_mindset_themes': 30,
+    'execute_instruction': 60,
+    'analyze_importance': 90,
+    'analyze_priority': 90,
+    'analyze_duplicates': 90,
+    'analyze_labels': 90,
+    'analyze_trash': 90,
+}
+DEFAULT_DEADLINE = 60
+
+# Calls a user is waiting on, worth a duplicate request to cut tail latency
+HEDGED_METHODS = ('chat_with_task_context', 'analyze_task', 'generate_mindset_map')
+
+RETRIABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class AIUnavailable:
+    """
+    Result of a model call that produced no answer (error, timeout, open
+    circuit, shed, or no API key). Falsy like the empty answers it replaces,
+    but callers that write results check for it and write nothing.
+    """
+
+    def __init__(self, method, reason):
+        self.method = method
+        self.reason = reason
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return f"AIUnavailable({self.method!r}, {self.reason!r})"
+
+
+def unavailable(result):
+    return isinstance(result, AIUnavailable)
+
+
+class DeadlineExceeded(Exception):
+    """The method's deadline passed before the model answered."""
+
+
+class CircuitOpen(Exception):
+    """The model's circuit is open; the call was not made."""
+
+
+def is_retriable(error):
+    """Whether another attempt could succeed: throttling, server errors, timeouts and transport failures."""
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code in RETRIABLE_STATUS_CODES
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        import httpx
+    except ImportError:  # pragma: no cover - installed with google-genai
+        return False
+    return isinstance(error, httpx.TransportError)
+
+
+def is_provider_failure(error):
+    """Whether an error counts against the model's circuit."""
+    return isinstance(error, DeadlineExceeded) or is_retriable(error)
+
+
+def _load_deadlines():
+    deadlines = dict(DEFAULT_DEADLINES)
+    raw = os.getenv('AI_DEADLINES')
+    if raw:
+        try:
+            deadlines.update({method: float(seconds) for method, seconds in json.loads(raw).items()})
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning("Ignoring invalid AI_DEADLINES: %s", e)
+    return deadlines
+
+
+class RetryPolicy:
+    """
+    Per-method deadlines, retry budget, backoff and hedging delay.
+
+    Args:
+        deadlines (dict): Method -> seconds, merged over DEFAULT_DEADLINES
+        attempts (int): Attempts per call, the first included
+        base (float): Backoff ceiling before the first retry, in seconds
+        cap (float): Largest backoff ceiling, in seconds
+        hedge_delay (float): Seconds before an interactive call is hedged, 0 to disable
+    """
+
+    def __init__(self, deadlines=None, attempts=None, base=None, cap=None, hedge_delay=None, rng=None):
+        self.deadlines = _load_deadlines()
+        self.deadlines.update(deadlines or {})
+        self.attempts = max(1, attempts or int(os.getenv('AI_RETRY_ATTEMPTS', 3)))
+        self.base = float(base if base is not None else os.getenv('AI_RETRY_BASE_SECONDS', 0.5))
+        self.cap = float(cap if cap is not None else os.getenv('AI_RETRY_MAX_SECONDS', 8))
+        self.hedge_delay = float(hedge_delay if hedge_delay is not None
+                                 else float(os.getenv('AI_HEDGE_DELAY_MS', 0)) / 1000.0)
+        self._rng = rng or random.Random()
+
+    def deadline(self, method):
+        return self.deadlines.get(method, DEFAULT_DEADLINE)
+
+    def backoff(self, retry):
+        """Full-jitter wait before retry number `retry` (1 for the first retry)."""
+        return self._rng.uniform(0, min(self.cap, self.base * 2 ** (retry - 1)))
+
+    def hedge_after(self, method):
+        """Seconds after which to send a duplicate of this call, or None."""
+        if self.hedge_delay > 0 and method in HEDGED_METHODS:
+            return self.hedge_delay
+        return None
+
+
+class CircuitBreaker:
+    """
+    Per-model circuit: closed, open (fail fast) or half-open (one probe).
+
+    Args:
+        failures (int): Consecutive provider failures that open the circuit
+        cooldown (float): Seconds an open circuit fails fast before a probe
+        metrics: Metrics module exposing `observe_ai_circuit`
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failures=None, cooldown=None, metrics=None):
+        self.failures = max(1, failures or int(os.getenv('AI_BREAKER_FAILURES', 5)))
+        self.cooldown = float(cooldown if cooldown is not None else os.getenv('AI_BREAKER_COOLDOWN_SECONDS', 30))
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        # model -> [state, consecutive failures, opened or probe started at]
+        self._circuits = {}
+
+    def allow(self, model):
+        """Raise CircuitOpen unless a call to `model` may go ahead."""
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuits.setdefault(model, [self.CLOSED, 0, 0.0])
+            state, _, since = circuit
+            if state == self.CLOSED:
+                return
+            if now - since < self.cooldown:
+                # Open, or half-open with a probe in flight
+                raise CircuitOpen(f"circuit open for {model}")
+            # Cooldown over, or the last probe never reported back: send a probe
+            circuit[0], circuit[2] = self.HALF_OPEN, now
+        self._transition(model, self.HALF_OPEN)
+
+    def record(self, model, ok):
+        """Report the outcome of a call `allow()` let through."""
+        with self._lock:
+            circuit = self._circuits.setdefault(model, [self.CLOSED, 0, 0.0])
+            previous = circuit[0]
+            if ok:
+                circuit[:] = [self.CLOSED, 0, 0.0]
+            else:
+                circuit[1] += 1
+                if previous == self.HALF_OPEN or circuit[1] >= self.failures:
+                    circuit[0], circuit[2] = self.OPEN, time.monotonic()
+            state = circuit[0]
+        if state != previous:
+            self._transition(model, state)
+
+    def _transition(self, model, state):
+        if state == self.OPEN:
+            logger.warning("Circuit for %s opened; failing fast for %.0fs", model, self.cooldown)
+        else:
+            logger.info("Circuit for %s is %s", model, state)
+        if self.metrics:
+            self.metrics.observe_ai_circuit(model, state)
+
+    def stats(self):
+        with self._lock:
+            return {model: {'state': state, 'consecutive_failures': failures}
+                    for model, (state, failures, _) in self._circuits.items()}
+
+
+def with_timeout(config, seconds):
+    """Copy of a generate_content config carrying a per-request timeout."""
+    timeout_ms = max(1, int(seconds * 1000))
+    if config is None:
+        return {'http_options': {'timeout': timeout_ms}}
+    if isinstance(config, dict):
+        return dict(config, http_options={'timeout': timeout_ms})
+    from google.genai import types
+    return config.model_copy(update={'http_options': types.HttpOptions(timeout=timeout_ms)})
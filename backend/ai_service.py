@@ -1,19 +1,450 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
 import os
-from google import genai
+import threading
+import time
 import json
-from pydantic import BaseModel
+
+import startup
+from ai_admission import AdmissionController, AdmissionRejected
+from ai_resilience import (
+    AIUnavailable, CircuitBreaker, CircuitOpen, DeadlineExceeded, RetryPolicy, is_provider_failure, is_retriable,
+    with_timeout
+)
+from model_routing import CIRCUIT_FALLBACK, QUOTA_FALLBACK, ModelRouter, is_quota_error
+
+logger = logging.getLogger(__name__)
+
+JSON_CONFIG = {'response_mime_type': 'application/json'}
+
+
+class ModelCall:
+    """
+    A prepared model request: what to send, how to read the reply and what
+    to return instead if the call or the parse fails.
+
+    Args:
+        method (str): AIService method name, used for usage accounting and routing
+        contents: Prompt passed to generate_content
+        config: Optional generation config
+        items (int): Tasks in the prompt, for sizing the answer when routing
+        parse_json (bool): Hand the decoded JSON body to `handle` instead of the response
+        handle: Callable turning the response (or JSON body) into the method's result
+        fallback: Result returned when the call fails; AIUnavailable (the
+            class) returns an AIUnavailable carrying the error
+        error_message (str): Log format for failures, with one %s for the error
+
+    `model` and `fallback_model` are set by AIService from the method's route
+    (see model_routing.py) when the call runs.
+    """
+
+    def __init__(self, method, contents, config=None, parse_json=False, handle=None,
+                 fallback=None, error_message="AI Error: %s", items=0):
+        self.method = method
+        self.contents = contents
+        self.config = config
+        self.items = items
+        self.model = None
+        self.fallback_model = None
+        self.parse_json = parse_json
+        self.handle = handle or (lambda result: result)
+        self.fallback = fallback
+        self.error_message = error_message
+
+
+def _read_response(response, parse_json):
+    if not parse_json:
+        return response
+    # With response_mime_type='application/json', text should be parsed directly
+    # safely handling potentially non-parsed text if needed
+    if hasattr(response, 'parsed') and response.parsed:
+        return response.parsed
+    return json.loads(response.text)
+
+
+def _create_task_or_text(response):
+    # Process function calls
+    if response.candidates and response.candidates[0].content.parts:
+        for part in response.candidates[0].content.parts:
+            # Check for function_call attribute
+            fc = getattr(part, 'function_call', None)
+            if fc and fc.name == "create_task":
+                # Return structured response for app.py to handle
+                return {
+                    "action": "create_task",
+                    "task_data": dict(fc.args)
+                }
+
+    # If no function call, return text response
+    return response.text
+
 
 class AIService:
-    def __init__(self):
+    def __init__(self, usage=None, admission=None, retry=None, breaker=None, router=None, metrics=None):
+        # AIUsageTracker accounting for every model call, see ai_usage.py
+        self.usage = usage
+        # Rate limits, concurrency and priorities shared by all calls, see ai_admission.py
+        self.admission = admission if admission is not None else AdmissionController()
+        # Deadlines, retries, hedging and per-model circuits, see ai_resilience.py
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker(metrics=metrics)
+        # Model per call by method, prompt size and latency SLO, see model_routing.py
+        self.router = router or ModelRouter(metrics=metrics)
+        self.metrics = metrics
+        self._hedge_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=int(os.getenv('AI_HEDGE_WORKERS', 16)), thread_name_prefix='ai-hedge')
+        self._client = None
+        self._client_created = False
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """
+        The genai client, created on first use. Importing google.genai costs
+        most of a second, which cold starts would otherwise pay before
+        serving routes that never call the model. None without GEMINI_API_KEY.
+        """
+        if not self._client_created:
+            with self._client_lock:
+                if not self._client_created:
+                    with startup.phase('ai_client', section='lazy'):
+                        self._client = self._create_client()
+                    self._client_created = True
+        return self._client
+
+    @staticmethod
+    def _create_client():
         api_key = os.getenv("GEMINI_API_KEY")
+        if os.getenv("AI_BACKEND", "gemini") == "fake":
+            # Offline client for benchmarks and load tests, see fake_genai.py
+            from fake_genai import FakeGenAIClient
+            return FakeGenAIClient.from_env()
         if api_key:
-            self.client = genai.Client(api_key=api_key)
-        else:
-            self.client = None
+            from google import genai
+            return genai.Client(api_key=api_key)
+        return None
+
+    def _generate(self, method, model, contents, config=None, parse_json=False, timeout=None):
+        """
+        Send one generate_content call and account for it.
+
+        Args:
+            method (str): Calling AIService method, used as the accounting key
+            model (str): Gemini model name
+            contents: Prompt passed through to generate_content
+            config: Optional generation config
+            parse_json (bool): Return the decoded JSON body instead of the response
+            timeout (float): Request timeout in seconds, passed to the SDK
+
+        Returns:
+            The raw response, or the parsed JSON object when `parse_json` is set.
+            Model and decode errors are raised to the caller.
+        """
+        with self.admission.admit(model):
+            if timeout is not None:
+                config = with_timeout(config, timeout)
+            started = time.perf_counter()
+            response = None
+            outcome = 'error'
+            try:
+                response = self.client.models.generate_content(model=model, contents=contents, config=config)
+                outcome = 'parse_error'
+                result = _read_response(response, parse_json)
+                outcome = 'success'
+                return result
+            finally:
+                self._account(method, model, started, outcome, response)
+
+    async def _generate_async(self, method, model, contents, config=None, parse_json=False, timeout=None):
+        """`_generate` on the SDK's asyncio client (`client.aio`); the timeout also cancels the coroutine."""
+        async with self.admission.admit_async(model):
+            if timeout is not None:
+                config = with_timeout(config, timeout)
+            started = time.perf_counter()
+            response = None
+            outcome = 'error'
+            try:
+                request = self.client.aio.models.generate_content(model=model, contents=contents, config=config)
+                try:
+                    response = await asyncio.wait_for(request, timeout)
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded(f"{method} got no answer within {timeout:.1f}s") from None
+                outcome = 'parse_error'
+                result = _read_response(response, parse_json)
+                outcome = 'success'
+                return result
+            finally:
+                self._account(method, model, started, outcome, response)
+
+    def _account(self, method, model, started, outcome, response):
+        if self.usage:
+            self.usage.record(method, model, time.perf_counter() - started, outcome,
+                              getattr(response, 'usage_metadata', None))
+
+    def _call_model(self, call):
+        """
+        Run `call` under its deadline: circuit check, then attempts with
+        jittered backoff between retriable failures. A quota error or an
+        open circuit moves the call to its route's fallback model instead.
+        """
+        deadline = time.monotonic() + self.retry.deadline(call.method)
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"{call.method} deadline passed after {attempt} attempts")
+            self._allow(call)
+            attempt += 1
+            try:
+                result = self._hedged(call, remaining)
+            except (AdmissionRejected, CircuitOpen):
+                raise
+            except Exception as e:
+                self.breaker.record(call.model, not is_provider_failure(e))
+                if is_quota_error(e) and self._fall_back(call, QUOTA_FALLBACK, e):
+                    continue
+                delay = self._retry_delay(call, e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.breaker.record(call.model, True)
+            return result
+
+    async def _call_model_async(self, call):
+        deadline = time.monotonic() + self.retry.deadline(call.method)
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"{call.method} deadline passed after {attempt} attempts")
+            self._allow(call)
+            attempt += 1
+            try:
+                result = await self._hedged_async(call, remaining)
+            except (AdmissionRejected, CircuitOpen):
+                raise
+            except Exception as e:
+                self.breaker.record(call.model, not is_provider_failure(e))
+                if is_quota_error(e) and self._fall_back(call, QUOTA_FALLBACK, e):
+                    continue
+                delay = self._retry_delay(call, e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record(call.model, True)
+            return result
+
+    def _route(self, call):
+        route = self.router.route(call.method, call.contents, call.items)
+        call.model, call.fallback_model = route.model, route.fallback
+
+    def _allow(self, call):
+        """Circuit check; an open circuit moves the call to its fallback model when it has one."""
+        try:
+            self.breaker.allow(call.model)
+        except CircuitOpen as e:
+            if not self._fall_back(call, CIRCUIT_FALLBACK, e):
+                raise
+            self.breaker.allow(call.model)
+
+    def _fall_back(self, call, reason, error):
+        """Move `call` to its fallback model, once. Returns False when there is none left."""
+        if call.fallback_model is None:
+            return False
+        logger.warning("%s: %s unavailable (%s), falling back to %s",
+                       call.method, call.model, error, call.fallback_model)
+        call.model, call.fallback_model = call.fallback_model, None
+        self.router.record(call.method, call.model, reason)
+        return True
+
+    def _retry_delay(self, call, error, attempt, deadline):
+        """Backoff before the next attempt, or None when the error should be raised."""
+        if not is_retriable(error) or attempt >= self.retry.attempts:
+            return None
+        delay = self.retry.backoff(attempt)
+        if time.monotonic() + delay >= deadline:
+            return None
+        logger.warning("Retrying %s in %.2fs after attempt %d failed: %s", call.method, delay, attempt, error)
+        if self.metrics:
+            self.metrics.observe_ai_retry(call.method)
+        return delay
+
+    def _hedged(self, call, timeout):
+        """One attempt; for hedged methods, a duplicate request races a slow first one."""
+        hedge_after = self.retry.hedge_after(call.method)
+        if hedge_after is None or hedge_after >= timeout:
+            return self._generate(call.method, call.model, call.contents, call.config, call.parse_json, timeout)
+
+        def attempt(remaining):
+            # Each request runs in its own copy of the caller's context (attribution, priority)
+            return self._hedge_pool.submit(contextvars.copy_context().run, self._generate, call.method,
+                                           call.model, call.contents, call.config, call.parse_json, remaining)
+
+        started = time.monotonic()
+        primary = attempt(timeout)
+        done, _ = concurrent.futures.wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+        hedge = attempt(timeout - (time.monotonic() - started))
+        error = None
+        try:
+            for future in concurrent.futures.as_completed([primary, hedge],
+                                                          timeout=timeout - (time.monotonic() - started)):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                self._count_hedge(call, 'hedge' if future is hedge else 'primary')
+                return result
+        except concurrent.futures.TimeoutError:
+            error = DeadlineExceeded(f"{call.method} got no answer within {timeout:.1f}s")
+        self._count_hedge(call, 'none')
+        raise error
+
+    async def _hedged_async(self, call, timeout):
+        hedge_after = self.retry.hedge_after(call.method)
+        if hedge_after is None or hedge_after >= timeout:
+            return await self._generate_async(call.method, call.model, call.contents, call.config,
+                                              call.parse_json, timeout)
+
+        def attempt(remaining):
+            return asyncio.ensure_future(self._generate_async(call.method, call.model, call.contents, call.config,
+                                                              call.parse_json, remaining))
+
+        started = time.monotonic()
+        primary = attempt(timeout)
+        done, _ = await asyncio.wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+        pending = {primary, attempt(timeout - (time.monotonic() - started))}
+        hedge = next(task for task in pending if task is not primary)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._count_hedge(call, 'hedge' if task is hedge else 'primary')
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        self._count_hedge(call, 'none')
+        raise error
+
+    def _count_hedge(self, call, winner):
+        if self.metrics:
+            self.metrics.observe_ai_hedge(call.method, winner)
+
+    def _fallback(self, call, error):
+        # Analyses whose answers are written back must not mistake a failure for "nothing found"
+        if call.fallback is AIUnavailable:
+            return AIUnavailable(call.method, str(error))
+        return call.fallback
+
+    def _run(self, call):
+        """Execute a request built by one of the `_*_call` methods and apply its handler."""
+        if not isinstance(call, ModelCall):
+            return call
+        try:
+            self._route(call)
+            return call.handle(self._call_model(call))
+        except (AdmissionRejected, CircuitOpen) as e:
+            logger.warning("AI call %s not made: %s", call.method, e)
+            return self._fallback(call, e)
+        except Exception as e:
+            logger.error(call.error_message, e)
+            return self._fallback(call, e)
+
+    async def _run_async(self, call):
+        if not isinstance(call, ModelCall):
+            return call
+        try:
+            self._route(call)
+            return call.handle(await self._call_model_async(call))
+        except (AdmissionRejected, CircuitOpen) as e:
+            logger.warning("AI call %s not made: %s", call.method, e)
+            return self._fallback(call, e)
+        except Exception as e:
+            logger.error(call.error_message, e)
+            return self._fallback(call, e)
+
+    # Each public method has a blocking form and an `_async` form for the
+    # ASGI app (asgi.py). Both run the request built by the matching
+    # `_<method>_call`, which returns a ModelCall, or the final value when
+    # no model call is needed (missing API key, nothing to analyze).
 
     def analyze_task(self, task_title, updates):
+        return self._run(self._analyze_task_call(task_title, updates))
+
+    async def analyze_task_async(self, task_title, updates):
+        return await self._run_async(self._analyze_task_call(task_title, updates))
+
+    def analyze_importance(self, tasks):
+        return self._run(self._analyze_importance_call(tasks))
+
+    async def analyze_importance_async(self, tasks):
+        return await self._run_async(self._analyze_importance_call(tasks))
+
+    def analyze_priority(self, tasks):
+        return self._run(self._analyze_priority_call(tasks))
+
+    async def analyze_priority_async(self, tasks):
+        return await self._run_async(self._analyze_priority_call(tasks))
+
+    def analyze_duplicates(self, tasks):
+        return self._run(self._analyze_duplicates_call(tasks))
+
+    async def analyze_duplicates_async(self, tasks):
+        return await self._run_async(self._analyze_duplicates_call(tasks))
+
+    def chat_with_task_context(self, user_message, tasks_context, agent_context=None):
+        return self._run(self._chat_with_task_context_call(user_message, tasks_context, agent_context))
+
+    async def chat_with_task_context_async(self, user_message, tasks_context, agent_context=None):
+        return await self._run_async(self._chat_with_task_context_call(user_message, tasks_context, agent_context))
+
+    def execute_instruction(self, instruction, task_context, current_time):
+        return self._run(self._execute_instruction_call(instruction, task_context, current_time))
+
+    async def execute_instruction_async(self, instruction, task_context, current_time):
+        return await self._run_async(self._execute_instruction_call(instruction, task_context, current_time))
+
+    def generate_mindset_map(self, tasks):
+        return self._run(self._generate_mindset_map_call(tasks))
+
+    async def generate_mindset_map_async(self, tasks):
+        return await self._run_async(self._generate_mindset_map_call(tasks))
+
+    def name_mindset_themes(self, themes):
+        return self._run(self._name_mindset_themes_call(themes))
+
+    async def name_mindset_themes_async(self, themes):
+        return await self._run_async(self._name_mindset_themes_call(themes))
+
+    def analyze_labels(self, tasks, available_labels):
+        return self._run(self._analyze_labels_call(tasks, available_labels))
+
+    async def analyze_labels_async(self, tasks, available_labels):
+        return await self._run_async(self._analyze_labels_call(tasks, available_labels))
+
+    def analyze_trash(self, tasks):
+        return self._run(self._analyze_trash_call(tasks))
+
+    async def analyze_trash_async(self, tasks):
+        return await self._run_async(self._analyze_trash_call(tasks))
+
+    # Request builders
+
+    def _analyze_task_call(self, task_title, updates):
         if not self.client:
-            print("AI Service: Missing API Key")
+            logger.warning("AI Service: Missing API Key")
             return {
                 "summary": "AI not configured (Gemini 3.0)",
                 "suggestions": "Please set GEMINI_API_KEY in .env",
@@ -38,31 +469,14 @@ class AIService:
         - importance: An integer 1-5 (5 is highest).
         """
         
-        try:
-            # Using Gemini 3.0 Flash Preview (Pro has quota limits)
-            response = self.client.models.generate_content(
-                model='gemini-3-flash-preview', 
-                contents=prompt,
-                config={
-                    'response_mime_type': 'application/json'
-                }
-            )
-            
-            # With response_mime_type='application/json', text should be parsed directly
-            # safely handling potentially non-parsed text if needed
-            if hasattr(response, 'parsed') and response.parsed:
-                return response.parsed
-            
-            text = response.text
-            return json.loads(text)
-        except Exception as e:
-            print(f"AI Error: {e}")
-            return None
+        # Model picked by model_routing.DEFAULT_ROUTES (Gemini 3 Flash; Pro has quota limits)
+        return ModelCall('analyze_task', prompt, config=JSON_CONFIG, parse_json=True,
+                         fallback=None, error_message="AI Error: %s")
 
-    def analyze_importance(self, tasks):
+    def _analyze_importance_call(self, tasks):
         if not self.client:
-            print("AI Service: Missing API Key")
-            return []
+            logger.warning("AI Service: Missing API Key")
+            return AIUnavailable('analyze_importance', "GEMINI_API_KEY is not set")
 
         if not tasks:
             return []
@@ -98,34 +512,19 @@ class AIService:
         }}
         """
         
-        try:
-            response = self.client.models.generate_content(
-                model='gemini-3-flash-preview', 
-                contents=prompt,
-                config={
-                    'response_mime_type': 'application/json'
-                }
-            )
-            
-            if hasattr(response, 'parsed') and response.parsed:
-                return {
-                    "critical_task_ids": response.parsed.get('critical_task_ids', []),
-                    "notable_task_ids": response.parsed.get('notable_task_ids', [])
-                }
-            
-            data = json.loads(response.text)
-            return {
+        return ModelCall(
+            'analyze_importance', prompt, config=JSON_CONFIG, parse_json=True, items=len(tasks),
+            handle=lambda data: {
                 "critical_task_ids": data.get('critical_task_ids', []),
                 "notable_task_ids": data.get('notable_task_ids', [])
-            }
-        except Exception as e:
-            print(f"AI Analysis Error: {e}")
-            return []
+            },
+            fallback=AIUnavailable, error_message="AI Analysis Error: %s"
+        )
 
-    def analyze_priority(self, tasks):
+    def _analyze_priority_call(self, tasks):
         if not self.client:
-            print("AI Service: Missing API Key")
-            return []
+            logger.warning("AI Service: Missing API Key")
+            return AIUnavailable('analyze_priority', "GEMINI_API_KEY is not set")
 
         if not tasks:
             return []
@@ -155,28 +554,14 @@ class AIService:
         }}
         """
         
-        try:
-            response = self.client.models.generate_content(
-                model='gemini-2.0-flash-exp', 
-                contents=prompt,
-                config={
-                    'response_mime_type': 'application/json'
-                }
-            )
-            
-            if hasattr(response, 'parsed') and response.parsed:
-                return response.parsed.get('top_priority_task_ids', [])
-            
-            data = json.loads(response.text)
-            return data.get('top_priority_task_ids', [])
-        except Exception as e:
-            print(f"AI Priority Analysis Error: {e}")
-            return []
+        return ModelCall('analyze_priority', prompt, config=JSON_CONFIG, parse_json=True, items=len(tasks),
+                         handle=lambda data: data.get('top_priority_task_ids', []),
+                         fallback=AIUnavailable, error_message="AI Priority Analysis Error: %s")
 
-    def analyze_duplicates(self, tasks):
+    def _analyze_duplicates_call(self, tasks):
         if not self.client:
-            print("AI Service: Missing API Key")
-            return []
+            logger.warning("AI Service: Missing API Key")
+            return AIUnavailable('analyze_duplicates', "GEMINI_API_KEY is not set")
 
         if not tasks or len(tasks) < 2:
             return []
@@ -204,25 +589,11 @@ class AIService:
         }}
         """
         
-        try:
-            response = self.client.models.generate_content(
-                model='gemini-2.0-flash-exp', 
-                contents=prompt,
-                config={
-                    'response_mime_type': 'application/json'
-                }
-            )
-            
-            if hasattr(response, 'parsed') and response.parsed:
-                return response.parsed.get('duplicate_task_ids', [])
-            
-            data = json.loads(response.text)
-            return data.get('duplicate_task_ids', [])
-        except Exception as e:
-            print(f"AI Duplicate Analysis Error: {e}")
-            return []
+        return ModelCall('analyze_duplicates', prompt, config=JSON_CONFIG, parse_json=True, items=len(tasks),
+                         handle=lambda data: data.get('duplicate_task_ids', []),
+                         fallback=AIUnavailable, error_message="AI Duplicate Analysis Error: %s")
 
-    def chat_with_task_context(self, user_message, tasks_context, agent_context=None):
+    def _chat_with_task_context_call(self, user_message, tasks_context, agent_context=None):
         if not self.client:
             return "I can't help you with that right now because the API key is missing."
 
@@ -329,89 +700,67 @@ CREATING TASKS:
         If asked to summarize, use the provided task list.
         """
 
-        try:
-            # If agent has add_task skill, use function calling
-            if has_add_task:
-                from google.genai import types
-                
-                # Define the create_task tool
-                create_task_declaration = types.FunctionDeclaration(
-                    name="create_task",
-                    description="Create a new task in the task management system",
-                    parameters={
-                        "type": "object",
-                        "properties": {
-                            "title": {
-                                "type": "string",
-                                "description": "The title of the task"
-                            },
-                            "priority": {
-                                "type": "string",
-                                "description": "Priority level",
-                                "enum": ["low", "medium", "high"]
-                            },
-                            "category": {
-                                "type": "string",
-                                "description": "Task category (e.g., Development, Design, Business)"
-                            },
-                            "labels": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                                "description": "List of labels/tags for the task"
-                            },
-                            "initial_update": {
-                                "type": "string",
-                                "description": "Initial description or update for the task"
-                            }
+        contents = f"{system_instruction}\n\nUser: {user_message}"
+        fallback = "I encountered an error trying to process your request."
+
+        # If agent has add_task skill, use function calling
+        if has_add_task:
+            from google.genai import types
+
+            # Define the create_task tool
+            create_task_declaration = types.FunctionDeclaration(
+                name="create_task",
+                description="Create a new task in the task management system",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "title": {
+                            "type": "string",
+                            "description": "The title of the task"
                         },
-                        "required": ["title"]
-                    }
-                )
-                
-                task_tool = types.Tool(function_declarations=[create_task_declaration])
-                
-                # We use regular chat logic but with tools enabled
-                # Using gemini-2.0-flash-exp for better tool use reliability
-                response = self.client.models.generate_content(
-                    model='gemini-2.0-flash-exp',
-                    contents=f"{system_instruction}\n\nUser: {user_message}",
-                    config=types.GenerateContentConfig(
-                        tools=[task_tool],
-                        temperature=0.7
-                    )
-                )
-                
-                # Process function calls
-                if response.candidates and response.candidates[0].content.parts:
-                    for part in response.candidates[0].content.parts:
-                        # Check for function_call attribute
-                        fc = getattr(part, 'function_call', None)
-                        if fc and fc.name == "create_task":
-                            # Return structured response for app.py to handle
-                            return {
-                                "action": "create_task",
-                                "task_data": dict(fc.args)
-                            }
-                
-                # If no function call, return text response
-                return response.text
-                
-            else:
-                # Regular chat without function calling
-                response = self.client.models.generate_content(
-                    model='gemini-2.0-flash-exp', # Use Flash 2.0 for consistent quality
-                    contents=f"{system_instruction}\n\nUser: {user_message}",
-                )
-                return response.text
-                
-        except Exception as e:
-            print(f"Chat Error: {e}")
-            return "I encountered an error trying to process your request."
+                        "priority": {
+                            "type": "string",
+                            "description": "Priority level",
+                            "enum": ["low", "medium", "high"]
+                        },
+                        "category": {
+                            "type": "string",
+                            "description": "Task category (e.g., Development, Design, Business)"
+                        },
+                        "labels": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "List of labels/tags for the task"
+                        },
+                        "initial_update": {
+                            "type": "string",
+                            "description": "Initial description or update for the task"
+                        }
+                    },
+                    "required": ["title"]
+                }
+            )
 
+            task_tool = types.Tool(function_declarations=[create_task_declaration])
 
-    def execute_instruction(self, instruction, task_context, current_time):
+            # We use regular chat logic but with tools enabled
+            return ModelCall(
+                'chat_with_task_context', contents,
+                config=types.GenerateContentConfig(
+                    tools=[task_tool],
+                    temperature=0.7
+                ),
+                handle=_create_task_or_text, fallback=fallback, error_message="Chat Error: %s"
+            )
+
+        # Regular chat without function calling
+        return ModelCall('chat_with_task_context', contents, handle=lambda response: response.text,
+                         fallback=fallback, error_message="Chat Error: %s")
+
+
+    def _execute_instruction_call(self, instruction, task_context, current_time):
         if not self.client:
-            print("AI Service: Missing API Key")
+            logger.warning("AI Service: Missing API Key")
             return None
 
         prompt = f"""
@@ -436,26 +785,12 @@ CREATING TASKS:
         }}
         """
         
-        try:
-            response = self.client.models.generate_content(
-                model='gemini-2.0-flash-exp', 
-                contents=prompt,
-                config={
-                    'response_mime_type': 'application/json'
-                }
-            )
-            
-            if hasattr(response, 'parsed') and response.parsed:
-                return response.parsed
-                
-            return json.loads(response.text)
-        except Exception as e:
-            print(f"Instruction Error: {e}")
-            return None
+        return ModelCall('execute_instruction', prompt, config=JSON_CONFIG, parse_json=True,
+                         fallback=None, error_message="Instruction Error: %s")
 
-    def generate_mindset_map(self, tasks):
+    def _generate_mindset_map_call(self, tasks):
         if not self.client:
-            print("AI Service: Missing API Key")
+            logger.warning("AI Service: Missing API Key")
             return None
 
         if not tasks:
@@ -495,28 +830,48 @@ CREATING TASKS:
         }}
         """
         
-        try:
-            response = self.client.models.generate_content(
-                model='gemini-2.0-flash-exp', 
-                contents=prompt,
-                config={
-                    'response_mime_type': 'application/json'
-                }
-            )
-            
-            if hasattr(response, 'parsed') and response.parsed:
-                return response.parsed
-                
-            return json.loads(response.text)
-        except Exception as e:
-            print(f"Mindset Map Error: {e}")
+        return ModelCall('generate_mindset_map', prompt, config=JSON_CONFIG, parse_json=True, items=len(tasks),
+                         fallback=None, error_message="Mindset Map Error: %s")
+
+
+    def _name_mindset_themes_call(self, themes):
+        """Names for locally clustered themes (theme_clustering.py), given their keywords and sample titles."""
+        if not self.client:
             return None
 
+        if not themes:
+            return []
 
-    def analyze_labels(self, tasks, available_labels):
+        themes_text = ""
+        for i, theme in enumerate(themes, 1):
+            themes_text += f"{i}. Keywords: {', '.join(theme['keywords']) or 'none'}\n"
+            themes_text += "".join(f"   - {title}\n" for title in theme['titles'])
+
+        prompt = f"""
+        These are groups of a user's tasks, each with its keywords and some example task titles.
+        Name each theme of the user's Mindset Map with a short, high-level, abstract PHASE or THEME
+        of their life/work (e.g. "Building Foundation", "Exploration", "Health & Self"), and write a
+        one-sentence philosophical summary of why it is a focus.
+
+        Groups:
+        {themes_text}
+
+        Return a JSON object with one entry per group, in the same order:
+        {{
+            "themes": [
+                {{ "name": "THEME NAME", "description": "Short summary." }}
+            ]
+        }}
+        """
+
+        return ModelCall('name_mindset_themes', prompt, config=JSON_CONFIG, parse_json=True, items=len(themes),
+                         handle=lambda data: data.get('themes', []),
+                         fallback=None, error_message="Mindset Naming Error: %s")
+
+    def _analyze_labels_call(self, tasks, available_labels):
         if not self.client:
-            print("AI Service: Missing API Key")
-            return {}
+            logger.warning("AI Service: Missing API Key")
+            return AIUnavailable('analyze_labels', "GEMINI_API_KEY is not set")
 
         if not tasks or not available_labels:
             return {}
@@ -551,28 +906,14 @@ CREATING TASKS:
         }}
         """
         
-        try:
-            response = self.client.models.generate_content(
-                model='gemini-2.0-flash-exp', 
-                contents=prompt,
-                config={
-                    'response_mime_type': 'application/json'
-                }
-            )
-            
-            if hasattr(response, 'parsed') and response.parsed:
-                return response.parsed.get('task_labels', {})
-            
-            data = json.loads(response.text)
-            return data.get('task_labels', {})
-        except Exception as e:
-            print(f"AI Label Analysis Error: {e}")
-            return {}
+        return ModelCall('analyze_labels', prompt, config=JSON_CONFIG, parse_json=True, items=len(tasks),
+                         handle=lambda data: data.get('task_labels', {}),
+                         fallback=AIUnavailable, error_message="AI Label Analysis Error: %s")
 
-    def analyze_trash(self, tasks):
+    def _analyze_trash_call(self, tasks):
         if not self.client:
-            print("AI Service: Missing API Key")
-            return []
+            logger.warning("AI Service: Missing API Key")
+            return AIUnavailable('analyze_trash', "GEMINI_API_KEY is not set")
 
         if not tasks:
             return []
@@ -599,20 +940,6 @@ CREATING TASKS:
         }}
         """
         
-        try:
-            response = self.client.models.generate_content(
-                model='gemini-2.0-flash-exp', 
-                contents=prompt,
-                config={
-                    'response_mime_type': 'application/json'
-                }
-            )
-            
-            if hasattr(response, 'parsed') and response.parsed:
-                return response.parsed.get('trash_task_ids', [])
-            
-            data = json.loads(response.text)
-            return data.get('trash_task_ids', [])
-        except Exception as e:
-            print(f"AI Trash Analysis Error: {e}")
-            return []
+        return ModelCall('analyze_trash', prompt, config=JSON_CONFIG, parse_json=True, items=len(tasks),
+                         handle=lambda data: data.get('trash_task_ids', []),
+                         fallback=AIUnavailable, error_message="AI Trash Analysis Error: %s")
@@ -0,0 +1,305 @@
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, UpdateOne
+
+from traffic_rollups import bucket_start
+
+logger = logging.getLogger(__name__)
+
+# List prices in USD per million tokens: (input, output). Override with
+# AI_PRICING='{"model-name": [input, output]}'; unknown models cost 0.
+DEFAULT_PRICING = {
+    'gemini-3-flash-preview': (0.50, 3.00),
+    'gemini-2.0-flash-exp': (0.10, 0.40),
+    'gemini-2.0-flash': (0.10, 0.40),
+    'gemini-2.5-flash': (0.30, 2.50),
+}
+
+# User the current model call is billed to. Set around request handlers and
+# timer jobs with `attribute()`; background analyses run unattributed.
+_current_user = contextvars.ContextVar('ai_usage_user', default=None)
+
+
+@contextlib.contextmanager
+def attribute(user_email):
+    """Attribute every AI call made inside the block to `user_email`."""
+    token = _current_user.set(user_email)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+def current_user():
+    return _current_user.get()
+
+
+def load_pricing():
+    pricing = dict(DEFAULT_PRICING)
+    raw = os.getenv('AI_PRICING')
+    if raw:
+        try:
+            pricing.update({model: tuple(prices) for model, prices in json.loads(raw).items()})
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning("Ignoring invalid AI_PRICING: %s", e)
+    return pricing
+
+
+def _token_counts(usage_metadata):
+    """Read (prompt, output, cached) token counts off a response's usage_metadata."""
+    if usage_metadata is None:
+        return 0, 0, 0
+    prompt = getattr(usage_metadata, 'prompt_token_count', None) or 0
+    # Thinking tokens are billed as output on the models that emit them
+    output = (getattr(usage_metadata, 'candidates_token_count', None) or 0) + \
+             (getattr(usage_metadata, 'thoughts_token_count', None) or 0)
+    cached = getattr(usage_metadata, 'cached_content_token_count', None) or 0
+    return prompt, output, cached
+
+
+class AIUsageTracker:
+    """
+    Token, latency and cost accounting for AIService model calls.
+
+    Every call is kept in an in-memory ring buffer and folded into running
+    totals per (method, model) for the summary endpoint. When a LogBuffer is
+    attached, each call is also written behind the request to `ai_calls`
+    (expired by TTL) and, on flush, rolled up into `ai_usage` with one
+    document per day, user, method and model.
+    """
+
+    def __init__(self, db=None, log_buffer=None, metrics=None, ring_size=None, pricing=None):
+        """
+        Initialize the tracker.
+
+        Args:
+            db: MongoDB database instance, or None for in-memory accounting only
+            log_buffer (LogBuffer): Write-behind buffer for the raw call records
+            metrics: Metrics module exposing `observe_ai_call`
+            ring_size (int): Number of recent calls kept in memory
+            pricing (dict): Model -> (input, output) USD per million tokens
+        """
+        self.db = db
+        self.log_buffer = log_buffer
+        self.metrics = metrics
+        self.pricing = pricing or load_pricing()
+        self.usage_collection = db['ai_usage'] if db is not None else None
+        self.raw_ttl_days = int(os.getenv('AI_CALL_TTL_DAYS', 30))
+
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=ring_size or int(os.getenv('AI_USAGE_RING_SIZE', 500)))
+        self._totals = {}
+        self._started_at = datetime.utcnow()
+
+    def ensure_indexes(self):
+        """Create the rollup key index and the TTL index on raw call records."""
+        if self.db is None:
+            return
+        try:
+            self.usage_collection.create_index(
+                [('day', ASCENDING), ('user_email', ASCENDING), ('method', ASCENDING), ('model', ASCENDING)],
+                unique=True,
+                name='usage_day_user_method_model'
+            )
+            if self.raw_ttl_days:
+                self.db['ai_calls'].create_index(
+                    'timestamp',
+                    expireAfterSeconds=int(self.raw_ttl_days * 86400),
+                    name='timestamp_ttl'
+                )
+        except Exception as e:
+            logger.error("Error creating indexes: %s", e)
+
+    def cost(self, model, prompt_tokens, output_tokens):
+        input_price, output_price = self.pricing.get(model, (0.0, 0.0))
+        return (prompt_tokens * input_price + output_tokens * output_price) / 1e6
+
+    def record(self, method, model, seconds, outcome='success', usage_metadata=None, user_email=None):
+        """
+        Account for one model call.
+
+        Args:
+            method (str): AIService method name, e.g. "analyze_priority"
+            model (str): Model the call was sent to
+            seconds (float): Wall time of the call, including response parsing
+            outcome (str): "success", "error", "parse_error" or "cache_hit"
+            usage_metadata: The response's usage_metadata, if any
+            user_email (str, optional): Defaults to the user set with `attribute()`
+        """
+        prompt_tokens, output_tokens, cached_tokens = _token_counts(usage_metadata)
+        entry = {
+            'timestamp': datetime.utcnow(),
+            'user_email': user_email if user_email is not None else current_user(),
+            'method': method,
+            'model': model,
+            'outcome': outcome,
+            'latency_ms': round(seconds * 1000, 3),
+            'prompt_tokens': prompt_tokens,
+            'output_tokens': output_tokens,
+            'cached_tokens': cached_tokens,
+            'cost_usd': self.cost(model, prompt_tokens, output_tokens)
+        }
+
+        with self._lock:
+            self._recent.append(entry)
+            totals = self._totals.get((method, model))
+            if totals is None:
+                totals = self._totals[(method, model)] = _empty_totals()
+                totals['latencies'] = deque(maxlen=1000)
+            _add(totals, entry)
+            if outcome != 'cache_hit':
+                totals['latencies'].append(entry['latency_ms'])
+
+        if self.metrics:
+            self.metrics.observe_ai_call(method, model, seconds, outcome, prompt_tokens, output_tokens)
+        if self.log_buffer:
+            self.log_buffer.enqueue('ai_calls', dict(entry))
+        return entry
+
+    def record_cache_hit(self, method, model=None, user_email=None):
+        """Account for a call that was answered from a cache without reaching the model."""
+        return self.record(method, model, 0.0, outcome='cache_hit', user_email=user_email)
+
+    def recent(self, limit=50, method=None, user_email=None):
+        """Most recent calls first, optionally filtered by method or user."""
+        with self._lock:
+            entries = list(self._recent)
+        entries.reverse()
+        if method:
+            entries = [e for e in entries if e['method'] == method]
+        if user_email:
+            entries = [e for e in entries if e['user_email'] == user_email]
+        return entries[:limit]
+
+    def summary(self):
+        """
+        Running totals per method and model since the process started.
+
+        Returns:
+            dict: Overall totals plus one row per (method, model), most expensive first
+        """
+        with self._lock:
+            rows = []
+            for (method, model), totals in self._totals.items():
+                latencies = sorted(totals['latencies'])
+                row = _rounded({key: value for key, value in totals.items() if key != 'latencies'})
+                row.update({
+                    'method': method,
+                    'model': model,
+                    'latency_p50_ms': _percentile(latencies, 50),
+                    'latency_p95_ms': _percentile(latencies, 95),
+                    'latency_mean_ms': round(totals['latency_ms'] / len(latencies), 3) if latencies else None
+                })
+                rows.append(row)
+
+        overall = _empty_totals()
+        for row in rows:
+            for key in overall:
+                overall[key] += row[key]
+        rows.sort(key=lambda row: (row['cost_usd'], row['latency_ms']), reverse=True)
+        return {'since': self._started_at.isoformat(), 'totals': _rounded(overall), 'by_method': rows}
+
+    def on_flush(self, collection_name, docs):
+        """LogBuffer flush listener rolling raw `ai_calls` records up per user/day."""
+        if collection_name != 'ai_calls' or self.usage_collection is None:
+            return
+        try:
+            self.rollup(docs)
+        except Exception as e:
+            logger.error("Error rolling up %d calls: %s", len(docs), e)
+
+    def rollup(self, docs):
+        """Fold call records into `ai_usage`, one upsert per (day, user, method, model)."""
+        counters = {}
+        for doc in docs:
+            key = (bucket_start(doc['timestamp'], 'day'), doc.get('user_email'), doc['method'], doc.get('model'))
+            totals = counters.get(key)
+            if totals is None:
+                totals = counters[key] = _empty_totals()
+            _add(totals, doc)
+
+        operations = [
+            UpdateOne(
+                {'day': day, 'user_email': user_email, 'method': method, 'model': model},
+                {'$inc': totals},
+                upsert=True
+            )
+            for (day, user_email, method, model), totals in counters.items()
+        ]
+        if operations:
+            self.usage_collection.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    def daily(self, days=7, user_email=None):
+        """
+        Persisted per-day usage from `ai_usage`.
+
+        Args:
+            days (int): Number of days back to include, today included
+            user_email (str, optional): Restrict to a single user
+
+        Returns:
+            dict: Per-day totals and the most expensive users in the range
+        """
+        if self.usage_collection is None:
+            return {'days': [], 'top_users': []}
+        since = bucket_start(datetime.utcnow(), 'day') - timedelta(days=max(1, days) - 1)
+        query = {'day': {'$gte': since}}
+        if user_email:
+            query['user_email'] = user_email
+
+        per_day, per_user = {}, {}
+        for doc in self.usage_collection.find(query, {'_id': 0}):
+            day = doc['day'].date().isoformat()
+            for bucket, key in ((per_day, day), (per_user, doc.get('user_email'))):
+                totals = bucket.get(key)
+                if totals is None:
+                    totals = bucket[key] = _empty_totals()
+                for field in totals:
+                    totals[field] += doc.get(field, 0)
+
+        top_users = sorted(per_user.items(), key=lambda item: item[1]['cost_usd'], reverse=True)[:10]
+        return {
+            'since': since.date().isoformat(),
+            'days': [dict(_rounded(per_day[day]), day=day) for day in sorted(per_day)],
+            'top_users': [dict(_rounded(totals), user_email=user) for user, totals in top_users]
+        }
+
+
+def _empty_totals():
+    return {
+        'calls': 0, 'errors': 0, 'parse_failures': 0, 'cache_hits': 0,
+        'prompt_tokens': 0, 'output_tokens': 0, 'cached_tokens': 0,
+        'latency_ms': 0.0, 'cost_usd': 0.0
+    }
+
+
+def _add(totals, entry):
+    totals['calls'] += 1
+    totals['errors'] += entry['outcome'] == 'error'
+    totals['parse_failures'] += entry['outcome'] == 'parse_error'
+    totals['cache_hits'] += entry['outcome'] == 'cache_hit'
+    for field in ('prompt_tokens', 'output_tokens', 'cached_tokens', 'latency_ms', 'cost_usd'):
+        totals[field] += entry[field]
+
+
+def _rounded(totals):
+    totals['latency_ms'] = round(totals['latency_ms'], 3)
+    totals['cost_usd'] = round(totals['cost_usd'], 6)
+    return totals
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return round(sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low), 3)
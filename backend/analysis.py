@@ -0,0 +1,302 @@
+"""
+Write plans for the AI analysis passes (importance, duplicates, priority, labels, trash).
+
+Each `*_plan()` turns the analyzed tasks and the model's answer into an
+AnalysisPlan: the system labels to ensure and the task updates to apply.
+Plans contain no I/O, so the threaded Flask handlers (`apply_plan`) and the
+asyncio handlers in asgi.py (`apply_plan_async`) write exactly the same thing.
+analyzers/ drives the passes: it fetches the tasks, calls the model and
+applies the plans.
+When the model gave no answer (AIUnavailable) the plan writes nothing and
+reports the error, so a failed call never clears what an earlier pass set.
+Plans are diffs against the analyzed documents: a task whose labels and
+priority already match the answer gets no write, so a steady-state run
+writes (and bumps, and streams) nothing.
+The trash and label passes are the exception: tasks settled locally
+(junk_filter.py, label_classifier.py) are labelled even when the model's
+share of the run failed.
+"""
+import functools
+import uuid
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from ai_resilience import unavailable
+
+INACTIVE_STATUSES = ["Deleted", "deleted", "Closed", "completed", "Archived", "archived"]
+
+
+def active_tasks_query(folder_id=None):
+    """Query for the tasks an analysis pass looks at, optionally limited to one folder."""
+    query = {"status": {"$nin": INACTIVE_STATUSES}}
+    if folder_id:
+        query["folderId"] = folder_id
+    return query
+
+
+class AnalysisPlan:
+    """
+    Writes produced by one analysis pass.
+
+    Args:
+        result (dict): Response body, `updated_count` is added once applied
+        labels (list): (name, color, order, recolor) of labels that must exist;
+            `recolor` resets the color of an existing label
+        operations (list): UpdateOne operations for the tasks collection
+        owners (list): user_email of every task in `operations`, bumped when anything changed
+    """
+
+    def __init__(self, result, labels=None, operations=None, owners=None):
+        self.result = result
+        self.labels = labels or []
+        self.operations = operations or []
+        self.owners = owners or []
+
+    def change(self, task, add=(), remove=(), fields=None):
+        """
+        Queue the updates giving `task` the labels `add`, not `remove`, and `fields`.
+
+        `task` is the document as loaded for the analysis; nothing is queued
+        when it already matches. Labels are changed with $addToSet and $pull
+        of the labels that differ, never by rewriting the array, so the
+        passes of one run (which diff the same snapshot concurrently) and
+        users editing other labels don't undo each other's writes. A task
+        that swaps one label for another gets two updates, as MongoDB
+        rejects $pull and $addToSet on the same field in one update.
+        """
+        loaded = task.get('labels') or []
+        added = [label for label in add if label not in loaded]
+        removed = [label for label in remove if label in loaded]
+        changes = {field: value for field, value in (fields or {}).items() if task.get(field) != value}
+        updates = []
+        if removed:
+            updates.append({"$pull": {"labels": {"$in": removed}}})
+        if added:
+            updates.append({"$addToSet": {"labels": {"$each": added}}})
+        if changes:
+            if updates:
+                updates[-1]["$set"] = changes
+            else:
+                updates.append({"$set": changes})
+        for update in updates:
+            self.operations.append(UpdateOne({"_id": task['_id']}, update))
+        if updates:
+            self.owners.append(task.get('user_email'))
+
+
+def requires_answer(build):
+    """Plan builder decorator: an AIUnavailable answer yields an empty plan carrying the error."""
+    @functools.wraps(build)
+    def wrapper(tasks, answer, *args, **kwargs):
+        if unavailable(answer):
+            return AnalysisPlan({"error": f"AI unavailable: {answer.reason}", "ai_unavailable": True})
+        return build(tasks, answer, *args, **kwargs)
+    return wrapper
+
+
+@requires_answer
+def importance_plan(tasks, analysis_result):
+    # Handle both list and dict return types for backward compatibility safety
+    if isinstance(analysis_result, list):
+        critical_ids = analysis_result
+        notable_ids = []
+    else:
+        critical_ids = analysis_result.get('critical_task_ids', [])
+        notable_ids = analysis_result.get('notable_task_ids', [])
+
+    plan = AnalysisPlan({
+        "message": "Analysis complete",
+        "important_count": len(critical_ids),
+        "notable_count": len(notable_ids)
+    })
+    if not (critical_ids or notable_ids):
+        return plan
+
+    # "Important" marks Critical tasks, "Notable" the medium ones
+    plan.labels = [("Important", "#f59e0b", 0, True), ("Notable", "#fcd34d", 1, True)]
+
+    # Convert ID lists to set of strings for fast lookup and safety
+    critical_set = set(str(uid) for uid in critical_ids)
+    notable_set = set(str(uid) for uid in notable_ids) - critical_set
+
+    # Iterate over ALL analyzed tasks to enforce state
+    for task in tasks:
+        t_id_str = str(task['_id'])
+        if t_id_str in critical_set:
+            plan.change(task, add=["Important"], remove=["Notable"])
+        elif t_id_str in notable_set:
+            plan.change(task, add=["Notable"], remove=["Important"])
+        else:
+            plan.change(task, remove=["Important", "Notable"])
+    return plan
+
+
+@requires_answer
+def duplication_plan(tasks, duplicate_ids):
+    plan = AnalysisPlan({
+        "message": "Duplicate analysis complete",
+        "duplicate_count": len(duplicate_ids) if duplicate_ids else 0
+    })
+    if not duplicate_ids:
+        return plan
+
+    # Ensure "Duplicate" Label exists (Neutral/Gray-400)
+    plan.labels = [("Duplicate", "#9ca3af", 2, True)]
+    dup_set = set(str(uid) for uid in duplicate_ids)
+    for task in tasks:
+        if str(task['_id']) in dup_set:
+            plan.change(task, add=["Duplicate"])
+        else:
+            plan.change(task, remove=["Duplicate"])
+    return plan
+
+
+@requires_answer
+def priority_plan(tasks, top_ids, screen=None):
+    """
+    Mark `top_ids` as Priority and every other task in `tasks` as not.
+
+    With an urgency.PriorityScreen, `top_ids` comes from the best-ranked
+    candidates only (or from the local ranking in fast mode), and the
+    ranking is reported under `ranking`.
+    """
+    plan = AnalysisPlan({
+        "message": "Priority analysis complete",
+        "top_priority_count": len(top_ids) if top_ids else 0
+    })
+    if screen:
+        plan.result["ranking"] = screen.report()
+    if top_ids is None:  # check for None to avoid clearing if error
+        return plan
+
+    # Ensure "Priority" Label exists (Red)
+    plan.labels = [("Priority", "#ef4444", 0, True)]
+    top_set = set(str(uid) for uid in top_ids)
+    for task in tasks:
+        if str(task['_id']) in top_set:
+            # Mark as Priority, Set Priority High
+            plan.change(task, add=["Priority"], fields={"priority": "high"})
+        else:
+            # Remove Priority label and reset priority to medium (Override)
+            plan.change(task, remove=["Priority"], fields={"priority": "medium"})
+    return plan
+
+
+def label_plan(tasks, task_labels_map, screen=None):
+    """
+    Add the label the model picked for each task (task_labels_map: { task_id: ["Label"] }).
+
+    With a label_classifier.LabelScreen, `task_labels_map` answers only the
+    tasks the classifier deferred: its local assignments are merged in and
+    the split is reported under `classifier`. As with the trash pre-filter,
+    local assignments are still applied when the model was unavailable.
+    """
+    local = screen.assigned if screen else {}
+    model_error = None
+    if unavailable(task_labels_map):
+        if not local:
+            return AnalysisPlan({"error": f"AI unavailable: {task_labels_map.reason}", "ai_unavailable": True})
+        model_error, task_labels_map = task_labels_map.reason, {}
+    task_labels_map = dict(task_labels_map or {}, **local)
+
+    plan = AnalysisPlan({
+        "message": "Label analysis complete",
+        "labeled_count": len(task_labels_map)
+    })
+    if screen:
+        plan.result["classifier"] = screen.report()
+    if model_error:
+        plan.result.update(ai_unavailable=True, model_error=f"AI unavailable: {model_error}")
+    tasks_by_id = {str(t['_id']): t for t in tasks}
+    for t_id_str, labels in (task_labels_map or {}).items():
+        task = tasks_by_id.get(str(t_id_str))
+        if task and labels and len(labels) > 0:
+            plan.change(task, add=labels[:1])  # Take the first one (should be only one)
+    return plan
+
+
+def trash_plan(tasks, trash_ids, screen=None):
+    """
+    Label `trash_ids` as Trash.
+
+    With a junk_filter.Screen, `trash_ids` is the model's answer for the
+    uncertain band only: the locally judged junk is added to it and the split
+    is reported under `prefilter`. If the model was unavailable, the local
+    verdicts are still applied and the error is reported alongside them.
+    """
+    local_ids = screen.junk_ids if screen else []
+    model_error = None
+    if unavailable(trash_ids):
+        if not local_ids:
+            return AnalysisPlan({"error": f"AI unavailable: {trash_ids.reason}", "ai_unavailable": True})
+        model_error, trash_ids = trash_ids.reason, []
+    trash_ids = local_ids + list(trash_ids or [])
+
+    plan = AnalysisPlan({
+        "message": "Trash analysis complete",
+        "trash_count": len(trash_ids)
+    })
+    if screen:
+        plan.result["prefilter"] = screen.report()
+    if model_error:
+        plan.result.update(ai_unavailable=True, model_error=f"AI unavailable: {model_error}")
+    if not trash_ids:
+        return plan
+
+    # Ensure "Trash" Label exists (Zinc-600)
+    plan.labels = [("Trash", "#52525b", 4, False)]
+    trash_set = set(str(uid) for uid in trash_ids)
+    for task in tasks:
+        if str(task['_id']) in trash_set:
+            plan.change(task, add=["Trash"])
+    return plan
+
+
+def task_analysis_update(task, result):
+    """Update applying a single-task `analyze_task` result and adding its plan to the timeline."""
+    update_item = {
+        "id": str(uuid.uuid4()),
+        "content": f"AI Plan: {result['suggestions']}",
+        "type": "ai_analysis",
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    return {
+        "$set": {
+            "ai_analysis": {
+                "summary": result.get('summary'),
+                "suggestions": result.get('suggestions')
+            },
+            "priority": result.get('priority', task['priority']),
+            "category": result.get('category', task['category']),
+            "importance": result.get('importance', task['importance'])
+        },
+        "$push": {"updates": update_item}
+    }
+
+
+def apply_plan(repos, versions, plan, labels):
+    """
+    Write `plan` with the blocking driver. Returns the response body including `updated_count`.
+
+    Args:
+        labels (LabelRegistry): Ensures the plan's labels without querying each one (analyzers/labels.py)
+    """
+    labels.ensure(repos, plan.labels)
+    updated_count = 0
+    if plan.operations:
+        updated_count = repos.tasks.bulk_write(plan.operations).modified_count
+        if updated_count:
+            versions.bump_many(plan.owners, 'task')
+    return dict(plan.result, updated_count=updated_count)
+
+
+async def apply_plan_async(repos, versions, plan, labels):
+    """`apply_plan` for asyncio collections (AsyncMongoClient or storage.aio)."""
+    await labels.ensure_async(repos, plan.labels)
+    updated_count = 0
+    if plan.operations:
+        updated_count = (await repos.tasks.bulk_write(plan.operations)).modified_count
+        if updated_count:
+            versions.bump_many(plan.owners, 'task')
+    return dict(plan.result, updated_count=updated_count)
@@ -0,0 +1,36 @@
+"""
+The AI analysis passes (importance, duplicates, priority, labels, trash) on one pipeline.
+
+Each pass is an Analyzer (pipeline.py) that declares the task fields it
+reads, the system labels it manages and its model method, and implements
+the hooks it needs: `screen` for local work before the model call,
+`request` for what the model still has to decide, `record` to learn from
+the answer and `plan` for the writes (analysis.py). AnalysisPipeline runs
+the stages every pass shares:
+
+- fetch: one projected query of the active tasks in scope, whatever the
+  number of passes in the run.
+- model: each pass's call, concurrently when a run has several passes.
+- apply: the plan's task updates in one bulk write, its system labels
+  ensured through the cached LabelRegistry (labels.py).
+- scheduling: `schedule()` after task writes merges the requests for a
+  folder scope into one background run of the `on_write` passes.
+- metrics: every pass is counted and timed under its `name`.
+
+A new pass is a subclass added to ANALYZERS (passes.py); the Flask and
+ASGI apps give it /api/{folders/<id>,tasks}/analyze_<route> endpoints.
+
+Environment:
+    ANALYSIS_DEBOUNCE_SECONDS: Delay before a scheduled run starts, so a
+        burst of writes joins it, default 0
+    LABEL_REGISTRY_RECHECK_SECONDS: See labels.py
+"""
+from .labels import LabelRegistry
+from .passes import (ANALYZERS, DuplicationAnalyzer, ImportanceAnalyzer, LabelAnalyzer, PriorityAnalyzer,
+                     TrashAnalyzer, default_analyzers)
+from .pipeline import AnalysisPipeline, Analyzer, Run
+
+__all__ = [
+    'ANALYZERS', 'AnalysisPipeline', 'Analyzer', 'DuplicationAnalyzer', 'ImportanceAnalyzer', 'LabelAnalyzer',
+    'LabelRegistry', 'PriorityAnalyzer', 'Run', 'TrashAnalyzer', 'default_analyzers',
+]
@@ -0,0 +1,126 @@
+"""
+Cached view of the labels collection for analysis runs.
+
+Every analysis used to `find_one` its system labels on each run, and the
+label pass listed the whole collection again. The registry loads the labels
+with one query on first use and serves names and documents from memory.
+It reloads after label writes, which it learns about from the 'label'
+bumps of versions.py (the change feed makes those for other processes'
+writes too, after a lag). When versions don't see all writes it also reloads after
+LABEL_REGISTRY_RECHECK_SECONDS.
+
+Environment:
+    LABEL_REGISTRY_RECHECK_SECONDS: How often the labels are reloaded when
+        other processes' writes may not bump this process's versions, default 60
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+LABEL_PROJECTION = {'name': 1, 'color': 1, 'order': 1}
+
+
+def label_doc(name, color, order):
+    return {"name": name, "color": color, "created_at": datetime.utcnow().isoformat(), "order": order}
+
+
+class LabelRegistry:
+    """
+    Label name -> document, loaded once and reloaded after label writes.
+
+    Args:
+        versions (VersionStore): Its 'label' bumps invalidate the cache; `ensure` bumps it for created labels
+        system_labels (iterable): Names of the labels the analysis passes manage
+    """
+
+    def __init__(self, versions, system_labels=()):
+        self.versions = versions
+        self.system_labels = frozenset(system_labels)
+        self.recheck_seconds = float(os.getenv('LABEL_REGISTRY_RECHECK_SECONDS', 60))
+        self._lock = threading.Lock()
+        self._labels = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._loaded_generation = -1
+        versions.add_listener(self._on_bump)
+
+    def _on_bump(self, key, kind, details):
+        if kind == 'label':
+            with self._lock:
+                self._generation += 1
+
+    def _fresh(self):
+        if self._labels is None or self._loaded_generation != self._generation:
+            return False
+        return self.versions.sees_all_writes or time.monotonic() - self._loaded_at < self.recheck_seconds
+
+    def _loaded(self, docs, generation):
+        with self._lock:
+            self._labels = {doc['name']: doc for doc in docs}
+            self._loaded_generation = generation
+            self._loaded_at = time.monotonic()
+            return self._labels
+
+    def labels(self, repos):
+        """Name -> label document, from the cache when no label changed since it was loaded."""
+        if self._fresh():
+            return self._labels
+        # Read before querying, so a write racing the query triggers another load
+        generation = self._generation
+        return self._loaded(repos.labels.find({}, LABEL_PROJECTION), generation)
+
+    async def labels_async(self, repos):
+        if self._fresh():
+            return self._labels
+        generation = self._generation
+        return self._loaded(await repos.labels.find({}, LABEL_PROJECTION).to_list(None), generation)
+
+    def user_label_names(self, repos):
+        """Names of the labels users created, the ones the label pass assigns."""
+        return [name for name in self.labels(repos) if name not in self.system_labels]
+
+    async def user_label_names_async(self, repos):
+        return [name for name in await self.labels_async(repos) if name not in self.system_labels]
+
+    def _written(self, doc):
+        """Record a label this registry wrote and bumped, without invalidating the rest of the cache."""
+        with self._lock:
+            if self._labels is None:
+                return
+            self._labels[doc['name']] = doc
+            # Only our own bump happened since the load: the cache is still complete
+            if self._loaded_generation == self._generation - 1:
+                self._loaded_generation = self._generation
+
+    def _changes(self, labels, specs):
+        for name, color, order, recolor in specs:
+            existing = labels.get(name)
+            if not existing:
+                yield label_doc(name, color, order), None
+            elif recolor and existing.get('color') != color:
+                yield dict(existing, color=color), existing['_id']
+
+    def ensure(self, repos, specs):
+        """
+        Create missing labels, and reset the color of existing ones where asked.
+
+        Args:
+            specs (list): (name, color, order, recolor) tuples, as in AnalysisPlan.labels
+        """
+        for doc, existing_id in list(self._changes(self.labels(repos), specs)):
+            if existing_id is None:
+                doc['_id'] = repos.labels.insert_one(doc).inserted_id
+            else:
+                repos.labels.update_one({"_id": existing_id}, {"$set": {"color": doc['color']}})
+            self.versions.bump(None, 'label')
+            self._written(doc)
+
+    async def ensure_async(self, repos, specs):
+        for doc, existing_id in list(self._changes(await self.labels_async(repos), specs)):
+            if existing_id is None:
+                doc['_id'] = (await repos.labels.insert_one(doc)).inserted_id
+            else:
+                await repos.labels.update_one({"_id": existing_id}, {"$set": {"color": doc['color']}})
+            self.versions.bump(None, 'label')
+            self._written(doc)
@@ -0,0 +1,123 @@
+"""
+The built-in analysis passes.
+"""
+import analysis
+import junk_filter
+import metrics
+import urgency
+
+from .pipeline import Analyzer
+
+
+class ImportanceAnalyzer(Analyzer):
+    name, route, method, count_key = 'importance', 'importance', 'analyze_importance', 'important_count'
+    labels = ('Important', 'Notable')
+
+    def plan(self, tasks, answer, state):
+        return analysis.importance_plan(tasks, answer)
+
+
+class DuplicationAnalyzer(Analyzer):
+    name, route, method, count_key = 'duplication', 'duplicates', 'analyze_duplicates', 'duplicate_count'
+    labels = ('Duplicate',)
+
+    def plan(self, tasks, answer, state):
+        return analysis.duplication_plan(tasks, answer)
+
+
+class PriorityAnalyzer(Analyzer):
+    """Ranked locally by urgency.py; the model adjudicates the best-ranked candidates only."""
+    name, route, method, count_key = 'priority', 'priority', 'analyze_priority', 'top_priority_count'
+    fields = ('title', 'status', 'labels', 'priority', 'created_at', 'updated_at', 'updates.timestamp')
+    labels = ('Priority',)
+    on_write = False  # run on request only
+
+    def empty_result(self, folder_id):
+        message = "No active tasks in folder" if folder_id else "No active tasks found"
+        return {"message": message, self.count_key: 0}
+
+    def screen(self, run, tasks):
+        screen = urgency.screen(tasks)
+        metrics.observe_priority_ranking(screen.report())
+        return screen
+
+    def request(self, tasks, state):
+        return None if state.mode == urgency.FAST else (state.candidates,)
+
+    def local_answer(self, state):
+        return state.urgent_ids
+
+    def plan(self, tasks, answer, state):
+        return analysis.priority_plan(tasks, answer, state)
+
+
+class LabelAnalyzer(Analyzer):
+    """User labels: the user's own classifier first (label_classifier.py), the model for the rest."""
+    name, route, method, count_key = 'label', 'memos', 'analyze_labels', 'labeled_count'
+
+    def __init__(self, classifier):
+        self.classifier = classifier
+
+    @staticmethod
+    def _screened(names, screen):
+        if screen:
+            metrics.observe_label_classifier(screen.report())
+        return names, screen
+
+    def screen(self, run, tasks):
+        names = run.labels.user_label_names(run.repos)
+        return self._screened(names, self.classifier.screen(tasks, names) if names else None)
+
+    async def screen_async(self, run, tasks):
+        names = await run.labels.user_label_names_async(run.repos)
+        return self._screened(names, await self.classifier.screen_async(run.repos, tasks, names) if names else None)
+
+    def request(self, tasks, state):
+        names, screen = state
+        if not names or not screen.deferred:
+            return None
+        return screen.deferred, names
+
+    def local_answer(self, state):
+        return {}
+
+    def record(self, run, state, answer):
+        if state[1]:
+            self.classifier.record(state[1], answer)
+
+    async def record_async(self, run, state, answer):
+        if state[1]:
+            await self.classifier.record_async(run.repos, state[1], answer)
+
+    def plan(self, tasks, answer, state):
+        names, screen = state
+        if not names:
+            return analysis.AnalysisPlan({"message": "No labels available for analysis", self.count_key: 0})
+        return analysis.label_plan(tasks, answer, screen)
+
+
+class TrashAnalyzer(Analyzer):
+    """Clear-cut titles are settled by junk_filter.py; the model judges the uncertain band."""
+    name, route, method, count_key = 'trash', 'trash', 'analyze_trash', 'trash_count'
+    fields = ('title', 'labels')
+    labels = ('Trash',)
+
+    def screen(self, run, tasks):
+        screen = junk_filter.screen(tasks)
+        metrics.observe_trash_prefilter(screen.report())
+        return screen
+
+    def request(self, tasks, state):
+        return (state.uncertain,) if state.uncertain else None
+
+    def plan(self, tasks, answer, state):
+        return analysis.trash_plan(tasks, answer, state)
+
+
+# The built-in passes, in the order scheduled runs start them
+ANALYZERS = (ImportanceAnalyzer, DuplicationAnalyzer, PriorityAnalyzer, LabelAnalyzer, TrashAnalyzer)
+
+
+def default_analyzers(label_classifier):
+    """Instances of ANALYZERS; the label pass screens with `label_classifier`."""
+    return [LabelAnalyzer(label_classifier) if analyzer is LabelAnalyzer else analyzer() for analyzer in ANALYZERS]
@@ -0,0 +1,219 @@
+"""
+The analysis pipeline: one fetch, per-analyzer screening and model calls, one apply stage.
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import analysis
+import metrics
+from ai_admission import BACKGROUND, priority as ai_priority
+from app_logging import start_thread
+
+from .labels import LabelRegistry
+
+logger = logging.getLogger(__name__)
+
+# What an analyzer's hooks get besides the tasks: the storage the run reads
+# and writes (blocking or async), the label registry and the folder scope
+Run = namedtuple('Run', 'repos labels folder_id')
+
+
+class Analyzer:
+    """
+    One analysis pass. Subclasses set the attributes and implement `plan`;
+    the hooks default to sending every task to the model.
+
+    Attributes:
+        name (str): Key of the pass in `run()` results and its `kind` in the analysis metrics
+        route (str): Suffix of its /api/{folders/<id>,tasks}/analyze_<route> endpoints
+        method (str): AIService method adjudicating the tasks (its `_async` twin serves asgi.py)
+        count_key (str): Result field counting what the pass found, 0 when there is nothing to analyze
+        fields (tuple): Task fields the pass reads, besides _id and user_email; plans diff against `labels`
+        labels (tuple): Names of the system labels the pass manages
+        on_write (bool): Whether `schedule()` runs the pass after task writes
+    """
+    name = route = method = count_key = None
+    fields = ('title', 'status', 'labels')
+    labels = ()
+    on_write = True
+    empty_message = "No active tasks in scope"
+
+    def empty_result(self, folder_id):
+        return {"message": self.empty_message, self.count_key: 0}
+
+    def screen(self, run, tasks):
+        """Local work before the model call. Returns state for the later hooks."""
+        return None
+
+    async def screen_async(self, run, tasks):
+        return self.screen(run, tasks)
+
+    def request(self, tasks, state):
+        """Arguments of the model call, or None when the local work settled everything."""
+        return (tasks,)
+
+    def local_answer(self, state):
+        """The answer standing in for the model's when `request` returns None."""
+        return []
+
+    def record(self, run, state, answer):
+        """Learn from the model's answer, e.g. to calibrate local screening."""
+
+    async def record_async(self, run, state, answer):
+        self.record(run, state, answer)
+
+    def plan(self, tasks, answer, state):
+        """The AnalysisPlan for the answer (see analysis.py)."""
+        raise NotImplementedError
+
+
+class AnalysisPipeline:
+    """
+    Runs analyzers over the active tasks and writes their plans.
+
+    Args:
+        repos (Repositories): Blocking storage for Flask requests and scheduled runs
+        versions (VersionStore): Bumped for changed owners and labels
+        ai_service (AIService): Answers the analyzers' model calls
+        analyzers (list): Analyzer instances
+    """
+
+    def __init__(self, repos, versions, ai_service, analyzers):
+        self.repos = repos
+        self.versions = versions
+        self.ai_service = ai_service
+        self.analyzers = {analyzer.name: analyzer for analyzer in analyzers}
+        self.routes = {analyzer.route: analyzer.name for analyzer in analyzers}
+        self.labels = LabelRegistry(versions, (name for analyzer in analyzers for name in analyzer.labels))
+        self.debounce = float(os.getenv('ANALYSIS_DEBOUNCE_SECONDS', 0))
+        self._lock = threading.Lock()
+        self._pending = {}    # folder scope -> analyzer names waiting for the next run
+        self._running = set()  # folder scopes with a scheduled run in progress
+        # Every analyzer's run is counted and timed under its name
+        self._runners = {name: metrics.track_analysis(name)(functools.partial(self._run_one, analyzer))
+                         for name, analyzer in self.analyzers.items()}
+        self._async_runners = {name: metrics.track_analysis(name)(functools.partial(self._run_one_async, analyzer))
+                               for name, analyzer in self.analyzers.items()}
+
+    # Fetch
+
+    def _selected(self, names):
+        return [self.analyzers[name] for name in names]
+
+    @staticmethod
+    def _projection(analyzers):
+        projection = {'user_email': 1}
+        for analyzer in analyzers:
+            projection.update((field, 1) for field in analyzer.fields)
+        return projection
+
+    # Runs
+
+    def run(self, names, folder_id=None):
+        """
+        Run analyzers over one fetch of the active tasks in scope.
+
+        Analyzers of the same run work on the same task list, each on its own
+        thread when there are several.
+
+        Returns:
+            dict: Analyzer name -> response body (`error` set when it failed)
+        """
+        analyzers = self._selected(names)
+        tasks = list(self.repos.tasks.find(analysis.active_tasks_query(folder_id), self._projection(analyzers)))
+        run = Run(self.repos, self.labels, folder_id)
+        if len(analyzers) == 1:
+            return {analyzers[0].name: self._runners[analyzers[0].name](run, tasks)}
+
+        results = {}
+
+        def run_analyzer(name):
+            results[name] = self._runners[name](run, tasks)
+
+        threads = [start_thread(run_analyzer, analyzer.name, name=f'analysis-{analyzer.name}')
+                   for analyzer in analyzers]
+        for thread in threads:
+            thread.join()
+        return results
+
+    async def run_async(self, repos, names, folder_id=None):
+        """`run` for asgi.py on an async Repositories; analyzers of a run are gathered."""
+        analyzers = self._selected(names)
+        tasks = await repos.tasks.find(analysis.active_tasks_query(folder_id),
+                                       self._projection(analyzers)).to_list(None)
+        run = Run(repos, self.labels, folder_id)
+        results = await asyncio.gather(*(self._async_runners[analyzer.name](run, tasks) for analyzer in analyzers))
+        return {analyzer.name: result for analyzer, result in zip(analyzers, results)}
+
+    def _run_one(self, analyzer, run, tasks):
+        try:
+            if not tasks:
+                return analyzer.empty_result(run.folder_id)
+            state = analyzer.screen(run, tasks)
+            args = analyzer.request(tasks, state)
+            answer = analyzer.local_answer(state) if args is None else getattr(self.ai_service, analyzer.method)(*args)
+            analyzer.record(run, state, answer)
+            return analysis.apply_plan(run.repos, self.versions, analyzer.plan(tasks, answer, state), run.labels)
+        except Exception as e:
+            logger.exception("Error in %s analysis: %s", analyzer.name, e)
+            return {"error": str(e)}
+
+    async def _run_one_async(self, analyzer, run, tasks):
+        try:
+            if not tasks:
+                return analyzer.empty_result(run.folder_id)
+            state = await analyzer.screen_async(run, tasks)
+            args = analyzer.request(tasks, state)
+            if args is None:
+                answer = analyzer.local_answer(state)
+            else:
+                answer = await getattr(self.ai_service, f'{analyzer.method}_async')(*args)
+            await analyzer.record_async(run, state, answer)
+            return await analysis.apply_plan_async(run.repos, self.versions, analyzer.plan(tasks, answer, state),
+                                                   run.labels)
+        except Exception as e:
+            logger.exception("Error in %s analysis: %s", analyzer.name, e)
+            return {"error": str(e)}
+
+    # Scheduling
+
+    def schedule(self, folder_id=None, names=None):
+        """
+        Run analyzers in the background after a write, by default every `on_write` one.
+
+        Requests for a folder scope whose run is already in progress are
+        merged and served by one follow-up run, so a burst of writes costs
+        at most two runs (one fetch and one model call per analyzer each)
+        instead of one of each per write.
+        """
+        names = names or [name for name, analyzer in self.analyzers.items() if analyzer.on_write]
+        with self._lock:
+            self._pending.setdefault(folder_id, set()).update(names)
+            if folder_id in self._running:
+                return
+            self._running.add(folder_id)
+        with ai_priority(BACKGROUND):
+            start_thread(self._drain, folder_id, name='analysis')
+
+    def _drain(self, folder_id):
+        if self.debounce:
+            time.sleep(self.debounce)  # let a burst of writes join this run
+        while True:
+            with self._lock:
+                names = self._pending.pop(folder_id, None)
+                if not names:
+                    self._running.discard(folder_id)
+                    return
+            try:
+                # Registration order, so runs are reproducible
+                results = self.run([name for name in self.analyzers if name in names], folder_id)
+                failed = sorted(name for name, result in results.items() if 'error' in result)
+                if failed:
+                    logger.warning("Scheduled analyses failed: %s", ', '.join(failed))
+            except Exception as e:
+                logger.exception("Error in scheduled analysis run: %s", e)
@@ -1,19 +1,49 @@
-from flask import Flask, request, jsonify
+import startup
+from flask import Flask, Response, request, jsonify, stream_with_context
+import functools
 import json
+import logging
 import os
-from pymongo import MongoClient
 from dotenv import load_dotenv
 import uuid
-import threading
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
 
 load_dotenv()
+startup.mark('flask')
+
+import app_logging
+
+# JSON logs written by a background listener thread (LOG_LEVEL, LOG_FORMAT, LOG_SAMPLING)
+app_logging.configure_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__, static_folder='static', static_url_path='')
 from flask_cors import CORS
-from flask_apscheduler import APScheduler
+from serialization import BSONJSONProvider, compress_response
+from static_files import StaticFiles
+import metrics
 CORS(app)
+startup.mark('app')
+
+# First request/response times for the startup report; the first request
+# also releases the work deferred past readiness (see init_services)
+startup.init_app(app)
+
+# Request IDs and the access log wrap everything else, then request metrics,
+# so both timings include compression
+app_logging.init_app(app)
+metrics.init_app(app)
+
+# One encoder for every JSON response (BSON types, orjson, optional MessagePack)
+# and brotli/gzip for large bodies
+app.json = BSONJSONProvider(app)
+app.after_request(compress_response)
+
+# The built frontend is served ahead of Flask: precompressed variants,
+# immutable hashed assets, ETag-revalidated index.html and the SPA fallback
+# for client-side routes (static_files.py)
+app.wsgi_app = StaticFiles(app.wsgi_app, app.static_folder)
 
 @app.route('/')
 def serve_frontend():
@@ -21,25 +51,28 @@ def serve_frontend():
 
 @app.errorhandler(404)
 def not_found(e):
+    # API calls and missing asset files get a JSON 404 rather than the SPA shell
+    if request.path.startswith('/api/') or '.' in request.path.rsplit('/', 1)[-1]:
+        return jsonify({'error': 'Not found'}), 404
     return app.send_static_file('index.html')
 
 MONGO_URI = os.getenv('MONGO_URI')
 
-import certifi
-
-# Initialize MongoDB
-try:
-    client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
-    db = client['dorae_db']
-    tasks_collection = db['tasks']
-    labels_collection = db['labels']
-    folders_collection = db['folders']
-    agents_collection = db['agents']
-    print("Connected to MongoDB")
-except Exception as e:
-    print(f"Error connecting to MongoDB: {e}")
-    client = None
-    tasks_collection = None
+from storage import open_storage, storage_backend, Repositories, MONGO_BACKEND
+from log_buffer import LogBuffer
+from traffic_rollups import TrafficRollups
+from versions import VersionStore, ResponseCache, versioned_read
+from events import ChangeFeed
+from ai_usage import AIUsageTracker, attribute as attribute_ai_usage
+from ai_admission import AdmissionController
+startup.mark('storage_modules')
+
+# Per-process resources: database connections, background threads and API
+# clients. They stay None until init_services() opens them, at import by
+# default or after the fork in each gunicorn worker (gunicorn.conf.py).
+client = db = repos = None
+tasks_collection = labels_collection = folders_collection = agents_collection = None
+traffic_rollups = log_buffer = ai_usage_tracker = change_feed = None
 
 # Helper to serialize MongoDB objects
 def serialize_doc(doc):
@@ -48,6 +81,19 @@ def serialize_doc(doc):
     doc['_id'] = str(doc['_id'])
     return doc
 
+# Per-user data versions backing read-endpoint ETags and the response cache.
+# Every write path below bumps the owner's version.
+versions = VersionStore()
+response_cache = ResponseCache()
+
+def bump_owners(collection, ids, kind=None):
+    """Bump the version of every user owning one of the documents in `ids`."""
+    object_ids = [ObjectId(i) for i in ids]
+    if not object_ids:
+        return
+    owners = [doc.get('user_email') for doc in collection.find({'_id': {'$in': object_ids}}, {'user_email': 1})]
+    versions.bump_many(owners, kind)
+
 @app.route('/')
 def hello():
     return "Dorae AI Backend Running"
@@ -60,12 +106,21 @@ def health_check():
         # Check MongoDB connection
         if client:
             client.admin.command('ping')
-            return jsonify({'status': 'healthy', 'db': 'connected'}), 200
+            body = {'status': 'healthy', 'db': 'connected', 'log_buffer': log_buffer.stats(),
+                    'logging': app_logging.stats()}
+            if request.args.get('verbose') == '1':
+                body['startup'] = startup.report()
+            return jsonify(body), 200
         else:
             return jsonify({'status': 'unhealthy', 'db': 'disconnected'}), 503
     except Exception as e:
         return jsonify({'status': 'unhealthy', 'error': str(e)}), 503
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    return metrics.metrics_response()
+
 @app.route('/api/login', methods=['POST'])
 def login_user():
     try:
@@ -74,7 +129,7 @@ def login_user():
              return jsonify({'error': 'Invalid user data'}), 400
         
         # Upsert user: Update if exists, Insert if new
-        users_collection = db['users']
+        users_collection = repos.users
         result = users_collection.update_one(
             {'email': user_data['email']},
             {'$set': {
@@ -86,8 +141,7 @@ def login_user():
         )
 
         # Log history (Audit Log)
-        history_collection = db['login_logs']
-        history_collection.insert_one({
+        log_buffer.enqueue('login_logs', {
             'email': user_data['email'],
             'timestamp': datetime.utcnow(),
             'ip': request.remote_addr,
@@ -96,7 +150,7 @@ def login_user():
         
         return jsonify({'status': 'success', 'message': 'User saved'}), 200
     except Exception as e:
-        print(f"Error saving user: {e}")
+        logger.error("Error saving user: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/traffic', methods=['POST'])
@@ -108,8 +162,7 @@ def log_traffic():
 
         data = request.json
         
-        traffic_collection = db['traffic_logs']
-        traffic_collection.insert_one({
+        log_buffer.enqueue('traffic_logs', {
             'path': data.get('path'),
             'user_email': data.get('user_email'), # Optional, if logged in
             'timestamp': datetime.utcnow(),
@@ -118,15 +171,88 @@ def log_traffic():
         })
         return jsonify({'status': 'logged'}), 200
     except Exception as e:
-        print(f"Traffic log error: {e}")
+        logger.error("Traffic log error: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/traffic/summary', methods=['GET'])
+def get_traffic_summary():
+    try:
+        source = request.args.get('source', 'traffic')
+        granularity = request.args.get('granularity', 'day')
+        if source not in ['traffic', 'login']:
+            return jsonify({'error': 'source must be traffic or login'}), 400
+        if granularity not in ['hour', 'day']:
+            return jsonify({'error': 'granularity must be hour or day'}), 400
+
+        # Range is expressed in buckets: last N hours or last N days
+        try:
+            span = int(request.args.get('span', 24 if granularity == 'hour' else 7))
+        except ValueError:
+            span = 24 if granularity == 'hour' else 7
+        span = max(1, min(span, 24 * 31 if granularity == 'hour' else 366))
+
+        until = datetime.utcnow()
+        since = until - (timedelta(hours=span) if granularity == 'hour' else timedelta(days=span))
+
+        summary = traffic_rollups.summary(
+            source=source,
+            granularity=granularity,
+            since=since,
+            until=until,
+            user_email=request.args.get('user_email')
+        )
+        return jsonify(summary), 200
+    except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ai/usage', methods=['GET'])
+def get_ai_usage():
+    """Model call accounting: running totals per method/model, recent calls and per-day rollups."""
+    try:
+        try:
+            days = max(1, min(int(request.args.get('days', 7)), 366))
+            limit = max(0, min(int(request.args.get('limit', 50)), 500))
+        except ValueError:
+            return jsonify({'error': 'days and limit must be integers'}), 400
+        user_email = request.args.get('user_email')
+        return jsonify({
+            'summary': ai_usage_tracker.summary(),
+            'admission': ai_admission.stats() if ai_admission else None,
+            'circuits': ai_service.breaker.stats() if ai_service else None,
+            'routing': ai_service.router.stats() if ai_service else None,
+            'label_classifier': label_classifier.stats() if label_classifier else None,
+            'recent': ai_usage_tracker.recent(limit, method=request.args.get('method'), user_email=user_email),
+            'daily': ai_usage_tracker.daily(days, user_email=user_email)
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    user_email = request.args.get('user_email')
+    # EventSource resends the last id it saw when it reconnects
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    # Each stream pins a worker thread. Past the cap, a stream that only
+    # sets the retry delay makes EventSource come back later (a 503 would
+    # make it give up for good).
+    release = change_feed.reserve_thread_stream()
+    if release is None:
+        return Response(change_feed.busy_stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+    response = Response(
+        stream_with_context(change_feed.stream(user_email, last_event_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.call_on_close(release)
+    return response
+
 @app.route('/api/tasks', methods=['GET'])
+@versioned_read(versions, response_cache, 'tasks', cacheable=lambda args: args.get('page', '1') == '1')
 def get_tasks():
     try:
         status = request.args.get('status')
         label = request.args.get('label')
-        print(f"DEBUG: get_tasks params - status: {status}, label: {label}, args: {request.args}")
+        logger.debug("get_tasks params", extra={'status': status, 'label': label, 'query': request.args.to_dict()})
         query = {}
         
         if status == 'Deleted':
@@ -271,6 +397,7 @@ def reorder_tasks():
             
         if operations:
             tasks_collection.bulk_write(operations)
+            bump_owners(tasks_collection, task_ids, 'task')
             
         return jsonify({"message": "Tasks reordered"}), 200
     except Exception as e:
@@ -298,6 +425,7 @@ def delete_task(task_id):
                     }}
                 }
             )
+            versions.bump(task.get('user_email'), 'task', id=task_id)
             return jsonify({"message": "Task permanently deleted"}), 200
         else:
             # Soft Delete
@@ -313,6 +441,7 @@ def delete_task(task_id):
                     }}
                 }
             )
+            versions.bump(task.get('user_email'), 'task', id=task_id)
             return jsonify({"message": "Task moved to trash"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -340,11 +469,14 @@ def empty_trash():
                 }}
             }
         )
+        if result.modified_count:
+            versions.bump(user_email, 'task')
         return jsonify({"message": f"Archived {result.modified_count} tasks"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/stats', methods=['GET'])
+@versioned_read(versions, response_cache, 'stats')
 def get_stats():
     try:
         # Aggregation pipeline could be more efficient, but individual counts are simple for now
@@ -441,14 +573,16 @@ def get_stats():
 @app.route('/api/tasks/<task_id>/update/<update_id>', methods=['DELETE'])
 def delete_task_update(task_id, update_id):
     try:
-        result = tasks_collection.update_one(
+        task = tasks_collection.find_one_and_update(
             {"_id": ObjectId(task_id)},
-            {"$pull": {"updates": {"id": update_id}}}
+            {"$pull": {"updates": {"id": update_id}}},
+            projection={"user_email": 1}
         )
         
-        if result.matched_count == 0:
+        if not task:
             return jsonify({"error": "Task not found"}), 404
             
+        versions.bump(task.get('user_email'), 'task', id=task_id)
         return jsonify({"message": "Update item deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -524,12 +658,11 @@ def update_task(task_id):
         if result.matched_count == 0:
             return jsonify({"error": "Task not found"}), 404
             
+        versions.bump(current_task.get('user_email'), 'task', id=task_id)
+
         # Trigger analyses in background
         folder_id = update_fields.get('folderId') or current_task.get('folderId')
-        trigger_importance_analysis(folder_id=folder_id)
-        trigger_duplication_analysis(folder_id=folder_id)
-        trigger_label_analysis(folder_id=folder_id)
-        trigger_trash_analysis(folder_id=folder_id)
+        analysis_pipeline.schedule(folder_id=folder_id)
             
         return jsonify(update_fields), 200
     except Exception as e:
@@ -568,12 +701,10 @@ def create_task():
         
         result = tasks_collection.insert_one(new_task)
         new_task['_id'] = result.inserted_id
+        versions.bump(new_task.get('user_email'), 'task', id=str(new_task['_id']))
         
         # Trigger analyses in background
-        trigger_importance_analysis(folder_id=new_task.get('folderId'))
-        trigger_duplication_analysis(folder_id=new_task.get('folderId'))
-        trigger_label_analysis(folder_id=new_task.get('folderId'))
-        trigger_trash_analysis(folder_id=new_task.get('folderId'))
+        analysis_pipeline.schedule(folder_id=new_task.get('folderId'))
         
         return jsonify(serialize_doc(new_task)), 201
     except Exception as e:
@@ -605,10 +736,8 @@ def add_task_update(task_id):
         # Trigger analyses in background
         current_task = tasks_collection.find_one({"_id": ObjectId(task_id)})
         if current_task:
-            trigger_importance_analysis(folder_id=current_task.get('folderId'))
-            trigger_duplication_analysis(folder_id=current_task.get('folderId'))
-            trigger_label_analysis(folder_id=current_task.get('folderId'))
-            trigger_trash_analysis(folder_id=current_task.get('folderId'))
+            versions.bump(current_task.get('user_email'), 'task', id=task_id)
+            analysis_pipeline.schedule(folder_id=current_task.get('folderId'))
             
         return jsonify(update_item), 200
     except Exception as e:
@@ -622,19 +751,21 @@ def edit_task_update(task_id, update_id):
             return jsonify({"error": "Content is required"}), 400
 
         # We use array filters to update the specific item in the array
-        result = tasks_collection.update_one(
+        task = tasks_collection.find_one_and_update(
             {"_id": ObjectId(task_id), "updates.id": update_id},
             {
                 "$set": {
                     "updates.$.content": data['content'],
                     "updates.$.last_edited_at": datetime.utcnow().isoformat()
                 }
-            }
+            },
+            projection={"user_email": 1}
         )
         
-        if result.matched_count == 0:
+        if not task:
             return jsonify({"error": "Task or update item not found"}), 404
             
+        versions.bump(task.get('user_email'), 'task', id=task_id)
         return jsonify({"message": "Update item modified"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -642,19 +773,21 @@ def edit_task_update(task_id, update_id):
 @app.route('/api/tasks/<task_id>/close', methods=['POST'])
 def close_task(task_id):
     try:
-        result = tasks_collection.update_one(
+        task = tasks_collection.find_one_and_update(
             {"_id": ObjectId(task_id)},
             {
                 "$set": {
                     "status": "Closed",
                     "completed_at": datetime.utcnow().isoformat()
                 }
-            }
+            },
+            projection={"user_email": 1}
         )
         
-        if result.matched_count == 0:
+        if not task:
             return jsonify({"error": "Task not found"}), 404
             
+        versions.bump(task.get('user_email'), 'task', id=task_id)
         return jsonify({"message": "Task closed"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -663,570 +796,184 @@ def close_task(task_id):
 # ... existing imports
 # ... existing imports
 # ... existing imports
+import analysis
+import chat_context
 from ai_service import AIService
+from analyzers import ANALYZERS, AnalysisPipeline, default_analyzers
+from label_classifier import LabelClassifier
+from mindset import MindsetCache
 from skills import TimerSkill, AddTaskSkill
+from scheduler_lock import SchedulerLock, OFF as SCHEDULER_OFF, elect as elect_scheduler, scheduler_mode
+startup.mark('service_modules')
 
 # ... existing code
 
-# Initialize AI Service
-# Initialize AI Service
-ai_service = AIService()
+# Timer jobs run in a single elected process (scheduler_lock.py). The
+# scheduler is created and started after the first request (see
+# _start_timer_jobs), so flask_apscheduler stays off the cold-start path.
+scheduler = None
+scheduler_lock = SchedulerLock()
 
-# Initialize Scheduler
-scheduler = APScheduler()
-scheduler.init_app(app)
+ai_service = ai_admission = mindset_cache = label_classifier = analysis_pipeline = None
+timer_skill = add_task_skill = None
+_services_pid = None
 
-# Only start scheduler in the reloader child process or if not in debug mode
-if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not app.debug:
-    scheduler.start()
 
-# Initialize Skills
-timer_skill = TimerSkill(scheduler, ai_service, db)
-add_task_skill = AddTaskSkill(db)
-
-# --- Importance Analysis Helpers ---
-
-def perform_importance_analysis(folder_id=None):
-    try:
-        # Fetch active tasks
-        query = {"status": {"$nin": ["Deleted", "deleted", "Closed", "completed", "Archived", "archived"]}}
-        if folder_id:
-            query["folderId"] = folder_id
-        
-        # Use a list to hold the tasks for analysis
-        tasks = list(tasks_collection.find(query))
-        if not tasks:
-            return {"message": "No active tasks in scope", "important_count": 0}
-
-        # Run AI Analysis
-        analysis_result = ai_service.analyze_importance(tasks)
-        
-        # Handle both list and dict return types for backward compatibility safety
-        if isinstance(analysis_result, list):
-            critical_ids = analysis_result
-            notable_ids = []
-        else:
-            critical_ids = analysis_result.get('critical_task_ids', [])
-            notable_ids = analysis_result.get('notable_task_ids', [])
-        
-        updated_count = 0
-        if critical_ids or notable_ids:
-            from pymongo import UpdateOne
-            operations = []
-            
-            # 1. Manage "Important" Label (Critical)
-            important_label_color = "#f59e0b"
-            existing_imp_label = labels_collection.find_one({"name": "Important"})
-            if not existing_imp_label:
-                labels_collection.insert_one({
-                    "name": "Important",
-                    "color": important_label_color,
-                    "created_at": datetime.utcnow().isoformat(),
-                    "order": 0
-                })
-            elif existing_imp_label.get('color') != important_label_color:
-                labels_collection.update_one(
-                    {"_id": existing_imp_label["_id"]},
-                    {"$set": {"color": important_label_color}}
-                )
-
-            # 2. Manage "Notable" Label (Medium)
-            notable_label_color = "#fcd34d"
-            existing_notable_label = labels_collection.find_one({"name": "Notable"})
-            if not existing_notable_label:
-                labels_collection.insert_one({
-                    "name": "Notable",
-                    "color": notable_label_color,
-                    "created_at": datetime.utcnow().isoformat(),
-                    "order": 1
-                })
-            elif existing_notable_label.get('color') != notable_label_color:
-                labels_collection.update_one(
-                    {"_id": existing_notable_label["_id"]},
-                    {"$set": {"color": notable_label_color}}
-                )
-
-            # Convert ID lists to set of strings for fast lookup and safety
-            critical_set = set(str(uid) for uid in critical_ids)
-            notable_set = set(str(uid) for uid in notable_ids) - critical_set
-            
-            # Iterate over ALL analyzed tasks to enforce state
-            for task in tasks:
-                t_id_str = str(task['_id'])
-                
-                if t_id_str in critical_set:
-                    operations.append(
-                        UpdateOne({"_id": task['_id']}, {"$pull": {"labels": "Notable"}})
-                    )
-                    operations.append(
-                        UpdateOne({"_id": task['_id']}, {"$addToSet": {"labels": "Important"}})
-                    )
-                elif t_id_str in notable_set:
-                    operations.append(
-                        UpdateOne({"_id": task['_id']}, {"$pull": {"labels": "Important"}})
-                    )
-                    operations.append(
-                        UpdateOne({"_id": task['_id']}, {"$addToSet": {"labels": "Notable"}})
-                    )
-                else:
-                     operations.append(
-                        UpdateOne(
-                            {"_id": task['_id']},
-                            {"$pull": {"labels": {"$in": ["Important", "Notable"]}}}
-                        )
-                    )
-
-            if operations:
-                result = tasks_collection.bulk_write(operations)
-                updated_count = result.modified_count
-
-        return {
-            "message": "Analysis complete", 
-            "important_count": len(critical_ids),
-            "notable_count": len(notable_ids),
-            "updated_count": updated_count
-        }
-    except Exception as e:
-        print(f"Error in perform_importance_analysis: {e}")
-        return {"error": str(e)}
-
-def trigger_importance_analysis(folder_id=None):
-    """Trigger importance analysis in a background thread."""
-    threading.Thread(target=perform_importance_analysis, args=(folder_id,)).start()
-
-def perform_duplication_analysis(folder_id=None):
-    try:
-        # Fetch active tasks
-        query = {"status": {"$nin": ["Deleted", "deleted", "Closed", "completed", "Archived", "archived"]}}
-        if folder_id:
-            query["folderId"] = folder_id
-        
-        tasks = list(tasks_collection.find(query))
-        if not tasks:
-            return {"message": "No active tasks in scope", "duplicate_count": 0}
-
-        # Run AI Analysis
-        duplicate_ids = ai_service.analyze_duplicates(tasks)
-        
-        updated_count = 0
-        if duplicate_ids:
-            from pymongo import UpdateOne
-            operations = []
-            
-            # Ensure "Duplicate" Label exists (Neutral/Gray)
-            duplicate_label_color = "#9ca3af" # Gray-400
-            existing_label = labels_collection.find_one({"name": "Duplicate"})
-            if not existing_label:
-                labels_collection.insert_one({
-                    "name": "Duplicate",
-                    "color": duplicate_label_color,
-                    "created_at": datetime.utcnow().isoformat(),
-                    "order": 2
-                })
-            elif existing_label.get('color') != duplicate_label_color:
-                 labels_collection.update_one(
-                    {"_id": existing_label["_id"]},
-                    {"$set": {"color": duplicate_label_color}}
-                )
-            
-            dup_set = set(str(uid) for uid in duplicate_ids)
-            
-            for task in tasks:
-                t_id_str = str(task['_id'])
-                if t_id_str in dup_set:
-                    operations.append(
-                        UpdateOne({"_id": task['_id']}, {"$addToSet": {"labels": "Duplicate"}})
-                    )
-                else:
-                    operations.append(
-                        UpdateOne({"_id": task['_id']}, {"$pull": {"labels": "Duplicate"}})
-                    )
-
-            if operations:
-                result = tasks_collection.bulk_write(operations)
-                updated_count = result.modified_count
-
-        return {
-            "message": "Duplicate analysis complete", 
-            "duplicate_count": len(duplicate_ids) if duplicate_ids else 0,
-            "updated_count": updated_count
-        }
-    except Exception as e:
-        print(f"Error in perform_duplication_analysis: {e}")
-        return {"error": str(e)}
-
-def trigger_duplication_analysis(folder_id=None):
-    """Trigger duplication analysis in a background thread."""
-    threading.Thread(target=perform_duplication_analysis, args=(folder_id,)).start()
-
-# ... existing endpoints
-
-
-@app.route('/api/folders/<folder_id>/analyze_importance', methods=['POST'])
-def analyze_folder_importance(folder_id):
-    try:
-        # Verify folder exists
-        folder = folders_collection.find_one({"_id": ObjectId(folder_id)})
-        if not folder:
-            return jsonify({"error": "Folder not found"}), 404
-
-        result = perform_importance_analysis(folder_id)
-        if "error" in result:
-             return jsonify(result), 500
-        return jsonify(result), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/api/folders/<folder_id>/analyze_priority', methods=['POST'])
-def analyze_folder_priority(folder_id):
-    try:
-        # Verify folder exists
-        folder = folders_collection.find_one({"_id": ObjectId(folder_id)})
-        if not folder:
-            return jsonify({"error": "Folder not found"}), 404
-
-        # Fetch active tasks in folder
-        tasks = list(tasks_collection.find({
-            "folderId": folder_id,
-            "status": {"$nin": ["Deleted", "deleted", "Closed", "completed", "Archived", "archived"]}
-        }))
-
-        if not tasks:
-            return jsonify({"message": "No active tasks in folder", "top_priority_count": 0}), 200
-
-        # Run AI Analysis
-        top_ids = ai_service.analyze_priority(tasks)
-        
-        updated_count = 0
-        if top_ids is not None: # check for None to avoid clearing if error
-            from pymongo import UpdateOne
-            operations = []
-            
-            # Ensure "Priority" Label exists (Red)
-            priority_label_color = "#ef4444"
-            existing_label = labels_collection.find_one({"name": "Priority"})
-            if not existing_label:
-                labels_collection.insert_one({
-                    "name": "Priority",
-                    "color": priority_label_color,
-                    "created_at": datetime.utcnow().isoformat(),
-                    "order": 0
-                })
-            elif existing_label.get('color') != priority_label_color:
-                 labels_collection.update_one(
-                    {"_id": existing_label["_id"]},
-                    {"$set": {"color": priority_label_color}}
-                )
-            
-            top_set = set(str(uid) for uid in top_ids)
-            
-            for task in tasks:
-                t_id_str = str(task['_id'])
-                if t_id_str in top_set:
-                    # Mark as Priority, Set Priority High
-                    operations.append(
-                        UpdateOne(
-                            {"_id": task['_id']},
-                            {
-                                "$addToSet": {"labels": "Priority"},
-                                "$set": {"priority": "high"}
-                            }
-                        )
-                    )
-                else:
-                    # Remove Priority label and reset priority to medium (Override)
-                    operations.append(
-                        UpdateOne(
-                            {"_id": task['_id']},
-                            {
-                                "$pull": {"labels": "Priority"},
-                                "$set": {"priority": "medium"}
-                            }
-                        )
-                    )
-
-            if operations:
-                result = tasks_collection.bulk_write(operations)
-                updated_count = result.modified_count
-
-        return jsonify({
-            "message": "Priority analysis complete", 
-            "top_priority_count": len(top_ids) if top_ids else 0,
-            "updated_count": updated_count
-        }), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+def _start_timer_jobs():
+    """Start the scheduler and restore the persisted timers onto it."""
+    global scheduler
+    from flask_apscheduler import APScheduler
+    scheduler = APScheduler()
+    scheduler.init_app(app)
+    scheduler.start()
+    timer_skill.start(scheduler)
 
-@app.route('/api/tasks/analyze_priority', methods=['POST'])
-def analyze_all_active_priority():
-    try:
-        # Fetch ALL active tasks
-        tasks = list(tasks_collection.find({
-            "status": {"$nin": ["Deleted", "deleted", "Closed", "completed", "Archived", "archived"]}
-        }))
 
-        if not tasks:
-            return jsonify({"message": "No active tasks found", "top_priority_count": 0}), 200
+def _ensure_indexes():
+    traffic_rollups.ensure_indexes()
+    ai_usage_tracker.ensure_indexes()
+    change_feed.enable_pre_images()
 
-        # Run AI Analysis
-        top_ids = ai_service.analyze_priority(tasks)
-        
-        updated_count = 0
-        if top_ids is not None:
-            from pymongo import UpdateOne
-            operations = []
-            
-            # Ensure "Priority" Label exists (Red)
-            priority_label_color = "#ef4444"
-            existing_label = labels_collection.find_one({"name": "Priority"})
-            if not existing_label:
-                labels_collection.insert_one({
-                    "name": "Priority",
-                    "color": priority_label_color,
-                    "created_at": datetime.utcnow().isoformat(),
-                    "order": 0
-                })
-            elif existing_label.get('color') != priority_label_color:
-                 labels_collection.update_one(
-                    {"_id": existing_label["_id"]},
-                    {"$set": {"color": priority_label_color}}
-                )
-            
-            top_set = set(str(uid) for uid in top_ids)
-            
-            for task in tasks:
-                t_id_str = str(task['_id'])
-                if t_id_str in top_set:
-                    operations.append(
-                        UpdateOne(
-                            {"_id": task['_id']},
-                            {
-                                "$addToSet": {"labels": "Priority"},
-                                "$set": {"priority": "high"}
-                            }
-                        )
-                    )
-                else:
-                    operations.append(
-                        UpdateOne(
-                            {"_id": task['_id']},
-                            {
-                                "$pull": {"labels": "Priority"},
-                                "$set": {"priority": "medium"}
-                            }
-                        )
-                    )
-
-            if operations:
-                result = tasks_collection.bulk_write(operations)
-                updated_count = result.modified_count
 
-        return jsonify({
-            "message": "Priority analysis complete", 
-            "top_priority_count": len(top_ids) if top_ids else 0,
-            "updated_count": updated_count
-        }), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/api/folders/<folder_id>/analyze_duplicates', methods=['POST'])
-def analyze_folder_duplicates(folder_id):
-    try:
-        # Verify folder exists
-        folder = folders_collection.find_one({"_id": ObjectId(folder_id)})
-        if not folder:
-            return jsonify({"error": "Folder not found"}), 404
-
-        result = perform_duplication_analysis(folder_id)
-        if "error" in result:
-             return jsonify(result), 500
-        return jsonify(result), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/api/tasks/analyze_duplicates', methods=['POST'])
-def analyze_all_active_duplicates():
-    try:
-        result = perform_duplication_analysis()
-        if "error" in result:
-             return jsonify(result), 500
-        return jsonify(result), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+def init_services(run_scheduler=None):
+    """
+    Open this process's connections, clients and background threads.
 
-@app.route('/api/tasks/analyze_importance', methods=['POST'])
-def analyze_all_active_importance():
-    try:
-        result = perform_importance_analysis()
-        if "error" in result:
-             return jsonify(result), 500
-        return jsonify(result), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    Nothing opened here survives a fork, so with `gunicorn --preload` the
+    master imports the app with APP_DEFER_INIT=1 and every worker calls this
+    from the post_fork hook. Calling it again in the same process is a no-op.
 
-# --- Label Analysis Helpers ---
+    Only what a request needs is done here. Index creation and the timer
+    restore run once the first request has arrived (startup.after_ready),
+    and the Gemini client is created on first use (AIService.client).
 
-def perform_label_analysis(folder_id=None):
+    Args:
+        run_scheduler (bool, optional): Run timer jobs in this process.
+            Defaults to the SCHEDULER_MODE election.
+    """
+    global client, db, repos, tasks_collection, labels_collection, folders_collection, agents_collection
+    global traffic_rollups, log_buffer, ai_usage_tracker, ai_admission, change_feed
+    global ai_service, mindset_cache, label_classifier, analysis_pipeline, timer_skill, add_task_skill, _services_pid
+    if _services_pid == os.getpid():
+        return
+    _services_pid = os.getpid()
+
+    # Forked workers share the preloaded VersionStore; give each its own
+    # ETag namespace. Other processes' writes (more workers, the timer
+    # sidecar) only reach this one through a lagging change stream, so
+    # versioned reads go uncached there (VersionStore.authoritative).
+    versions.boot_id = uuid.uuid4().hex[:8]
+    versions.multi_process = int(os.getenv('WEB_CONCURRENCY', 1)) > 1 or scheduler_mode() == SCHEDULER_OFF
+
+    # Initialize storage (MongoDB, or the in-process store with STORAGE_BACKEND=memory)
     try:
-        # Fetch active tasks
-        query = {"status": {"$nin": ["Deleted", "deleted", "Closed", "completed", "Archived", "archived"]}}
-        if folder_id:
-            query["folderId"] = folder_id
-        
-        tasks = list(tasks_collection.find(query))
-        if not tasks:
-            return {"message": "No active tasks in scope", "labeled_count": 0}
-
-        # Fetch available labels
-        labels = list(labels_collection.find({}, {"name": 1}))
-        available_label_names = [l['name'] for l in labels]
-        
-        if not available_label_names:
-             return {"message": "No labels available for analysis", "labeled_count": 0}
-
-        # Run AI Analysis
-        # Returns dict: { task_id: ["Label"] }
-        task_labels_map = ai_service.analyze_labels(tasks, available_label_names)
-        
-        updated_count = 0
-        if task_labels_map:
-            from pymongo import UpdateOne
-            operations = []
-            
-            for t_id_str, labels in task_labels_map.items():
-                if labels and len(labels) > 0:
-                    label_to_add = labels[0] # Take the first one (should be only one)
-                    operations.append(
-                        UpdateOne(
-                            {"_id": ObjectId(t_id_str)}, 
-                            {"$addToSet": {"labels": label_to_add}}
-                        )
-                    )
-            
-            if operations:
-                result = tasks_collection.bulk_write(operations)
-                updated_count = result.modified_count
-
-        return {
-            "message": "Label analysis complete", 
-            "labeled_count": len(task_labels_map),
-            "updated_count": updated_count
-        }
+        with startup.phase('storage'):
+            client, db = open_storage(MONGO_URI, event_listeners=[metrics.MongoCommandMetrics()])
+            repos = Repositories(db)
+            tasks_collection = repos.tasks
+            labels_collection = repos.labels
+            folders_collection = repos.folders
+            agents_collection = repos.agents
+            logger.info("Connected to MongoDB" if storage_backend() == MONGO_BACKEND else "Using in-memory storage")
+
+            # Page-view and login audit logs are written behind the request and
+            # folded into hourly/daily rollups as each batch is flushed
+            traffic_rollups = TrafficRollups(repos)
+            log_buffer = LogBuffer(repos)
+            log_buffer.add_flush_listener(traffic_rollups.on_flush)
+
+            # Every AIService model call is accounted for and rolled up per user/day
+            ai_usage_tracker = AIUsageTracker(repos, log_buffer=log_buffer, metrics=metrics)
+            log_buffer.add_flush_listener(ai_usage_tracker.on_flush)
+            log_buffer.start()
+        startup.after_ready('indexes', _ensure_indexes)
     except Exception as e:
-        print(f"Error in perform_label_analysis: {e}")
-        return {"error": str(e)}
-
-def perform_trash_analysis(folder_id=None):
+        logger.error("Error connecting to MongoDB: %s", e)
+        client = None
+        db = repos = None
+        tasks_collection = None
+        ai_usage_tracker = AIUsageTracker(metrics=metrics)
+
+    # Server-sent change events: MongoDB change streams when available,
+    # otherwise events published by version bumps
+    with startup.phase('change_feed'):
+        change_feed = ChangeFeed(repos, versions)
+        change_feed.start()
+
+    with startup.phase('ai_service'):
+        # One admission queue for chat, timers and background analyses
+        ai_admission = AdmissionController(metrics=metrics)
+        ai_service = AIService(usage=ai_usage_tracker, admission=ai_admission, metrics=metrics)
+        # Stored per-user mindset maps, regenerated behind the page (mindset.py)
+        mindset_cache = MindsetCache(repos, ai_service, versions, usage=ai_usage_tracker) if repos else None
+        # Per-user label classifiers that settle most label analyses locally (label_classifier.py)
+        label_classifier = LabelClassifier(repos, versions) if repos else None
+        # The importance, duplicate, priority, label and trash passes (analyzers/)
+        analysis_pipeline = AnalysisPipeline(repos, versions, ai_service, default_analyzers(label_classifier)) \
+            if repos else None
+
+    with startup.phase('skills'):
+        if run_scheduler is None:
+            # Only start scheduler in the reloader child process or if not in debug mode
+            run_scheduler = (os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not app.debug) and \
+                elect_scheduler(scheduler_lock)
+
+        # Initialize Skills; timers are persisted right away and scheduled
+        # once the deferred restore has started the scheduler
+        timer_skill = TimerSkill(None, ai_service, repos, versions=versions, metrics=metrics,
+                                 run_jobs=run_scheduler)
+        add_task_skill = AddTaskSkill(repos, versions=versions)
+    if run_scheduler:
+        startup.after_ready('timers', _start_timer_jobs)
+
+    startup.start_deferred()
+
+
+def shutdown_services():
+    """Stop this process's jobs and background threads and close its connections."""
+    if scheduler is not None and scheduler.running:
+        scheduler.shutdown(wait=False)
+    scheduler_lock.release()
+    if change_feed:
+        change_feed.stop()
+    if log_buffer:
+        log_buffer.stop()
+    if client:
+        client.close()
+
+
+if os.getenv('APP_DEFER_INIT') != '1':
+    init_services()
+
+# --- Analysis passes (analyzers/) ---
+
+def _analysis_response(name, folder_id=None):
     try:
-        # Fetch active tasks
-        query = {"status": {"$nin": ["Deleted", "deleted", "Closed", "completed", "Archived", "archived"]}}
         if folder_id:
-            query["folderId"] = folder_id
-        
-        tasks = list(tasks_collection.find(query))
-        if not tasks:
-            return {"message": "No active tasks in scope", "trash_count": 0}
-
-        # Run AI Analysis
-        trash_ids = ai_service.analyze_trash(tasks)
-        
-        updated_count = 0
-        if trash_ids:
-            from pymongo import UpdateOne
-            operations = []
-            
-            # Ensure "Trash" Label exists
-            trash_label_color = "#52525b" # Zinc-600
-            existing_label = labels_collection.find_one({"name": "Trash"})
-            if not existing_label:
-                labels_collection.insert_one({
-                    "name": "Trash",
-                    "color": trash_label_color,
-                    "created_at": datetime.utcnow().isoformat(),
-                    "order": 4
-                })
-            
-            trash_set = set(str(uid) for uid in trash_ids)
-            
-            for task in tasks:
-                t_id_str = str(task['_id'])
-                if t_id_str in trash_set:
-                    # Label as Trash
-                    operations.append(
-                        UpdateOne({"_id": task['_id']}, {"$addToSet": {"labels": "Trash"}})
-                    )
-            
-            if operations:
-                result = tasks_collection.bulk_write(operations)
-                updated_count = result.modified_count
-
-        return {
-            "message": "Trash analysis complete", 
-            "trash_count": len(trash_ids) if trash_ids else 0,
-            "updated_count": updated_count
-        }
-    except Exception as e:
-        print(f"Error in perform_trash_analysis: {e}")
-        return {"error": str(e)}
-
-def trigger_label_analysis(folder_id=None):
-    """Trigger label analysis in a background thread."""
-    threading.Thread(target=perform_label_analysis, args=(folder_id,)).start()
+            # Verify folder exists
+            folder = folders_collection.find_one({"_id": ObjectId(folder_id)})
+            if not folder:
+                return jsonify({"error": "Folder not found"}), 404
 
-def trigger_trash_analysis(folder_id=None):
-    """Trigger trash analysis in a background thread."""
-    threading.Thread(target=perform_trash_analysis, args=(folder_id,)).start()
-
-@app.route('/api/tasks/analyze_memos', methods=['POST'])
-def analyze_all_active_labels():
-    try:
-        result = perform_label_analysis()
-        if "error" in result:
-             return jsonify(result), 500
-        return jsonify(result), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/api/tasks/analyze_trash', methods=['POST'])
-def analyze_all_active_trash():
-    try:
-        result = perform_trash_analysis()
+        result = analysis_pipeline.run([name], folder_id)[name]
         if "error" in result:
-             return jsonify(result), 500
+            return jsonify(result), 500
         return jsonify(result), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/folders/<folder_id>/analyze_memos', methods=['POST'])
-def analyze_folder_labels(folder_id):
-    try:
-        # Verify folder exists
-        folder = folders_collection.find_one({"_id": ObjectId(folder_id)})
-        if not folder:
-            return jsonify({"error": "Folder not found"}), 404
-
-        result = perform_label_analysis(folder_id)
-        if "error" in result:
-             return jsonify(result), 500
-        return jsonify(result), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
 
-@app.route('/api/folders/<folder_id>/analyze_trash', methods=['POST'])
-def analyze_folder_trash(folder_id):
-    try:
-        # Verify folder exists
-        folder = folders_collection.find_one({"_id": ObjectId(folder_id)})
-        if not folder:
-            return jsonify({"error": "Folder not found"}), 404
+def _add_analysis_routes():
+    """POST /api/tasks/analyze_<route> and /api/folders/<folder_id>/analyze_<route> for every analyzer."""
+    for analyzer in ANALYZERS:
+        route, name = analyzer.route, analyzer.name
+        app.add_url_rule(f'/api/folders/<folder_id>/analyze_{route}', f'analyze_folder_{route}',
+                         functools.partial(_analysis_response, name), methods=['POST'])
+        app.add_url_rule(f'/api/tasks/analyze_{route}', f'analyze_all_active_{route}',
+                         functools.partial(_analysis_response, name), methods=['POST'])
 
-        result = perform_trash_analysis(folder_id)
-        if "error" in result:
-             return jsonify(result), 500
-        return jsonify(result), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
 
+_add_analysis_routes()
 
 
 @app.route('/api/tasks/<task_id>/analyze', methods=['POST'])
@@ -1236,38 +983,17 @@ def analyze_task(task_id):
         if not task:
             return jsonify({"error": "Task not found"}), 404
             
-        analysis = ai_service.analyze_task(task['title'], task.get('updates', []))
+        with attribute_ai_usage(task.get('user_email')):
+            result = ai_service.analyze_task(task['title'], task.get('updates', []))
         
-        if not analysis:
+        if not result:
             return jsonify({"error": "AI analysis failed"}), 500
             
-        # Update task with analysis results
-
-        # Add analysis to timeline
-        update_item = {
-            "id": str(uuid.uuid4()),
-            "content": f"AI Plan: {analysis['suggestions']}",
-            "type": "ai_analysis",
-            "timestamp": datetime.utcnow().isoformat()
-        }
-
-        tasks_collection.update_one(
-            {"_id": ObjectId(task_id)},
-            {
-                "$set": {
-                    "ai_analysis": {
-                        "summary": analysis.get('summary'),
-                        "suggestions": analysis.get('suggestions')
-                    },
-                    "priority": analysis.get('priority', task['priority']),
-                    "category": analysis.get('category', task['category']),
-                    "importance": analysis.get('importance', task['importance'])
-                },
-                "$push": {"updates": update_item}
-            }
-        )
+        # Update task with analysis results and add the plan to the timeline
+        tasks_collection.update_one({"_id": ObjectId(task_id)}, analysis.task_analysis_update(task, result))
+        versions.bump(task.get('user_email'), 'task', id=task_id)
         
-        return jsonify(analysis), 200
+        return jsonify(result), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1282,76 +1008,23 @@ def chat():
         if not message:
             return jsonify({"error": "Message is required"}), 400
             
-        # Fetch tasks for context (RAG-lite)
-        query = {}
-        if 'user_email' in data:
-            query['user_email'] = data['user_email']
-        else:
-            query['$or'] = [{'user_email': None}, {'user_email': {'$exists': False}}]
+        # Fetch tasks for context (RAG-lite), restricted to the agent's
+        # assignments when agent_id is provided
+        agent = agents_collection.find_one({"_id": ObjectId(agent_id)}) if agent_id else None
+        query = chat_context.tasks_query(data, agent_id, agent)
+        tasks = list(tasks_collection.find(query).sort('created_at', -1))
         
-        # If agent_id is provided, fetch tasks assigned to this agent OR in assigned folders
-        if agent_id:
-            # Get agent to find assigned folders
-            agent = agents_collection.find_one({"_id": ObjectId(agent_id)})
-            agent_folder_ids = agent.get('assigned_folder_ids', []) if agent else []
-            
-            # Build OR query: assigned directly OR in assigned folder
-            or_conditions = [
-                {'assigned_agent_ids': agent_id},
-                {'assigned_agent_id': agent_id} # Legacy support
-            ]
-            
-            if agent_folder_ids:
-                or_conditions.append({'folderId': {'$in': agent_folder_ids}})
-                
-            query['$or'] = or_conditions
-            
-        cursor = tasks_collection.find(query).sort('created_at', -1)
-        tasks = list(cursor)
-        
-        # Serialize with enriched context for AI
-        tasks_context = []
-        for t in tasks:
-            # Get folder name if folderId exists
-            folder_name = None
-            if t.get('folderId'):
-                folder = folders_collection.find_one({"_id": ObjectId(t.get('folderId'))})
-                if folder:
-                    folder_name = folder.get('name')
-            
-            # Extract updates (last 3 for context)
-            updates = t.get('updates', [])
-            recent_updates = [u.get('content') for u in updates[-3:]] if updates else []
-            
-            # Extract attachments/linked items
-            attachments = t.get('attachments', [])
-            
-            tasks_context.append({
-                "title": t.get('title'),
-                "status": t.get('status'),
-                "priority": t.get('priority'),
-                "category": t.get('category'),
-                "labels": t.get('labels', []),  # Tags for categorization
-                "folder": folder_name,  # Folder/project context
-                "recent_updates": recent_updates,  # Latest progress
-                "linked_items": attachments  # Context items (URLs, files, etc.)
-            })
-            
-        # Fetch Agent Context if agent_id is provided
-        agent_context = None
-        if agent_id:
-            agent = agents_collection.find_one({"_id": ObjectId(agent_id)})
-            if agent:
-                agent_context = {
-                    "id": agent_id,
-                    "name": agent.get('name'),
-                    "role": agent.get('role'),
-                    "description": agent.get('description'),
-                    "notes": agent.get('notes', []),
-                    "skills": agent.get('skills', [])  # Include agent skills
-                }
+        # Serialize with enriched context for AI (one lookup for all folder names)
+        folder_ids = chat_context.folder_ids(tasks)
+        folder_names = {
+            str(f['_id']): f.get('name')
+            for f in folders_collection.find({"_id": {"$in": folder_ids}}, {"name": 1})
+        } if folder_ids else {}
+        tasks_context = [chat_context.task_context(t, folder_names) for t in tasks]
+        agent_context = chat_context.agent_context(agent_id, agent)
 
-        response_text = ai_service.chat_with_task_context(message, tasks_context, agent_context)
+        with attribute_ai_usage(data.get('user_email')):
+            response_text = ai_service.chat_with_task_context(message, tasks_context, agent_context)
         
         # Check if response includes function call to create task
         if isinstance(response_text, dict) and response_text.get('action') == 'create_task':
@@ -1383,6 +1056,7 @@ def chat():
 # --- Label Endpoints ---
 
 @app.route('/api/labels', methods=['GET'])
+@versioned_read(versions, response_cache, 'labels')
 def get_labels():
     try:
         user_email = request.args.get('user_email')
@@ -1418,6 +1092,7 @@ def create_label():
         
         result = labels_collection.insert_one(new_label)
         new_label['_id'] = result.inserted_id
+        versions.bump(new_label.get('user_email'), 'label', id=str(new_label['_id']))
         return jsonify(serialize_doc(new_label)), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1440,6 +1115,7 @@ def reorder_labels():
             
         if operations:
             labels_collection.bulk_write(operations)
+            bump_owners(labels_collection, label_ids, 'label')
             
         return jsonify({"message": "Labels reordered"}), 200
     except Exception as e:
@@ -1459,14 +1135,16 @@ def update_label(label_id):
         if not update_fields:
             return jsonify({"error": "No fields to update"}), 400
         
-        result = labels_collection.update_one(
+        label = labels_collection.find_one_and_update(
             {"_id": ObjectId(label_id)},
-            {"$set": update_fields}
+            {"$set": update_fields},
+            projection={"user_email": 1}
         )
         
-        if result.matched_count == 0:
+        if not label:
             return jsonify({"error": "Label not found"}), 404
             
+        versions.bump(label.get('user_email'), 'label', id=label_id)
         return jsonify({"message": "Label updated"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1474,7 +1152,9 @@ def update_label(label_id):
 @app.route('/api/labels/<label_id>', methods=['DELETE'])
 def delete_label(label_id):
     try:
-        result = labels_collection.delete_one({"_id": ObjectId(label_id)})
+        label = labels_collection.find_one_and_delete({"_id": ObjectId(label_id)}, projection={"user_email": 1})
+        if label:
+            versions.bump(label.get('user_email'), 'label', id=label_id)
         return jsonify({"message": "Label deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1482,6 +1162,7 @@ def delete_label(label_id):
 # --- Folder Endpoints ---
 
 @app.route('/api/folders', methods=['GET'])
+@versioned_read(versions, response_cache, 'folders')
 def get_folders():
     try:
         user_email = request.args.get('user_email')
@@ -1515,6 +1196,7 @@ def create_folder():
         
         result = folders_collection.insert_one(new_folder)
         new_folder['_id'] = result.inserted_id
+        versions.bump(new_folder.get('user_email'), 'folder', id=str(new_folder['_id']))
         return jsonify(serialize_doc(new_folder)), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1537,6 +1219,7 @@ def reorder_folders():
             
         if operations:
             folders_collection.bulk_write(operations)
+            bump_owners(folders_collection, folder_ids, 'folder')
             
         return jsonify({"message": "Folders reordered"}), 200
     except Exception as e:
@@ -1554,14 +1237,16 @@ def update_folder(folder_id):
         if not update_fields:
             return jsonify({"error": "No fields to update"}), 400
         
-        result = folders_collection.update_one(
+        folder = folders_collection.find_one_and_update(
             {"_id": ObjectId(folder_id)},
-            {"$set": update_fields}
+            {"$set": update_fields},
+            projection={"user_email": 1}
         )
         
-        if result.matched_count == 0:
+        if not folder:
             return jsonify({"error": "Folder not found"}), 404
             
+        versions.bump(folder.get('user_email'), 'folder', id=folder_id)
         return jsonify({"message": "Folder updated"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1570,12 +1255,16 @@ def update_folder(folder_id):
 def delete_folder(folder_id):
     try:
         # Also need to unset folderId from tasks
+        task_owners = [t.get('user_email') for t in tasks_collection.find({"folderId": folder_id}, {"user_email": 1})]
         tasks_collection.update_many(
             {"folderId": folder_id},
             {"$unset": {"folderId": ""}}
         )
         
-        result = folders_collection.delete_one({"_id": ObjectId(folder_id)})
+        folder = folders_collection.find_one_and_delete({"_id": ObjectId(folder_id)}, projection={"user_email": 1})
+        if folder:
+            task_owners.append(folder.get('user_email'))
+        versions.bump_many(task_owners, 'folder', id=folder_id)
         return jsonify({"message": "Folder deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1614,6 +1303,7 @@ def manage_folder_assignment(folder_id):
                 {"_id": ObjectId(agent_id)},
                 {"$addToSet": {"assigned_folder_ids": str(folder_id)}}
             )
+            versions.bump(agent.get('user_email'), 'agent', id=agent_id)
             return jsonify({"message": "Folder assigned to agent"}), 200
             
         elif request.method == 'DELETE':
@@ -1622,6 +1312,7 @@ def manage_folder_assignment(folder_id):
                 {"_id": ObjectId(agent_id)},
                 {"$pull": {"assigned_folder_ids": str(folder_id)}}
             )
+            versions.bump(agent.get('user_email'), 'agent', id=agent_id)
             return jsonify({"message": "Folder unassigned from agent"}), 200
 
     except Exception as e:
@@ -1632,6 +1323,7 @@ def manage_folder_assignment(folder_id):
 @app.route('/api/agents', methods=['GET'])
 
 @app.route('/api/agents', methods=['GET'])
+@versioned_read(versions, response_cache, 'agents')
 def get_agents():
     try:
         user_email = request.args.get('user_email')
@@ -1699,6 +1391,7 @@ def create_agent():
         
         result = agents_collection.insert_one(new_agent)
         new_agent['_id'] = result.inserted_id
+        versions.bump(new_agent.get('user_email'), 'agent', id=str(new_agent['_id']))
         return jsonify(serialize_doc(new_agent)), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1717,14 +1410,16 @@ def update_agent(agent_id):
         if not update_fields:
             return jsonify({"error": "No fields to update"}), 400
         
-        result = agents_collection.update_one(
+        agent = agents_collection.find_one_and_update(
             {"_id": ObjectId(agent_id)},
-            {"$set": update_fields}
+            {"$set": update_fields},
+            projection={"user_email": 1}
         )
         
-        if result.matched_count == 0:
+        if not agent:
             return jsonify({"error": "Agent not found"}), 404
             
+        versions.bump(agent.get('user_email'), 'agent', id=agent_id)
         return jsonify({"message": "Agent updated"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1732,7 +1427,9 @@ def update_agent(agent_id):
 @app.route('/api/agents/<agent_id>', methods=['DELETE'])
 def delete_agent(agent_id):
     try:
-        result = agents_collection.delete_one({"_id": ObjectId(agent_id)})
+        agent = agents_collection.find_one_and_delete({"_id": ObjectId(agent_id)}, projection={"user_email": 1})
+        if agent:
+            versions.bump(agent.get('user_email'), 'agent', id=agent_id)
         return jsonify({"message": "Agent deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1751,14 +1448,16 @@ def add_agent_note(agent_id):
             "timestamp": datetime.utcnow().isoformat()
         }
         
-        result = agents_collection.update_one(
+        agent = agents_collection.find_one_and_update(
             {"_id": ObjectId(agent_id)},
-            {"$push": {"notes": note_item}}
+            {"$push": {"notes": note_item}},
+            projection={"user_email": 1}
         )
         
-        if result.matched_count == 0:
+        if not agent:
             return jsonify({"error": "Agent not found"}), 404
             
+        versions.bump(agent.get('user_email'), 'agent', id=agent_id)
         return jsonify(note_item), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1766,14 +1465,16 @@ def add_agent_note(agent_id):
 @app.route('/api/agents/<agent_id>/notes/<note_id>', methods=['DELETE'])
 def delete_agent_note(agent_id, note_id):
     try:
-        result = agents_collection.update_one(
+        agent = agents_collection.find_one_and_update(
             {"_id": ObjectId(agent_id)},
-            {"$pull": {"notes": {"id": note_id}}}
+            {"$pull": {"notes": {"id": note_id}}},
+            projection={"user_email": 1}
         )
         
-        if result.matched_count == 0:
+        if not agent:
             return jsonify({"error": "Agent not found"}), 404
             
+        versions.bump(agent.get('user_email'), 'agent', id=agent_id)
         return jsonify({"message": "Note deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1785,20 +1486,27 @@ def update_agent_note(agent_id, note_id):
         if not data or 'content' not in data:
             return jsonify({"error": "Content is required"}), 400
             
-        result = agents_collection.update_one(
+        agent = agents_collection.find_one_and_update(
             {"_id": ObjectId(agent_id), "notes.id": note_id},
-            {"$set": {"notes.$.content": data['content']}}
+            {"$set": {"notes.$.content": data['content']}},
+            projection={"user_email": 1}
         )
         
-        if result.matched_count == 0:
+        if not agent:
             return jsonify({"error": "Agent or note not found"}), 404
             
+        versions.bump(agent.get('user_email'), 'agent', id=agent_id)
         return jsonify({"message": "Note updated"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # --- Skill Endpoints ---
 
+def notify_agent_owner(agent_id, kind, **details):
+    """Bump (and publish to) the user owning `agent_id`."""
+    agent = agents_collection.find_one({"_id": ObjectId(agent_id)}, {"user_email": 1})
+    versions.bump(agent.get('user_email') if agent else None, kind, id=agent_id, **details)
+
 @app.route('/api/agents/<agent_id>/skills/timer', methods=['POST'])
 def start_timer_skill(agent_id):
     try:
@@ -1815,6 +1523,7 @@ def start_timer_skill(agent_id):
         # For now, require taskIds or defaults to empty (which does nothing but run the timer loop)
         
         job_id = timer_skill.start_timer(agent_id, interval, instruction, task_ids)
+        notify_agent_owner(agent_id, 'timer', job_id=job_id, action='started')
         
         return jsonify({
             "message": "Timer started",
@@ -1840,6 +1549,7 @@ def stop_timer_skill(agent_id, job_id):
     try:
         success = timer_skill.stop_timer(job_id)
         if success:
+            notify_agent_owner(agent_id, 'timer', job_id=job_id, action='stopped')
             return jsonify({"message": "Timer stopped"}), 200
         else:
             return jsonify({"error": "Timer job not found"}), 404
@@ -1882,7 +1592,7 @@ def create_task_via_skill(agent_id):
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Error creating task via skill: {e}")
+        logger.exception("Error creating task via skill: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/agents/<agent_id>/skills/add-task/tasks', methods=['GET'])
@@ -1954,19 +1664,20 @@ def _is_within_24h(timestamp_str):
 @app.route('/api/mindset', methods=['GET'])
 def get_mindset_map():
     try:
-        # Fetch all active tasks
-        tasks = list(tasks_collection.find({'status': {'$ne': 'Closed'}}))
-        serialized_tasks = [serialize_doc(t) for t in tasks]
-        
-        mindset_data = ai_service.generate_mindset_map(serialized_tasks)
-        
+        # The user's stored map; only the first visit waits for the model
+        user_email = request.args.get('user_email')
+        with attribute_ai_usage(user_email):
+            mindset_data = mindset_cache.get(user_email)
+
         if not mindset_data:
             return jsonify({'error': 'Failed to generate mindset map'}), 500
             
         return jsonify(mindset_data), 200
     except Exception as e:
-        print(f"Error fetching mindset map: {e}")
+        logger.exception("Error fetching mindset map: %s", e)
         return jsonify({'error': str(e)}), 500
 
+startup.mark('routes')
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001, use_reloader=False)
@@ -0,0 +1,292 @@
+"""
+Structured, non-blocking logging for the backend.
+
+`configure_logging()` puts a bounded QueueHandler on the root logger, so a
+log call on a request thread only formats the message and enqueues it; a
+QueueListener thread does the actual stdout write. Records are emitted as
+one JSON object per line (LOG_FORMAT=text for local development), carry the
+current request ID, and can be sampled per logger for high-volume lines.
+
+Environment:
+    LOG_LEVEL: Root level, default INFO
+    LOG_FORMAT: "json" (default) or "text"
+    LOG_SAMPLING: Comma separated logger=rate pairs, e.g. "access=0.1,skills.timer=0.5".
+        Only records below WARNING are sampled.
+    LOG_QUEUE_SIZE: Records buffered before new ones are dropped, default 10000
+"""
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, request
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+access_logger = logging.getLogger('access')
+
+_listener = None
+_queue_handler = None
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+@contextlib.contextmanager
+def bind_request_id(request_id=None):
+    """Run the block with `request_id` (or a fresh one) attached to every log record."""
+    token = _request_id.set(request_id or new_request_id())
+    try:
+        yield _request_id.get()
+    finally:
+        _request_id.reset(token)
+
+
+def start_thread(target, *args, name=None, **kwargs):
+    """
+    Start a background thread that inherits the caller's context.
+
+    The thread runs inside a copy of the current contextvars, so the request
+    ID (and any other context such as AI usage attribution) follows the work
+    into analysis threads.
+    """
+    context = contextvars.copy_context()
+    thread = threading.Thread(target=context.run, args=(target, *args), kwargs=kwargs, name=name)
+    thread.start()
+    return thread
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the request ID of the thread that logged them."""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of DEBUG/INFO records per logger.
+
+    Args:
+        rates (dict): Logger name -> fraction kept (0..1). A rate applies to
+            the named logger and its children; the most specific name wins.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+        self.sampled_out = 0
+
+    def rate_for(self, logger_name):
+        name = logger_name
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: timestamp, level, logger, message, request ID and any `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        entry['thread'] = record.threadName
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = None
+        return super().format(record)
+
+
+class _BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Resolve the message and traceback on the calling thread, but leave
+        # the structured fields on the record for the formatter
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parse_sampling(spec):
+    rates = {}
+    for part in (spec or '').split(','):
+        name, _, rate = part.strip().partition('=')
+        if not name or not rate:
+            continue
+        try:
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+def configure_logging(level=None, fmt=None, sampling=None, stream=None):
+    """
+    Route all logging through a queue to a background writer. Safe to call more than once.
+
+    Args:
+        level (str): Root level, defaults to LOG_LEVEL or INFO
+        fmt (str): "json" or "text", defaults to LOG_FORMAT or json
+        sampling (dict): Logger name -> fraction of DEBUG/INFO records kept,
+            defaults to LOG_SAMPLING
+        stream: Output stream, defaults to stdout
+    """
+    global _listener, _queue_handler
+    shutdown_logging()
+
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    fmt = (fmt or os.getenv('LOG_FORMAT', 'json')).lower()
+    if sampling is None:
+        sampling = _parse_sampling(os.getenv('LOG_SAMPLING'))
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(TextFormatter() if fmt == 'text' else JsonFormatter())
+
+    _queue_handler = _BoundedQueueHandler(queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', 10000))))
+    _queue_handler.addFilter(RequestIdFilter())
+    _queue_handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    # Werkzeug's own access log duplicates the access logger below
+    logging.getLogger('werkzeug').setLevel(max(logging.WARNING, root.level))
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Stop the listener thread after writing out everything queued."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def stats():
+    """Queue depth and drop counters for health/debug endpoints."""
+    if _queue_handler is None:
+        return {'configured': False}
+    sampler = next((f for f in _queue_handler.filters if isinstance(f, SamplingFilter)), None)
+    return {
+        'configured': True,
+        'queued': _queue_handler.queue.qsize(),
+        'dropped': _queue_handler.dropped,
+        'sampled_out': sampler.sampled_out if sampler else 0
+    }
+
+
+def _before_request():
+    g._log_token = _request_id.set(request.headers.get(REQUEST_ID_HEADER) or new_request_id())
+    g._log_started = time.perf_counter()
+
+
+def log_access(method, path, status, started):
+    """Write the access log line for a request that started at perf_counter() `started`."""
+    if access_logger.isEnabledFor(logging.INFO):
+        access_logger.info(
+            '%s %s %s', method, path, status,
+            extra={
+                'method': method,
+                'path': path,
+                'status': status,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3)
+            }
+        )
+
+
+def _after_request(response):
+    response.headers[REQUEST_ID_HEADER] = _request_id.get() or ''
+    started = g.get('_log_started')
+    if started is not None:
+        log_access(request.method, request.path, response.status_code, started)
+    return response
+
+
+def _teardown_request(error):
+    token = g.pop('_log_token', None)
+    if token is not None:
+        try:
+            _request_id.reset(token)
+        except ValueError:
+            # Torn down from a different context (e.g. a streamed response)
+            _request_id.set(None)
+
+
+def init_app(app):
+    """Assign a request ID to every request (honouring X-Request-ID) and write one access log line."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
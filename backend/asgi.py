@@ -0,0 +1,235 @@
+"""
+ASGI entry point: async handlers for the routes that wait on Gemini, Flask for everything else.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 8080
+
+Chat, single-task analysis, the mindset map and the folder/all analyze_*
+endpoints run as coroutines on the genai async client (`AIService.*_async`)
+and an asyncio MongoDB driver, so a request waiting on the model holds a
+suspended coroutine instead of a worker thread and one process can keep
+hundreds of them in flight. The /api/events stream is a coroutine too, so
+open tabs don't hold threads either. Every other route is the unchanged Flask app,
+mounted through a2wsgi on a pool of ASGI_WSGI_THREADS (default 8) threads
+that model calls no longer occupy. `gunicorn app:app` remains the
+synchronous entry point.
+"""
+import contextlib
+import functools
+import logging
+import os
+import time
+
+from a2wsgi import WSGIMiddleware
+from bson import ObjectId
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import analysis
+import app as wsgi
+import chat_context
+import metrics
+import startup
+from ai_usage import attribute as attribute_ai_usage
+from analyzers import ANALYZERS
+from app_logging import REQUEST_ID_HEADER, bind_request_id, log_access
+from serialization import JSON_MIMETYPE, dumps
+from storage import MEMORY_BACKEND, Repositories, storage_backend
+from storage.aio import open_async_storage
+
+logger = logging.getLogger(__name__)
+
+versions = wsgi.versions
+
+# Opened on first use inside the event loop; AsyncMongoClient binds to the running loop
+async_client = None
+repos = None
+
+
+def _repos():
+    global async_client, repos
+    if repos is None and wsgi.db is not None:
+        memory_db = wsgi.db if storage_backend() == MEMORY_BACKEND else None
+        async_client, db = open_async_storage(
+            wsgi.MONGO_URI, memory_db=memory_db, event_listeners=[metrics.MongoCommandMetrics()]
+        )
+        repos = Repositories(db)
+    return repos
+
+
+def json_response(body, status=200):
+    return Response(dumps(body), status_code=status, media_type=JSON_MIMETYPE)
+
+
+def endpoint(rule):
+    """
+    Wrap an async handler with what the Flask hooks give the sync routes:
+    request ID, access log line, HTTP metrics and a JSON 500 on errors.
+
+    Args:
+        rule (str): Flask-style rule used as the metrics endpoint label
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            started = time.perf_counter()
+            startup.request_started()
+            metrics.http_in_flight.inc()
+            status = 500
+            try:
+                with bind_request_id(request.headers.get(REQUEST_ID_HEADER)) as request_id:
+                    try:
+                        response = await handler(request, **request.path_params)
+                    except Exception as e:
+                        logger.exception("Error in %s: %s", rule, e)
+                        response = json_response({"error": str(e)}, 500)
+                    status = response.status_code
+                    response.headers[REQUEST_ID_HEADER] = request_id
+                    startup.response_sent()
+                    log_access(request.method, request.url.path, status, started)
+                return response
+            finally:
+                metrics.http_in_flight.dec()
+                metrics.observe_request(request.method, rule, status, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+# --- Analysis ---
+
+async def perform_analysis(name, folder_id=None):
+    """Run one analyzer of the shared pipeline (analyzers/) on the async driver."""
+    return (await wsgi.analysis_pipeline.run_async(_repos(), [name], folder_id))[name]
+
+
+def _analysis_routes(route, name):
+    @endpoint(f'/api/folders/<folder_id>/analyze_{route}')
+    async def analyze_folder(request, folder_id):
+        # Verify folder exists
+        folder = await _repos().folders.find_one({"_id": ObjectId(folder_id)})
+        if not folder:
+            return json_response({"error": "Folder not found"}, 404)
+
+        result = await perform_analysis(name, folder_id)
+        return json_response(result, 500 if "error" in result else 200)
+
+    @endpoint(f'/api/tasks/analyze_{route}')
+    async def analyze_all(request):
+        result = await perform_analysis(name)
+        return json_response(result, 500 if "error" in result else 200)
+
+    return [
+        Route(f'/api/folders/{{folder_id}}/analyze_{route}', analyze_folder, methods=['POST']),
+        Route(f'/api/tasks/analyze_{route}', analyze_all, methods=['POST']),
+    ]
+
+
+@endpoint('/api/tasks/<task_id>/analyze')
+async def analyze_task(request, task_id):
+    db = _repos()
+    task = await db.tasks.find_one({"_id": ObjectId(task_id)})
+    if not task:
+        return json_response({"error": "Task not found"}, 404)
+
+    with attribute_ai_usage(task.get('user_email')):
+        result = await wsgi.ai_service.analyze_task_async(task['title'], task.get('updates', []))
+    if not result:
+        return json_response({"error": "AI analysis failed"}, 500)
+
+    await db.tasks.update_one({"_id": ObjectId(task_id)}, analysis.task_analysis_update(task, result))
+    versions.bump(task.get('user_email'), 'task', id=task_id)
+    return json_response(result)
+
+
+# --- Chat ---
+
+@endpoint('/api/chat')
+async def chat(request):
+    data = await request.json()
+    message = data.get('message')
+    agent_id = data.get('agent_id')  # Optional: filter tasks by agent
+    if not message:
+        return json_response({"error": "Message is required"}, 400)
+
+    db = _repos()
+    agent = await db.agents.find_one({"_id": ObjectId(agent_id)}) if agent_id else None
+    query = chat_context.tasks_query(data, agent_id, agent)
+    tasks = await db.tasks.find(query).sort('created_at', -1).to_list(None)
+
+    folder_ids = chat_context.folder_ids(tasks)
+    folder_names = {}
+    if folder_ids:
+        folders = await db.folders.find({"_id": {"$in": folder_ids}}, {"name": 1}).to_list(None)
+        folder_names = {str(f['_id']): f.get('name') for f in folders}
+    tasks_context = [chat_context.task_context(t, folder_names) for t in tasks]
+    agent_context = chat_context.agent_context(agent_id, agent)
+
+    with attribute_ai_usage(data.get('user_email')):
+        response_text = await wsgi.ai_service.chat_with_task_context_async(message, tasks_context, agent_context)
+
+    if isinstance(response_text, dict) and response_text.get('action') == 'create_task':
+        task_data = response_text.get('task_data', {})
+        user_email = data.get('user_email')
+        if user_email:
+            task_data['user_email'] = user_email
+        try:
+            new_task = await wsgi.add_task_skill.create_task_async(db, agent_id, task_data)
+            return json_response({
+                "reply": f"✅ I've created the task: **{task_data.get('title')}**",
+                "task_created": wsgi.serialize_doc(new_task)
+            })
+        except Exception as e:
+            return json_response({"reply": f"I tried to create the task but encountered an error: {str(e)}"})
+
+    return json_response({"reply": response_text})
+
+
+@endpoint('/api/mindset')
+async def get_mindset_map(request):
+    user_email = request.query_params.get('user_email')
+    with attribute_ai_usage(user_email):
+        mindset_data = await wsgi.mindset_cache.get_async(_repos(), user_email)
+    if not mindset_data:
+        return json_response({'error': 'Failed to generate mindset map'}, 500)
+    return json_response(mindset_data)
+
+
+@endpoint('/api/events')
+async def stream_events(request):
+    user_email = request.query_params.get('user_email')
+    # EventSource resends the last id it saw when it reconnects
+    last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+    return StreamingResponse(
+        wsgi.change_feed.stream_async(user_email, last_event_id),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    _repos()
+    yield
+    if async_client is not None:
+        await async_client.close()
+
+
+routes = [
+    Route('/api/chat', chat, methods=['POST']),
+    Route('/api/mindset', get_mindset_map, methods=['GET']),
+    Route('/api/events', stream_events, methods=['GET']),
+    Route('/api/tasks/{task_id}/analyze', analyze_task, methods=['POST']),
+]
+for _analyzer in ANALYZERS:
+    routes.extend(_analysis_routes(_analyzer.route, _analyzer.name))
+# Everything else: the synchronous Flask app on its own thread pool
+routes.append(Mount('/', app=WSGIMiddleware(wsgi.app, workers=int(os.getenv('ASGI_WSGI_THREADS', 8)))))
+
+application = Starlette(
+    routes=routes,
+    # flask_cors only sees the mounted routes; this covers both and answers preflights
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
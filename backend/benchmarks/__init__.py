@@ -0,0 +1,14 @@
+"""
+End-to-end API benchmarks.
+
+Boots the Flask app in-process against the in-memory store (or a local
+MongoDB), points AIService at the offline Gemini stand-in (fake_genai.py),
+seeds a synthetic workload and reports p50/p95/p99 latency and throughput
+per scenario as JSON:
+
+    cd backend
+    python -m benchmarks --tasks-per-user 5000 --concurrency 8
+    python -m benchmarks --ai-latency lognormal:900:0.6 --ai-error-rate 0.02
+    python -m benchmarks --backend mongo --mongo-uri mongodb://localhost:27017
+    python -m benchmarks --scenarios 'tasks.*' --baseline benchmarks/results/previous.json
+"""
@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import time
+
+from benchmarks.runner import (
+    BACKEND_DIR, HEADER, boot_app, build_report, build_scenarios, format_row, run_benchmarks, select
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Benchmark the Dorae AI API in-process.")
+    parser.add_argument('--backend', choices=['memory', 'mongo'], default='memory')
+    parser.add_argument('--mongo-uri', help="Local MongoDB URI for --backend mongo (default mongodb://localhost:27017)")
+    parser.add_argument('--db-name', default='dorae_bench', help="Database seeded and cleared by the run")
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--tasks-per-user', type=int, default=2000)
+    parser.add_argument('--folders-per-user', type=int, default=8)
+    parser.add_argument('--labels-per-user', type=int, default=8)
+    parser.add_argument('--agents-per-user', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=200, help="Requests per read scenario")
+    parser.add_argument('--write-iterations', type=int, default=50, help="Requests per mutation scenario")
+    parser.add_argument('--analysis-iterations', type=int, default=5, help="Calls per analysis pass")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--ai-latency', default='fixed:0',
+                        help="Fake Gemini latency: fixed:<ms>, uniform:<min>:<max> or lognormal:<median>:<sigma>")
+    parser.add_argument('--ai-error-rate', type=float, default=0.0, help="Fraction of fake Gemini calls failing with 503")
+    parser.add_argument('--ai-rpm', type=int, help="Fake per-model requests-per-minute quota")
+    parser.add_argument('--ai-mode', choices=['synthetic', 'replay'], default='synthetic')
+    parser.add_argument('--ai-cassette', help="Recorded responses for --ai-mode replay")
+    parser.add_argument('--scenarios', nargs='*', help="Glob patterns of scenarios to run, e.g. 'tasks.*'")
+    parser.add_argument('--output', help="Result file (default benchmarks/results/bench-<timestamp>.json)")
+    parser.add_argument('--baseline', help="Earlier result file to compare p50 latencies against")
+    parser.add_argument('--verbose', action='store_true', help="Keep the app's INFO logging (access log, timer ticks)")
+    args = parser.parse_args()
+
+    appmod = boot_app(args.backend, args.mongo_uri, args.db_name, ai_env={
+        'AI_FAKE_MODE': args.ai_mode,
+        'AI_FAKE_CASSETTE': args.ai_cassette,
+        'AI_FAKE_LATENCY': args.ai_latency,
+        'AI_FAKE_ERROR_RATE': args.ai_error_rate,
+        'AI_FAKE_RPM': args.ai_rpm,
+        'AI_FAKE_SEED': args.seed,
+    }, log_level=None if args.verbose else 'WARNING')
+
+    from benchmarks.seed import seed_data
+    started = time.perf_counter()
+    seeded = seed_data(appmod.repos, users=args.users, tasks_per_user=args.tasks_per_user,
+                       folders_per_user=args.folders_per_user, labels_per_user=args.labels_per_user,
+                       agents_per_user=args.agents_per_user, seed=args.seed)
+    print(f"Seeded {args.users} users x {args.tasks_per_user} tasks in {time.perf_counter() - started:.1f}s")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    scenarios = select(build_scenarios(args.write_iterations, args.analysis_iterations), args.scenarios)
+    print(HEADER)
+    results = run_benchmarks(appmod, seeded, scenarios, iterations=args.iterations, concurrency=args.concurrency,
+                             warmup=args.warmup,
+                             on_result=lambda name, result: print(format_row(name, result, baseline), flush=True))
+
+    report = build_report(results, vars(args), seeded, ai_stats=appmod.ai_service.client.stats())
+    output = args.output or os.path.join(BACKEND_DIR, 'benchmarks', 'results',
+                                         f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    appmod.app_logging.shutdown_logging()
+    os._exit(0)  # The app's scheduler and background threads are not daemonized
+
+
+if __name__ == '__main__':
+    main()
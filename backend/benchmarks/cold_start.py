@@ -0,0 +1,98 @@
+"""
+Time-to-first-response of a freshly started process.
+
+    python -m benchmarks.cold_start --runs 10
+
+Each run spawns a new interpreter that imports the app, initializes its
+services and serves one request through the Flask test client, which is
+what a Cloud Run instance does before answering the request that woke it.
+The wall time is measured from spawning the process to the response being
+complete; the child's startup report (startup.py) breaks it down into
+interpreter, import, init and first-request time.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.runner import BACKEND_DIR, git_commit, summarize
+
+
+def child(path):
+    import app as appmod
+
+    response = appmod.app.test_client().get(path)
+    done = time.time()
+    report = appmod.startup.report()
+    print(json.dumps({'done': done, 'status': response.status_code, 'startup': report}), flush=True)
+    os._exit(0)  # Skip the background threads' shutdown, it is not part of the cold start
+
+
+def run_once(path, env):
+    spawned = time.time()
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.cold_start', '--child', '--path', path],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['wall_s'] = result.pop('done') - spawned
+    return result
+
+
+def _median(values):
+    values = sorted(v for v in values if v is not None)
+    return values[len(values) // 2] if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.cold_start',
+                                     description="Measure time-to-first-response of fresh app processes.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/api/health?verbose=1', help="First request served by each process")
+    parser.add_argument('--backend', choices=['memory', 'mongo'], default='memory')
+    parser.add_argument('--mongo-uri', help="MongoDB URI for --backend mongo (default mongodb://localhost:27017)")
+    parser.add_argument('--output', help="Result file (default benchmarks/results/cold-start-<timestamp>.json)")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.path)
+
+    env = dict(os.environ, STORAGE_BACKEND=args.backend, AI_BACKEND='fake', LOG_LEVEL='WARNING',
+               SCHEDULER_MODE='on', MONGO_DB_NAME='dorae_bench')
+    env.pop('APP_DEFER_INIT', None)
+    if args.backend == 'mongo':
+        env['MONGO_URI'] = args.mongo_uri or 'mongodb://localhost:27017'
+
+    runs = []
+    for index in range(args.runs):
+        result = run_once(args.path, env)
+        runs.append(result)
+        report = result['startup']
+        print(f"run {index + 1}: {result['wall_s'] * 1000:8.1f} ms to first response "
+              f"(interpreter {report['interpreter_ms']} ms, import {report['import_ms']} ms, "
+              f"init {report['init_ms']} ms, status {result['status']})", flush=True)
+
+    summary = summarize([r['wall_s'] for r in runs], sum(r['status'] >= 500 for r in runs), None)
+    for key in ('interpreter_ms', 'import_ms', 'init_ms', 'first_response_ms'):
+        summary[f'median_{key}'] = _median([r['startup'][key] for r in runs])
+    print(f"p50 {summary['p50_ms']} ms, max {summary['max_ms']} ms to first response over {len(runs)} runs")
+
+    report = {
+        'commit': git_commit(),
+        'config': vars(args),
+        'summary': summary,
+        'runs': runs,
+    }
+    output = args.output or os.path.join(BACKEND_DIR, 'benchmarks', 'results',
+                                         f"cold-start-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+import fnmatch
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def boot_app(backend='memory', mongo_uri=None, db_name='dorae_bench', ai_env=None, log_level='WARNING'):
+    """
+    Import the Flask app against the chosen storage backend and the fake Gemini client.
+
+    Storage and AI are selected through the same env vars the app reads at
+    import time, so this must run before anything else imports `app`.
+
+    Args:
+        ai_env (dict): AI_FAKE_* settings for fake_genai (latency, error rate, mode, ...)
+        log_level (str): App LOG_LEVEL; the default keeps the per-request access log out of the report
+    """
+    if backend == 'mongo' and db_name == 'dorae_db':
+        raise SystemExit("Refusing to benchmark against the application database 'dorae_db'")
+    os.environ['STORAGE_BACKEND'] = backend
+    os.environ['AI_BACKEND'] = 'fake'
+    for key, value in (ai_env or {}).items():
+        if value is not None:
+            os.environ[key] = str(value)
+    os.environ['MONGO_DB_NAME'] = db_name
+    # The timer scenario drives jobs in this process, whoever holds the host's scheduler lock
+    os.environ['SCHEDULER_MODE'] = 'on'
+    if log_level:
+        os.environ['LOG_LEVEL'] = log_level
+    if backend == 'mongo':
+        os.environ['MONGO_URI'] = mongo_uri or 'mongodb://localhost:27017'
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+    import app as appmod
+    # Index creation and the timer restore normally wait for the first request;
+    # the timer scenario needs the scheduler up front
+    appmod.startup.run_deferred()
+
+    if appmod.tasks_collection is None:
+        raise SystemExit("Storage backend failed to initialize, see the log above")
+    if backend == 'mongo':
+        for name in ('tasks', 'labels', 'folders', 'agents', 'timers', 'users'):
+            appmod.repos[name].delete_many({})
+    return appmod
+
+
+def percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 3)
+    return {
+        'count': len(latencies),
+        'errors': errors,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'max_ms': ms(latencies[-1]) if latencies else None,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None
+    }
+
+
+class HttpScenario:
+    """
+    One API call pattern driven through the Flask test client.
+
+    Args:
+        name (str): Result key, e.g. "tasks.search"
+        build: Callable taking (iteration, ctx) and returning (method, url, json_body)
+        fresh (bool): Bump the user's data version before each call so the
+            response cache and ETags cannot short-circuit the handler
+        background (bool): The endpoint starts analysis threads; wait for them
+            after the run and report how long they took to drain
+        iterations (int): Override the run-wide iteration count
+    """
+
+    def __init__(self, name, build, fresh=False, background=False, iterations=None):
+        self.name = name
+        self.build = build
+        self.fresh = fresh
+        self.background = background
+        self.iterations = iterations
+
+    def run(self, appmod, ctx, iterations, concurrency, warmup):
+        iterations = self.iterations or iterations
+        baseline_threads = threading.active_count()
+        for index in range(warmup):
+            self._call(appmod, appmod.app.test_client(), ctx, index)
+        wait_for_background(baseline_threads)
+
+        counter = iter(range(iterations))
+        lock = threading.Lock()
+        latencies, errors = [], [0]
+
+        def worker():
+            client = appmod.app.test_client()
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                elapsed, ok = self._call(appmod, client, ctx, warmup + index)
+                with lock:
+                    latencies.append(elapsed)
+                    if not ok:
+                        errors[0] += 1
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        result = summarize(latencies, errors[0], time.perf_counter() - started)
+
+        if self.background:
+            result['background_drain_s'] = round(wait_for_background(baseline_threads), 3)
+        return result
+
+    def _call(self, appmod, client, ctx, index):
+        method, url, body = self.build(index, ctx)
+        if self.fresh:
+            appmod.versions.bump(ctx['user'])
+        started = time.perf_counter()
+        response = client.open(url, method=method, json=body)
+        elapsed = time.perf_counter() - started
+        return elapsed, response.status_code < 400
+
+
+class CallableScenario:
+    """A direct, single-threaded call into app internals (analysis passes, timer ticks)."""
+
+    def __init__(self, name, setup, iterations=None):
+        self.name = name
+        self.setup = setup
+        self.iterations = iterations
+
+    def run(self, appmod, ctx, iterations, concurrency, warmup):
+        iterations = self.iterations or iterations
+        func, teardown = self.setup(appmod, ctx)
+        try:
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(iterations):
+                call_started = time.perf_counter()
+                func()
+                latencies.append(time.perf_counter() - call_started)
+            return summarize(latencies, 0, time.perf_counter() - started)
+        finally:
+            if teardown:
+                teardown()
+
+
+def wait_for_background(baseline_threads, timeout=300.0):
+    """Wait until threads started by the app (analysis triggers) have finished."""
+    started = time.perf_counter()
+    while threading.active_count() > baseline_threads and time.perf_counter() - started < timeout:
+        time.sleep(0.01)
+    return time.perf_counter() - started
+
+
+def _rotate(values, index):
+    return values[index % len(values)] if values else None
+
+
+def _analysis(name):
+    return lambda appmod, ctx: (lambda: appmod.analysis_pipeline.run([name])[name], None)
+
+
+def _timer_tick(appmod, ctx):
+    job_id = appmod.timer_skill.start_timer(ctx['agents'][0], 3600, "Post a status check", ctx['tasks'][:5])
+    job = appmod.scheduler.get_job(job_id)
+    return job.func, lambda: appmod.timer_skill.stop_timer(job_id)
+
+
+def build_scenarios(write_iterations=50, analysis_iterations=5):
+    """All benchmark scenarios, reads first so writes don't skew the read numbers."""
+    user = lambda ctx: ctx['user']
+    active = lambda ctx: f"/api/tasks?user_email={user(ctx)}&status=Active"
+    return [
+        HttpScenario('tasks.first_page.cached', lambda i, ctx: ('GET', active(ctx), None)),
+        HttpScenario('tasks.first_page', lambda i, ctx: ('GET', active(ctx), None), fresh=True),
+        HttpScenario('tasks.label_filter', lambda i, ctx: (
+            'GET', f"{active(ctx)}&label={_rotate(ctx['labels'], i)}", None), fresh=True),
+        HttpScenario('tasks.folder_filter', lambda i, ctx: (
+            'GET', f"{active(ctx)}&folderId={_rotate(ctx['folders'], i)}", None), fresh=True),
+        HttpScenario('tasks.important', lambda i, ctx: (
+            'GET', f"/api/tasks?user_email={user(ctx)}&status=Important", None), fresh=True),
+        HttpScenario('tasks.search', lambda i, ctx: (
+            'GET', f"/api/tasks?user_email={user(ctx)}&search={_rotate(ctx['search_terms'], i)}", None), fresh=True),
+        HttpScenario('tasks.deep_page', lambda i, ctx: (
+            'GET', f"/api/tasks?user_email={user(ctx)}&page={20 + i % 20}&per_page=25", None)),
+        HttpScenario('stats.cached', lambda i, ctx: ('GET', f"/api/stats?user_email={user(ctx)}", None)),
+        HttpScenario('stats', lambda i, ctx: ('GET', f"/api/stats?user_email={user(ctx)}", None), fresh=True),
+        HttpScenario('agents', lambda i, ctx: ('GET', f"/api/agents?user_email={user(ctx)}", None), fresh=True),
+        HttpScenario('chat', lambda i, ctx: (
+            'POST', '/api/chat', {'message': 'What should I focus on today?', 'user_email': user(ctx)})),
+        HttpScenario('chat.agent', lambda i, ctx: (
+            'POST', '/api/chat', {'message': 'Summarize my project', 'user_email': user(ctx),
+                                  'agent_id': ctx['agents'][0]})),
+        HttpScenario('tasks.create', lambda i, ctx: (
+            'POST', '/api/tasks', {'title': f"Benchmark task {i}", 'user_email': user(ctx),
+                                   'folderId': _rotate(ctx['folders'], i)}),
+            background=True, iterations=write_iterations),
+        HttpScenario('tasks.update', lambda i, ctx: (
+            'PUT', f"/api/tasks/{_rotate(ctx['tasks'], i)}", {'priority': ('low', 'medium', 'high')[i % 3]}),
+            background=True, iterations=write_iterations),
+        HttpScenario('tasks.add_update', lambda i, ctx: (
+            'POST', f"/api/tasks/{_rotate(ctx['tasks'], i)}/update", {'content': f"Progress note {i}"}),
+            background=True, iterations=write_iterations),
+        CallableScenario('analysis.importance', _analysis('importance'), iterations=analysis_iterations),
+        CallableScenario('analysis.duplication', _analysis('duplication'), iterations=analysis_iterations),
+        CallableScenario('analysis.label', _analysis('label'), iterations=analysis_iterations),
+        CallableScenario('analysis.trash', _analysis('trash'), iterations=analysis_iterations),
+        CallableScenario('timer.tick', _timer_tick),
+    ]
+
+
+def select(scenarios, patterns):
+    if not patterns:
+        return scenarios
+    return [s for s in scenarios if any(fnmatch.fnmatch(s.name, p) for p in patterns)]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(appmod, seeded, scenarios, iterations=200, concurrency=4, warmup=10, on_result=None):
+    """
+    Run `scenarios` against the first seeded user.
+
+    Returns:
+        dict: Scenario name -> latency/throughput summary
+    """
+    user = seeded['users'][0]
+    ctx = {
+        'user': user,
+        'tasks': seeded['tasks'][user],
+        'folders': seeded['folders'][user],
+        'labels': seeded['labels'][user],
+        'agents': seeded['agents'][user],
+        'search_terms': ['review', 'deploy', 'tax', 'plan', 'zzz-no-match'],
+    }
+    results = {}
+    for scenario in scenarios:
+        results[scenario.name] = scenario.run(appmod, ctx, iterations, concurrency, warmup)
+        if on_result:
+            on_result(scenario.name, results[scenario.name])
+    return results
+
+
+def build_report(results, config, seeded, ai_stats=None):
+    return {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': config,
+            'seeded_tasks': sum(len(ids) for ids in seeded['tasks'].values()),
+            'ai': ai_stats,
+        },
+        'results': results,
+    }
+
+
+def format_row(name, result, baseline=None):
+    row = f"{name:<28} {result['count']:>6} {result['errors']:>4} " \
+          f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['throughput_rps']:>9.1f}"
+    previous = (baseline or {}).get(name)
+    if previous and previous.get('p50_ms'):
+        row += f"   p50 {100.0 * (result['p50_ms'] - previous['p50_ms']) / previous['p50_ms']:+.1f}%"
+    if 'background_drain_s' in result:
+        row += f"   drain {result['background_drain_s']:.2f}s"
+    return row
+
+
+HEADER = f"{'scenario':<28} {'count':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}"
@@ -0,0 +1,129 @@
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+WORDS = (
+    "review deploy refactor invoice draft plan call email fix research design "
+    "update migrate budget report schedule cleanup prepare book renew order "
+    "backend frontend dentist taxes garden newsletter onboarding roadmap"
+).split()
+JUNK_TITLES = ["asdf", "test", "x", "qq", "..."]
+STATUSES = ["Active"] * 7 + ["Closed", "Deleted", "Archived"]
+STAR_COLORS = [None] * 8 + ["yellow", "red"]
+LABEL_NAMES = ["Work", "Home", "Errand", "Finance", "Health", "Reading", "Ideas", "Travel", "Family", "Learning"]
+
+
+def _title(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).capitalize()
+
+
+def _updates(rng, created_at, count):
+    updates = [{"id": str(uuid.uuid4()), "content": "Task created", "timestamp": created_at.isoformat(), "type": "creation"}]
+    for index in range(count):
+        updates.append({
+            "id": str(uuid.uuid4()),
+            "content": _title(rng),
+            "type": "detail",
+            "timestamp": (created_at + timedelta(hours=index + 1)).isoformat(),
+            "last_edited_at": None
+        })
+    return updates
+
+
+def seed_data(repos, users=3, tasks_per_user=2000, folders_per_user=8, labels_per_user=8,
+              agents_per_user=4, seed=42):
+    """
+    Populate the collections with a reproducible synthetic workload.
+
+    About 2% of titles are junk ("asdf", "test") and 3% repeat an earlier
+    title, so the trash and duplicate analyses have something to find.
+
+    Returns:
+        dict: user emails plus the ids of everything inserted, keyed by user
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    seeded = {"users": [], "tasks": {}, "folders": {}, "labels": {}, "agents": {}}
+
+    for user_index in range(users):
+        user_email = f"bench-user-{user_index}@example.com"
+        seeded["users"].append(user_email)
+        repos.users.update_one({"email": user_email}, {"$set": {"name": f"Bench User {user_index}", "last_login": now}}, upsert=True)
+
+        labels = [{
+            "name": name,
+            "color": "#3B82F6",
+            "user_email": user_email,
+            "created_at": now.isoformat(),
+            "order": order
+        } for order, name in enumerate(LABEL_NAMES[:labels_per_user])]
+        if labels:
+            repos.labels.insert_many(labels)
+        label_names = [l["name"] for l in labels]
+
+        folders = [{
+            "name": f"Project {order}",
+            "user_email": user_email,
+            "created_at": now.isoformat(),
+            "order": order
+        } for order in range(folders_per_user)]
+        if folders:
+            repos.folders.insert_many(folders)
+        folder_ids = [str(f["_id"]) for f in folders]
+
+        agents = [{
+            "name": f"Agent {order}",
+            "role": "Assistant",
+            "description": "Benchmark agent",
+            "user_email": user_email,
+            "created_at": (now - timedelta(minutes=order)).isoformat(),
+            "notes": [],
+            "skills": ["add_task", "timer"] if order == 0 else [],
+            "assigned_folder_ids": folder_ids[order:order + 1],
+        } for order in range(agents_per_user)]
+        if agents:
+            repos.agents.insert_many(agents)
+        agent_ids = [str(a["_id"]) for a in agents]
+
+        tasks, titles = [], []
+        for order in range(tasks_per_user):
+            created_at = now - timedelta(minutes=rng.randint(0, 90 * 24 * 60))
+            roll = rng.random()
+            if roll < 0.02:
+                title = rng.choice(JUNK_TITLES)
+            elif roll < 0.05 and titles:
+                title = rng.choice(titles)
+            else:
+                title = _title(rng)
+            titles.append(title)
+            status = rng.choice(STATUSES)
+            tasks.append({
+                "_id": ObjectId(),
+                "title": title,
+                "status": status,
+                "created_at": created_at.isoformat(),
+                "updated_at": created_at.isoformat(),
+                "completed_at": now.isoformat() if status == "Closed" else None,
+                "priority": rng.choice(["low", "medium", "high"]),
+                "importance": rng.randint(1, 5),
+                "category": "General",
+                "labels": rng.sample(label_names, rng.randint(0, min(2, len(label_names)))),
+                "folderId": rng.choice(folder_ids + [None] * 2) if folder_ids else None,
+                "star_color": rng.choice(STAR_COLORS),
+                "assigned_agent_ids": [rng.choice(agent_ids)] if agent_ids and rng.random() < 0.1 else [],
+                "user_email": user_email,
+                "updates": _updates(rng, created_at, rng.randint(0, 6)),
+                "ai_analysis": None,
+                "order": order
+            })
+        for start in range(0, len(tasks), 1000):
+            repos.tasks.insert_many(tasks[start:start + 1000])
+
+        seeded["tasks"][user_email] = [str(t["_id"]) for t in tasks]
+        seeded["folders"][user_email] = folder_ids
+        seeded["labels"][user_email] = label_names
+        seeded["agents"][user_email] = agent_ids
+
+    return seeded
@@ -0,0 +1,84 @@
+"""
+Context the chat endpoint sends to the model (RAG-lite).
+
+Shared by the Flask handler in app.py and the async handler in asgi.py: the
+handlers do the reads with their own driver, these helpers shape the query
+and the prompt context.
+"""
+from bson import ObjectId
+
+
+def tasks_query(data, agent_id=None, agent=None):
+    """
+    Query for the tasks visible to this chat.
+
+    Args:
+        data (dict): Chat request body; `user_email` scopes tasks to that user
+        agent_id (str, optional): Restrict to tasks the agent is assigned to,
+            directly or through one of its folders
+        agent (dict, optional): The agent document, for its assigned folders
+    """
+    query = {}
+    if 'user_email' in data:
+        query['user_email'] = data['user_email']
+    else:
+        query['$or'] = [{'user_email': None}, {'user_email': {'$exists': False}}]
+
+    if agent_id:
+        agent_folder_ids = agent.get('assigned_folder_ids', []) if agent else []
+
+        # Build OR query: assigned directly OR in assigned folder
+        or_conditions = [
+            {'assigned_agent_ids': agent_id},
+            {'assigned_agent_id': agent_id}  # Legacy support
+        ]
+        if agent_folder_ids:
+            or_conditions.append({'folderId': {'$in': agent_folder_ids}})
+        query['$or'] = or_conditions
+    return query
+
+
+def folder_ids(tasks):
+    """ObjectIds of the folders referenced by `tasks`, for a single name lookup."""
+    ids = set()
+    for t in tasks:
+        if t.get('folderId') and ObjectId.is_valid(t['folderId']):
+            ids.add(ObjectId(t['folderId']))
+    return list(ids)
+
+
+def task_context(t, folder_names):
+    """
+    Enriched view of one task for the prompt.
+
+    Args:
+        t (dict): Task document
+        folder_names (dict): Folder id (str) -> folder name
+    """
+    # Extract updates (last 3 for context)
+    updates = t.get('updates', [])
+    recent_updates = [u.get('content') for u in updates[-3:]] if updates else []
+
+    return {
+        "title": t.get('title'),
+        "status": t.get('status'),
+        "priority": t.get('priority'),
+        "category": t.get('category'),
+        "labels": t.get('labels', []),  # Tags for categorization
+        "folder": folder_names.get(str(t.get('folderId'))) if t.get('folderId') else None,  # Folder/project context
+        "recent_updates": recent_updates,  # Latest progress
+        "linked_items": t.get('attachments', [])  # Context items (URLs, files, etc.)
+    }
+
+
+def agent_context(agent_id, agent):
+    if not agent:
+        return None
+    return {
+        "id": agent_id,
+        "name": agent.get('name'),
+        "role": agent.get('role'),
+        "description": agent.get('description'),
+        "notes": agent.get('notes', []),
+        "skills": agent.get('skills', [])  # Include agent skills
+    }
@@ -0,0 +1,382 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Event kinds that imply the sidebar counters changed as well
+STATS_KINDS = ('task', 'label', 'folder', 'timer')
+
+# Collections watched by the change stream and the event kind they map to.
+# Timer *ticks* are not a timers write, so "timer" bumps are always published
+# in-process; only kinds in STREAMED_KINDS are left to the change stream.
+STREAMED_KINDS = ('task', 'label', 'folder', 'agent')
+WATCHED_COLLECTIONS = {
+    'tasks': 'task',
+    'labels': 'label',
+    'folders': 'folder',
+    'agents': 'agent',
+    'timers': 'timer',
+}
+# Collections whose documents are removed outright; tasks are only ever
+# soft-deleted, so their change events always carry the document
+HARD_DELETED_COLLECTIONS = ('labels', 'folders', 'agents', 'timers')
+
+
+# Owners of recently seen documents, for change events that carry no document
+OWNER_CACHE_SIZE = 10000
+
+
+def _user_key(user_email):
+    return user_email or ''
+
+
+def _offer(subscriber_queue, event):
+    # A subscriber too slow to drain its queue misses events rather than blocking publishers
+    try:
+        subscriber_queue.put_nowait(event)
+    except (queue.Full, asyncio.QueueFull):
+        pass
+
+
+class EventBus:
+    """
+    In-process publish/subscribe for per-user change events.
+
+    Published events get a sequence number and are kept in a bounded ring
+    buffer so a reconnecting client can resume from its Last-Event-ID. Event
+    ids are "<boot_id>-<seq>"; an id from another process lifetime, or one
+    that has already fallen out of the buffer, gets a single "reset" event
+    telling the client to refetch everything.
+    """
+
+    def __init__(self, boot_id, buffer_size=None):
+        self.boot_id = boot_id
+        self.buffer_size = buffer_size or int(os.getenv('EVENT_BUFFER_SIZE', 1000))
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._buffer = deque(maxlen=self.buffer_size)
+        self._subscribers = {}
+
+    def publish(self, user_email, kind, data=None):
+        """
+        Publish an event to one user, or to every user when user_email is None.
+
+        Task, label, folder and timer events are followed by a "stats" event
+        for the same audience, since they change the sidebar counters.
+        """
+        kinds = [kind, 'stats'] if kind in STATS_KINDS else [kind]
+        with self._lock:
+            for event_kind in kinds:
+                self._seq += 1
+                event = (self._seq, None if user_email is None else _user_key(user_email), event_kind, data or {})
+                self._buffer.append(event)
+                for subscriber_key, deliver in list(self._subscribers.values()):
+                    if event[1] is None or event[1] == subscriber_key:
+                        deliver(event)
+
+    def subscribe(self, user_email, last_event_id=None, loop=None):
+        """
+        Register a subscriber and return (token, queue, backlog).
+
+        The backlog holds buffered events newer than last_event_id, or a
+        synthetic reset event if the id can no longer be resumed.
+
+        Args:
+            loop: Event loop of an asyncio subscriber; its queue is then an
+                asyncio.Queue filled from publishing threads through the loop
+        """
+        key = _user_key(user_email)
+        if loop is None:
+            subscriber_queue = queue.Queue(maxsize=self.buffer_size)
+            deliver = functools.partial(_offer, subscriber_queue)
+        else:
+            subscriber_queue = asyncio.Queue(maxsize=self.buffer_size)
+            deliver = functools.partial(self._deliver_async, loop, subscriber_queue)
+        token = object()
+        with self._lock:
+            backlog = self._backlog(key, last_event_id)
+            self._subscribers[token] = (key, deliver)
+        return token, subscriber_queue, backlog
+
+    @staticmethod
+    def _deliver_async(loop, subscriber_queue, event):
+        try:
+            loop.call_soon_threadsafe(_offer, subscriber_queue, event)
+        except RuntimeError:
+            pass  # the loop is closed; the subscriber is about to unsubscribe
+
+    def unsubscribe(self, token):
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def format_id(self, seq):
+        return f"{self.boot_id}-{seq}"
+
+    def _backlog(self, key, last_event_id):
+        if not last_event_id:
+            return []
+        boot_id, _, seq = last_event_id.rpartition('-')
+        try:
+            seq = int(seq)
+        except ValueError:
+            seq = -1
+        oldest = self._buffer[0][0] if self._buffer else self._seq + 1
+        if boot_id != self.boot_id or seq < 0 or seq > self._seq or seq < oldest - 1:
+            return [(self._seq, key, 'reset', {})]
+        return [event for event in self._buffer if event[0] > seq and event[1] in (None, key)]
+
+
+class ChangeFeed:
+    """
+    Feeds the EventBus and formats per-user Server-Sent Event streams.
+
+    With a replica set, a MongoDB change stream on the watched collections
+    is the source of truth, so writes made by any process reach every
+    subscriber. On standalone servers (or the change stream failing to open)
+    the feed falls back to in-process events published by VersionStore bumps.
+
+    Delete events carry no document. Their owner comes from the owners of
+    documents this process has seen, and deletes whose owner is unknown go
+    to every subscriber. With EVENTS_PRE_IMAGES=1 (MongoDB 6+), the
+    hard-deleted collections also record pre-images (`enable_pre_images`)
+    that name the owner; this is opt-in, as it costs extra writes on every
+    change to those collections.
+    """
+
+    def __init__(self, db, versions, use_change_streams=None):
+        """
+        Initialize the change feed.
+
+        Args:
+            db: MongoDB database instance
+            versions: VersionStore whose bumps publish in-process events
+            use_change_streams (bool): Try to open a change stream (default from EVENTS_CHANGE_STREAMS)
+        """
+        self.db = db
+        self.versions = versions
+        self.bus = EventBus(versions.boot_id)
+        if use_change_streams is None:
+            use_change_streams = os.getenv('EVENTS_CHANGE_STREAMS', 'auto') != 'off'
+        self.use_change_streams = use_change_streams
+        self.change_stream_active = False
+        self.resume_token = None
+        # Request pre-images while enabled, until the server rejects the option
+        self.pre_images = os.getenv('EVENTS_PRE_IMAGES', '0').lower() in ('1', 'true', 'yes')
+        self._owners = OrderedDict()
+        self._owners_lock = threading.Lock()
+        self.heartbeat_interval = float(os.getenv('SSE_HEARTBEAT_INTERVAL', 15))
+        self.max_stream_seconds = float(os.getenv('SSE_MAX_STREAM_SECONDS', 300))
+        # Half of a gthread worker's threads by default, so streams never starve the API
+        self.max_thread_streams = int(os.getenv('SSE_MAX_THREAD_STREAMS',
+                                                max(1, int(os.getenv('GUNICORN_THREADS', 8)) // 2)))
+        self.busy_retry_ms = int(os.getenv('SSE_BUSY_RETRY_MS', 30000))
+        self._thread_streams = 0
+        self._streams_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        versions.add_listener(self._on_version_bump)
+
+    def start(self):
+        """Start the change stream watcher thread if change streams are enabled."""
+        if not self.use_change_streams or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='change-feed', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def enable_pre_images(self):
+        """With EVENTS_PRE_IMAGES, have the hard-deleted collections record pre-images (idempotent)."""
+        if not self.use_change_streams or not self.pre_images:
+            return
+        for collection in HARD_DELETED_COLLECTIONS:
+            try:
+                self.db.command('collMod', collection, changeStreamPreAndPostImages={'enabled': True})
+            except Exception as e:
+                logger.info("Change stream pre-images unavailable, routing deletes by known owners: %s", e)
+                return
+
+    def _remember_owner(self, kind, document_id, user_key):
+        with self._owners_lock:
+            self._owners[(kind, document_id)] = user_key
+            self._owners.move_to_end((kind, document_id))
+            while len(self._owners) > OWNER_CACHE_SIZE:
+                self._owners.popitem(last=False)
+
+    def _known_owner(self, kind, document_id, forget=False):
+        with self._owners_lock:
+            if forget:
+                return self._owners.pop((kind, document_id), None)
+            return self._owners.get((kind, document_id))
+
+    def _on_version_bump(self, user_key, kind, details):
+        if kind is None:
+            return
+        if user_key is not None and details.get('id'):
+            self._remember_owner(kind, str(details['id']), user_key)
+        # Writes to watched collections arrive through the change stream when
+        # it is running; only publish what it cannot see.
+        if self.change_stream_active and kind in STREAMED_KINDS:
+            return
+        self.bus.publish(user_key, kind, details)
+
+    def _watch(self):
+        pipeline = [{'$match': {'ns.coll': {'$in': list(WATCHED_COLLECTIONS)}}}]
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                options = {'full_document_before_change': 'whenAvailable'} if self.pre_images else {}
+                with self.db.watch(pipeline, full_document='updateLookup', resume_after=self.resume_token,
+                                   max_await_time_ms=1000, **options) as stream:
+                    if not self.change_stream_active:
+                        logger.info("Change stream opened")
+                    self.change_stream_active = True
+                    self.versions.external_invalidation = True
+                    backoff = 1.0
+                    while not self._stop.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is None:
+                            continue
+                        self.resume_token = stream.resume_token
+                        self._publish_change(change)
+            except PyMongoError as e:
+                self.change_stream_active = False
+                self.versions.external_invalidation = False
+                if self.pre_images and 'fullDocumentBeforeChange' in str(e):
+                    # Servers before 6.0 don't know the option: watch without it
+                    self.pre_images = False
+                    continue
+                # 40573: change streams are only supported on replica sets
+                if getattr(e, 'code', None) in (40573, 40324) or 'replica set' in str(e):
+                    logger.info("Change streams unavailable, using in-process events")
+                    return
+                logger.warning("Change stream error, retrying in %.0fs: %s", backoff, e)
+                self.resume_token = None if 'resume' in str(e).lower() else self.resume_token
+            except Exception as e:
+                self.change_stream_active = False
+                self.versions.external_invalidation = False
+                logger.info("Change stream unavailable, using in-process events: %s", e)
+                return
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def _publish_change(self, change):
+        kind = WATCHED_COLLECTIONS.get(change.get('ns', {}).get('coll'))
+        if not kind:
+            return
+        operation = change.get('operationType')
+        document = change.get('fullDocument') or change.get('fullDocumentBeforeChange')
+        document_id = change.get('documentKey', {}).get('_id')
+        data = {'op': operation, 'id': str(document_id) if document_id else None}
+        if document:
+            user_email = _user_key(document.get('user_email'))
+            if data['id'] and operation != 'delete':
+                self._remember_owner(kind, data['id'], user_email)
+        else:
+            # Deletes without a pre-image (and updates of since-deleted
+            # documents) carry no document; if the owner is unknown, tell everyone
+            user_email = self._known_owner(kind, data['id'], forget=operation == 'delete') if data['id'] else None
+        if operation == 'delete' and document and data['id']:
+            self._known_owner(kind, data['id'], forget=True)
+        # Changes made by other processes must invalidate this process's caches too
+        if user_email is None:
+            self.versions.bump_all(notify=False)
+        else:
+            self.versions.bump(user_email, notify=False)
+        self.bus.publish(user_email, kind, data)
+
+    def reserve_thread_stream(self):
+        """
+        Claim one of the SSE_MAX_THREAD_STREAMS worker threads that may serve a stream.
+
+        Every blocking stream pins a worker thread, so without a cap a few
+        open tabs would starve every other route. Returns the callable that
+        releases the claim (safe to call more than once), or None when all
+        are taken; answer those with `busy_stream`.
+        """
+        with self._streams_lock:
+            if self._thread_streams >= self.max_thread_streams:
+                return None
+            self._thread_streams += 1
+        released = threading.Event()
+
+        def release():
+            with self._streams_lock:
+                if not released.is_set():
+                    released.set()
+                    self._thread_streams -= 1
+        return release
+
+    def busy_stream(self):
+        """
+        Generate a stream that only asks the client to reconnect later.
+
+        EventSource gives up for good on a non-200 answer, but reconnects
+        after the `retry` delay when a 200 stream ends. The delay is spread
+        around SSE_BUSY_RETRY_MS so turned-away tabs don't return at once.
+        """
+        yield f"retry: {random.randint(self.busy_retry_ms // 2, self.busy_retry_ms * 3 // 2)}\n\n"
+
+    def stream(self, user_email, last_event_id=None):
+        """
+        Generate a text/event-stream body for one user on a worker thread.
+
+        The stream ends after SSE_MAX_STREAM_SECONDS so a synchronous worker
+        thread is never pinned indefinitely; EventSource reconnects on its own
+        and resumes from the last delivered id. Callers claim the thread with
+        `reserve_thread_stream` first; asgi.py serves `stream_async` instead.
+        """
+        token, subscriber_queue, backlog = self.bus.subscribe(user_email, last_event_id)
+        started = time.monotonic()
+        try:
+            yield "retry: 3000\n\n"
+            for event in backlog:
+                yield self._format(event)
+            while time.monotonic() - started < self.max_stream_seconds:
+                try:
+                    event = subscriber_queue.get(timeout=self.heartbeat_interval)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield self._format(event)
+        finally:
+            self.bus.unsubscribe(token)
+
+    async def stream_async(self, user_email, last_event_id=None):
+        """`stream` as an async generator: waiting for events holds no thread."""
+        token, subscriber_queue, backlog = self.bus.subscribe(user_email, last_event_id,
+                                                              loop=asyncio.get_running_loop())
+        started = time.monotonic()
+        try:
+            yield "retry: 3000\n\n"
+            for event in backlog:
+                yield self._format(event)
+            while time.monotonic() - started < self.max_stream_seconds:
+                try:
+                    event = await asyncio.wait_for(subscriber_queue.get(), self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield self._format(event)
+        finally:
+            self.bus.unsubscribe(token)
+
+    def _format(self, event):
+        seq, _, kind, data = event
+        return f"id: {self.bus.format_id(seq)}\nevent: {kind}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,445 @@
+"""
+Offline stand-in for `google.genai.Client` used by AIService.
+
+Selected with AI_BACKEND=fake. AI_FAKE_MODE picks how responses are made:
+
+    synthetic  Schema-valid responses inferred from the prompt (default)
+    replay     Responses recorded earlier, keyed by a hash of model + prompt;
+               prompts missing from the cassette fall back to synthetic
+               unless AI_FAKE_STRICT=1
+    record     Calls the real API (GEMINI_API_KEY) and appends every
+               response to the cassette
+
+Other settings:
+
+    AI_FAKE_CASSETTE     JSONL cassette path (default fake_genai_cassette.jsonl)
+    AI_FAKE_LATENCY      "fixed:<ms>", "uniform:<min_ms>:<max_ms>" or
+                         "lognormal:<median_ms>:<sigma>" (default fixed:0)
+    AI_FAKE_ERROR_RATE   Fraction of calls failing with a 503 (default 0)
+    AI_FAKE_RPM          Per-model requests per minute before 429
+                         RESOURCE_EXHAUSTED (default unlimited)
+    AI_FAKE_SEED         Seed for latency and error sampling
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+
+import httpx
+from google.genai import errors, types
+
+logger = logging.getLogger(__name__)
+
+SYNTHETIC = 'synthetic'
+REPLAY = 'replay'
+RECORD = 'record'
+
+URGENT_WORDS = ('urgent', 'asap', 'emergency', 'immediate', 'now', 'fix', 'blocker', 'today')
+JUNK_TITLES = {'asdf', 'test', 'x', 'qq', '...', 'untitled', ''}
+
+_ID_TITLE = re.compile(r"^\s*- ID: (?P<id>[^,]+), Title: (?P<title>.*?)(?:, Status: .*)?$", re.MULTILINE)
+_TITLE_ID = re.compile(r"^\s*- (?P<title>.*) \(ID: (?P<id>[^)]+)\)$", re.MULTILINE)
+
+
+def prompt_key(model, contents):
+    """Stable cassette key for a request."""
+    if not isinstance(contents, str):
+        contents = json.dumps(contents, sort_keys=True, default=str)
+    return hashlib.sha256(f"{model}\n{contents}".encode('utf-8')).hexdigest()[:24]
+
+
+def _request_timeout(config):
+    """Seconds from a config's http_options.timeout (milliseconds), as set by AIService deadlines."""
+    http_options = config.get('http_options') if isinstance(config, dict) else getattr(config, 'http_options', None)
+    if http_options is None:
+        return None
+    timeout = http_options.get('timeout') if isinstance(http_options, dict) else getattr(http_options, 'timeout', None)
+    return timeout / 1000.0 if timeout else None
+
+
+def estimate_tokens(text):
+    # Gemini averages roughly four characters per token for English text
+    return max(1, len(text or '') // 4)
+
+
+def _fraction(value):
+    return int(hashlib.md5(str(value).encode()).hexdigest()[:8], 16) / 0x100000000
+
+
+def parse_latency(spec):
+    """
+    Parse a latency spec into a sampler returning seconds.
+
+    Args:
+        spec (str): "fixed:<ms>", "uniform:<min_ms>:<max_ms>" or "lognormal:<median_ms>:<sigma>"
+    """
+    kind, _, rest = (spec or 'fixed:0').partition(':')
+    values = [float(v) for v in rest.split(':') if v] or [0.0]
+    if kind == 'fixed':
+        return lambda rng: values[0] / 1000.0
+    if kind == 'uniform':
+        low, high = values[0], values[1] if len(values) > 1 else values[0]
+        return lambda rng: rng.uniform(low, high) / 1000.0
+    if kind == 'lognormal':
+        import math
+        median, sigma = values[0], values[1] if len(values) > 1 else 0.5
+        return lambda rng: rng.lognormvariate(math.log(max(median, 0.001)), sigma) / 1000.0
+    raise ValueError(f"Unknown AI_FAKE_LATENCY distribution: {spec}")
+
+
+class SyntheticResponder:
+    """Builds plausible, schema-valid model output by recognizing which AIService prompt was sent."""
+
+    def respond(self, contents, config=None):
+        """Return (json_or_text, function_call) for a prompt."""
+        prompt = contents if isinstance(contents, str) else json.dumps(contents, default=str)
+        if 'identify TRASH' in prompt:
+            return self._json({'trash_task_ids': self._trash(prompt)}), None
+        if 'identify DUPLICATES' in prompt:
+            return self._json({'duplicate_task_ids': self._duplicates(prompt)}), None
+        if 'categorize them by importance' in prompt:
+            return self._json(self._importance(prompt)), None
+        if '"Top" priority' in prompt:
+            return self._json({'top_priority_task_ids': self._priority(prompt)}), None
+        if 'assign them the most appropriate labels' in prompt:
+            return self._json({'task_labels': self._labels(prompt)}), None
+        if 'Name each theme' in prompt:
+            return self._json({'themes': self._theme_names(prompt)}), None
+        if 'Mindset Map' in prompt:
+            return self._json(self._mindset(prompt)), None
+        if 'executing a timed instruction' in prompt:
+            instruction = re.search(r'Instruction: "(.*)"', prompt)
+            title = re.search(r'Title: (.*)', prompt)
+            return self._json({
+                'action': 'add_update',
+                'content': f"Checked in on {title.group(1).strip() if title else 'the task'}: "
+                           f"{instruction.group(1) if instruction else 'no instruction'}"
+            }), None
+        if 'provide structured feedback' in prompt:
+            task = re.search(r'Task: (.*)', prompt)
+            title = task.group(1).strip() if task else 'Task'
+            return self._json({
+                'summary': f"{title} is in progress.",
+                'suggestions': "Define the next concrete step and a due date.",
+                'priority': 'high' if any(w in title.lower() for w in URGENT_WORDS) else 'medium',
+                'category': 'General',
+                'importance': 4 if any(w in title.lower() for w in URGENT_WORDS) else 3
+            }), None
+        return self._chat(prompt, config)
+
+    def _json(self, data):
+        return json.dumps(data)
+
+    def _tasks(self, prompt):
+        return [(m.group('id').strip(), m.group('title').strip()) for m in _ID_TITLE.finditer(prompt)]
+
+    def _trash(self, prompt):
+        return [task_id for task_id, title in self._tasks(prompt) if title.strip().lower() in JUNK_TITLES or len(title.strip()) <= 2]
+
+    def _duplicates(self, prompt):
+        seen, duplicates = set(), []
+        for task_id, title in self._tasks(prompt):
+            normalized = ' '.join(title.lower().split())
+            if normalized in seen:
+                duplicates.append(task_id)
+            seen.add(normalized)
+        return duplicates
+
+    def _importance(self, prompt):
+        critical, notable = [], []
+        for task_id, title in self._tasks(prompt):
+            if any(w in title.lower() for w in URGENT_WORDS) or _fraction(task_id) < 0.03:
+                critical.append(task_id)
+            elif _fraction(task_id) < 0.12:
+                notable.append(task_id)
+        return {'critical_task_ids': critical, 'notable_task_ids': notable}
+
+    def _priority(self, prompt):
+        tasks = self._tasks(prompt)
+        urgent = [task_id for task_id, title in tasks if any(w in title.lower() for w in URGENT_WORDS)]
+        return urgent[:5] or [task_id for task_id, _ in sorted(tasks, key=lambda t: _fraction(t[0]))[:3]]
+
+    def _labels(self, prompt):
+        match = re.search(r'Available Labels: (.*)', prompt)
+        labels = [l.strip() for l in match.group(1).split(',')] if match else []
+        result = {}
+        for task_id, title in self._tasks(prompt):
+            words = set(title.lower().split())
+            picked = [l for l in labels if l.lower() in words][:1]
+            if not picked and labels and _fraction(task_id) < 0.25:
+                picked = [labels[int(_fraction(title) * len(labels))]]
+            result[task_id] = picked
+        return result
+
+    def _mindset(self, prompt):
+        themes = ['Building Foundation', 'Exploration', 'Maintenance', 'Strategic Growth']
+        buckets = {theme: [] for theme in themes}
+        for m in _TITLE_ID.finditer(prompt):
+            buckets[themes[int(_fraction(m.group('id')) * len(themes))]].append(m.group('title'))
+        return {
+            'name': 'My Mindset',
+            'children': [{
+                'name': theme,
+                'description': f"{len(titles)} tasks lean toward {theme.lower()}.",
+                'value': len(titles),
+                'children': [{'name': t.split(' ')[0], 'value': 1} for t in titles[:3]]
+            } for theme, titles in buckets.items() if titles]
+        }
+
+    def _theme_names(self, prompt):
+        keywords = re.findall(r"^\s*\d+\. Keywords: (.*)$", prompt, re.MULTILINE)
+        return [{'name': ' '.join(word.capitalize() for word in line.split(', ')[:2]) + ' Focus',
+                 'description': f"Attention keeps returning to {line.split(', ')[0]}."} for line in keywords]
+
+    def _chat(self, prompt, config):
+        message = prompt.rsplit('User:', 1)[-1].strip()
+        tools = getattr(config, 'tools', None) or []
+        wants_task = re.search(r'\b(create|add|make)\b.*\btask\b', message, re.IGNORECASE)
+        if tools and wants_task:
+            title = re.sub(r'^.*?\btask\b\s*(to|for|called|named)?\s*', '', message, flags=re.IGNORECASE).strip(' ."') or message
+            return None, {'name': 'create_task', 'args': {'title': title[:80], 'priority': 'medium'}}
+        task_count = len(re.findall(r'^\s*- \[', prompt, re.MULTILINE))
+        return f"You have {task_count} tasks in view. About \"{message[:60]}\": start with the most urgent one.", None
+
+
+class FakeModels:
+    """Implements `client.models.generate_content` for the fake client."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None, **kwargs):
+        return self._client._generate(model, contents, config)
+
+
+class FakeAsyncModels:
+    """Implements `client.aio.models.generate_content`; latency is an asyncio sleep."""
+
+    def __init__(self, client):
+        self._client = client
+
+    async def generate_content(self, model, contents, config=None, **kwargs):
+        return await self._client._generate_async(model, contents, config)
+
+
+class FakeAsyncClient:
+    def __init__(self, client):
+        self.models = FakeAsyncModels(client)
+
+
+class FakeGenAIClient:
+    """
+    Drop-in replacement for `genai.Client` with latency, error and quota injection.
+
+    Responses are real `types.GenerateContentResponse` objects, so `.text`,
+    `.candidates[...].function_call` and `.usage_metadata` behave like the
+    SDK's. `client.aio.models.generate_content` is the asyncio counterpart,
+    as on the real client. Call and token counters are available from `stats()`.
+    """
+
+    def __init__(self, mode=SYNTHETIC, cassette_path=None, latency='fixed:0', error_rate=0.0, rpm=None,
+                 seed=None, strict=False, real_client=None):
+        """
+        Initialize the fake client.
+
+        Args:
+            mode (str): "synthetic", "replay" or "record"
+            cassette_path (str): JSONL file with recorded responses
+            latency (str): Latency distribution spec, see parse_latency
+            error_rate (float): Fraction of calls failing with a 503
+            rpm (int): Per-model requests per minute before 429s, None for no limit
+            seed (int): Seed for latency and error sampling
+            strict (bool): In replay mode, fail on prompts missing from the cassette
+            real_client: genai.Client used in record mode
+        """
+        if mode not in (SYNTHETIC, REPLAY, RECORD):
+            raise ValueError(f"Unknown AI_FAKE_MODE: {mode}")
+        self.mode = mode
+        self.cassette_path = cassette_path
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.strict = strict
+        self.models = FakeModels(self)
+        self.aio = FakeAsyncClient(self)
+        self._sample_latency = parse_latency(latency)
+        self._rng = random.Random(seed)
+        self._responder = SyntheticResponder()
+        self._real_client = real_client
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._cassette = {}
+        self._stats = {'calls': 0, 'errors': 0, 'timeouts': 0, 'rate_limited': 0, 'replay_hits': 0, 'replay_misses': 0,
+                       'prompt_tokens': 0, 'output_tokens': 0, 'by_model': {}}
+        if mode == REPLAY:
+            self._load_cassette()
+        if mode == RECORD and real_client is None:
+            raise ValueError("AI_FAKE_MODE=record needs GEMINI_API_KEY for the real client")
+
+    @classmethod
+    def from_env(cls):
+        mode = os.getenv('AI_FAKE_MODE', SYNTHETIC)
+        real_client = None
+        if mode == RECORD and os.getenv('GEMINI_API_KEY'):
+            from google import genai
+            real_client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+        seed = os.getenv('AI_FAKE_SEED')
+        rpm = os.getenv('AI_FAKE_RPM')
+        return cls(
+            mode=mode,
+            cassette_path=os.getenv('AI_FAKE_CASSETTE', 'fake_genai_cassette.jsonl'),
+            latency=os.getenv('AI_FAKE_LATENCY', 'fixed:0'),
+            error_rate=float(os.getenv('AI_FAKE_ERROR_RATE', 0)),
+            rpm=int(rpm) if rpm else None,
+            seed=int(seed) if seed else None,
+            strict=os.getenv('AI_FAKE_STRICT', '0') == '1',
+            real_client=real_client
+        )
+
+    def stats(self):
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+    # Request path
+
+    def _generate(self, model, contents, config):
+        delay, fail = self._begin(model)
+        timeout = _request_timeout(config)
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            self._timed_out()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self._fail()
+        recorded = None
+        if self.mode == RECORD:
+            recorded = self._real_client.models.generate_content(model=model, contents=contents, config=config)
+        return self._respond(model, contents, config, recorded)
+
+    async def _generate_async(self, model, contents, config):
+        delay, fail = self._begin(model)
+        timeout = _request_timeout(config)
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            self._timed_out()
+        if delay:
+            await asyncio.sleep(delay)
+        if fail:
+            self._fail()
+        recorded = None
+        if self.mode == RECORD:
+            recorded = await self._real_client.aio.models.generate_content(model=model, contents=contents, config=config)
+        return self._respond(model, contents, config, recorded)
+
+    def _begin(self, model):
+        """Apply the quota, then sample this call's latency and whether it fails."""
+        self._admit(model)
+        with self._lock:
+            delay = self._sample_latency(self._rng)
+            fail = self.error_rate and self._rng.random() < self.error_rate
+        return delay, fail
+
+    def _timed_out(self):
+        with self._lock:
+            self._stats['timeouts'] += 1
+        # What the SDK's httpx transport raises when http_options.timeout passes
+        raise httpx.ReadTimeout('The read operation timed out')
+
+    def _fail(self):
+        with self._lock:
+            self._stats['errors'] += 1
+        raise errors.ServerError(503, {'error': {'code': 503, 'status': 'UNAVAILABLE',
+                                                 'message': 'The model is overloaded. Please try again later.'}})
+
+    def _respond(self, model, contents, config, recorded=None):
+        key = prompt_key(model, contents)
+        if recorded is not None:
+            response = recorded
+            self._record(key, model, response)
+        elif self.mode == REPLAY and key in self._cassette:
+            response = types.GenerateContentResponse.model_validate(self._cassette[key])
+            self._count('replay_hits')
+        else:
+            if self.mode == REPLAY:
+                self._count('replay_misses')
+                if self.strict:
+                    raise errors.ClientError(404, {'error': {'code': 404, 'status': 'NOT_FOUND',
+                                                             'message': f"No recorded response for prompt {key}"}})
+            response = self._synthetic(contents, config)
+
+        self._account(model, contents, response)
+        return response
+
+    def _admit(self, model):
+        if not self.rpm:
+            return
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.setdefault(model, deque())
+            while window and now - window[0] > 60.0:
+                window.popleft()
+            if len(window) >= self.rpm:
+                self._stats['rate_limited'] += 1
+                raise errors.ClientError(429, {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED',
+                                                         'message': f"Quota exceeded for {model}: {self.rpm} requests per minute"}})
+            window.append(now)
+
+    def _synthetic(self, contents, config):
+        text, function_call = self._responder.respond(contents, config)
+        if function_call:
+            part = types.Part(function_call=types.FunctionCall(name=function_call['name'], args=function_call['args']))
+        else:
+            part = types.Part(text=text)
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role='model', parts=[part]), finish_reason='STOP')]
+        )
+
+    def _account(self, model, contents, response):
+        usage = response.usage_metadata
+        prompt_text = contents if isinstance(contents, str) else json.dumps(contents, default=str)
+        if usage is None or usage.prompt_token_count is None:
+            parts = response.candidates[0].content.parts if response.candidates and response.candidates[0].content else []
+            output_text = ''.join(p.text or json.dumps(p.function_call.args if p.function_call else {}) for p in parts or [])
+            usage = types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=estimate_tokens(prompt_text),
+                candidates_token_count=estimate_tokens(output_text),
+            )
+            usage.total_token_count = usage.prompt_token_count + usage.candidates_token_count
+            response.usage_metadata = usage
+        with self._lock:
+            self._stats['calls'] += 1
+            self._stats['prompt_tokens'] += usage.prompt_token_count or 0
+            self._stats['output_tokens'] += usage.candidates_token_count or 0
+            per_model = self._stats['by_model'].setdefault(model, {'calls': 0, 'prompt_tokens': 0, 'output_tokens': 0})
+            per_model['calls'] += 1
+            per_model['prompt_tokens'] += usage.prompt_token_count or 0
+            per_model['output_tokens'] += usage.candidates_token_count or 0
+
+    def _count(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    # Cassette
+
+    def _load_cassette(self):
+        if not self.cassette_path or not os.path.exists(self.cassette_path):
+            logger.warning("Cassette %s not found, every prompt will be synthesized", self.cassette_path)
+            return
+        with open(self.cassette_path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._cassette[entry['key']] = entry['response']
+        logger.info("Loaded %d recorded responses from %s", len(self._cassette), self.cassette_path)
+
+    def _record(self, key, model, response):
+        entry = {'key': key, 'model': model, 'response': response.model_dump(mode='json', exclude_none=True)}
+        with self._lock:
+            with open(self.cassette_path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
@@ -0,0 +1,45 @@
+"""
+gunicorn settings for running the Flask app on every core of a node.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is preloaded in the master with APP_DEFER_INIT=1, so only imports,
+routes and configuration are shared copy-on-write between workers. Each
+worker opens its own MongoDB and Gemini clients and background threads in
+post_fork (app.init_services), and one of them is elected to run timer jobs
+(scheduler_lock.py; SCHEDULER_MODE=off moves them to run_scheduler.py).
+"""
+import multiprocessing
+import os
+
+os.environ.setdefault('APP_DEFER_INIT', '1')
+
+bind = f":{os.getenv('PORT', '8080')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# Event streams (/api/events) hold a thread each; events.py caps them per
+# worker at SSE_MAX_THREAD_STREAMS, by default half of these threads
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+worker_class = 'gthread'
+# Restart a worker whose main loop stops answering the arbiter. Model calls
+# are bounded by their own deadlines (ai_resilience.py, at most 90s), so no
+# request legitimately holds a thread past this.
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+preload_app = True
+
+# The app reads the worker count to know whether other processes write too
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+
+def post_fork(server, worker):
+    import app
+    from app_logging import configure_logging
+
+    # The log listener thread stayed behind in the master
+    configure_logging()
+    app.init_services()
+
+
+def worker_exit(server, worker):
+    import app
+    app.shutdown_services()
@@ -0,0 +1,167 @@
+"""
+Local junk scorer that settles most trash analyses without a model call.
+
+Each title gets a junk score in [0, 1] from cheap text features:
+
+- Empty or symbol-only titles, and the usual placeholder words ("asdf",
+  "test", "untitled"), score as junk outright.
+- Each word is scored for gibberish. Keyboard walks ("qwer", "sdfg"), one
+  repeated character and very low character entropy are strong signals.
+  No vowels or long consonant runs are weak ones, since acronyms have
+  them too.
+- Known words lower the score. A word is known if it is in COMMON_WORDS or
+  recurs across the analyzed tasks, so the user's own vocabulary counts.
+- A title that repeats one word ("lol lol lol") is penalised. Titles of
+  one or two characters ("Go", "PR", "UI") are left to the model, since
+  too little text is there to tell.
+
+`screen()` splits tasks into confident junk (score >= TRASH_JUNK_THRESHOLD),
+confident keepers (<= TRASH_CLEAN_THRESHOLD) and the uncertain band in
+between. Only the uncertain band is sent to AIService.analyze_trash; see
+analysis.trash_plan for how the answers are merged and reported.
+
+Environment:
+    TRASH_PREFILTER: Score titles locally before the model, default 1
+    TRASH_JUNK_THRESHOLD: Score at or above which a task is trash, default 0.8
+    TRASH_CLEAN_THRESHOLD: Score at or below which a task is kept, default 0.25
+"""
+import math
+import os
+import re
+from collections import Counter
+
+_WORD = re.compile(r"[^\W_]+")
+
+PLACEHOLDERS = frozenset("""
+asdf asdfg asdfgh asdfjkl qwerty qwer qwe zxcv zxc jkl hjkl test tests testing tst tmp temp foo bar baz
+foobar xxx xx aaa abc abcd blah lorem ipsum untitled placeholder dummy sample sdf dfg fgh ghj
+""".split())
+
+# Frequent words in task titles; the analyzed tasks' own recurring words are added per run
+COMMON_WORDS = frozenset("""
+add all and app ask back bank bill book bug buy call car card check clean client code cook daily date day
+deadline deploy design dinner doc docs doctor draft email event file finish fix follow for form friend
+gift go groceries gym home house idea invoice job learn list log login mail make meet meeting milk mom
+money month move need new note notes order page pay phone pick plan post prep prepare project read
+rent reply report research review run schedule school send set setup ship shop site sort start
+study submit team the think ticket time to today tomorrow trip update upload visit walk watch week
+work write year
+""".split())
+
+# Physically adjacent keys on a QWERTY keyboard, per row
+_KEY_ROWS = ('qwertyuiop', 'asdfghjkl', 'zxcvbnm', '1234567890')
+_ADJACENT = {(row[i], row[i + 1]) for row in _KEY_ROWS for i in range(len(row) - 1)}
+_ADJACENT |= {(b, a) for a, b in _ADJACENT}
+_VOWELS = set('aeiouy')
+_CONSONANT_RUN = re.compile(r"[bcdfghjklmnpqrstvwxz]{5,}")
+
+
+def _entropy(word):
+    counts = Counter(word)
+    return -sum(c / len(word) * math.log2(c / len(word)) for c in counts.values())
+
+
+def word_score(word, known=frozenset()):
+    """Gibberish score of one lowercase word."""
+    if word in PLACEHOLDERS:
+        return 1.0
+    if word in COMMON_WORDS or word in known:
+        return 0.0
+    if word.isdigit():
+        return 0.5
+    if len(word) >= 3:
+        pairs = list(zip(word, word[1:]))
+        if sum(pair in _ADJACENT for pair in pairs) / len(pairs) >= 0.7:
+            return 0.95  # keyboard walk
+        if len(word) >= 4 and Counter(word).most_common(1)[0][1] / len(word) > 0.6:
+            return 0.9   # one repeated character
+    if len(word) >= 6 and _entropy(word) < 1.5:
+        return 0.85
+    # Weaker signals, also true of acronyms ("HTML"): left to the model
+    if word.isalpha() and len(word) >= 4 and not _VOWELS & set(word):
+        return 0.6
+    if _CONSONANT_RUN.search(word):
+        return 0.6
+    # Pronounceable but unknown: probably a real word or name
+    return 0.2
+
+
+def junk_score(title, known=frozenset()):
+    """
+    Junk score of a task title, 0 (clearly real) to 1 (clearly junk).
+
+    Args:
+        title (str): Task title
+        known (set): Extra words counting as real, e.g. words recurring in the user's tasks
+    """
+    text = (title or '').strip().lower()
+    words = _WORD.findall(text)
+    if not words:
+        return 1.0  # empty, or punctuation only
+    if text in PLACEHOLDERS or ' '.join(words) in PLACEHOLDERS:
+        return 1.0
+    if len(''.join(words)) <= 2:
+        return 0.5  # "Go", "PR", "UI": too short to judge locally
+
+    scores = [word_score(word, known) for word in words]
+    score = sum(s * len(w) for s, w in zip(scores, words)) / sum(len(w) for w in words)
+    if len(words) >= 3 and len(set(words)) <= len(words) / 2:
+        score = max(score, 0.85)  # the same word over and over
+    elif len(words) == 1 and scores[0] == 0.2:
+        score = 0.35  # a single unknown word is left to the model
+    elif sum(s <= 0.2 for s in scores) >= 2:
+        score = min(score, 0.2)  # two or more real-looking words
+    return score
+
+
+class Screen:
+    """
+    Local verdicts for one trash analysis.
+
+    Args:
+        junk (list): Tasks scored as confident trash
+        clean (list): Tasks scored as confidently not trash
+        uncertain (list): Tasks left for the model
+    """
+
+    def __init__(self, junk, clean, uncertain):
+        self.junk = junk
+        self.clean = clean
+        self.uncertain = uncertain
+
+    @property
+    def junk_ids(self):
+        return [t['_id'] for t in self.junk]
+
+    def report(self):
+        return {'local_trash': len(self.junk), 'local_clean': len(self.clean), 'sent_to_model': len(self.uncertain)}
+
+
+def _recurring_words(tasks):
+    """Words found in at least two different task titles."""
+    frequency = Counter()
+    for task in tasks:
+        frequency.update(set(_WORD.findall((task.get('title') or '').lower())))
+    return {word for word, count in frequency.items() if count >= 2 and len(word) > 2} - PLACEHOLDERS
+
+
+def screen(tasks, junk_threshold=None, clean_threshold=None):
+    """Split tasks into confident junk, confident keepers and the uncertain band."""
+    if os.getenv('TRASH_PREFILTER', '1').lower() in ('0', 'false', 'no'):
+        return Screen([], [], list(tasks))
+    junk_threshold = junk_threshold if junk_threshold is not None else \
+        float(os.getenv('TRASH_JUNK_THRESHOLD', 0.8))
+    clean_threshold = clean_threshold if clean_threshold is not None else \
+        float(os.getenv('TRASH_CLEAN_THRESHOLD', 0.25))
+    known = _recurring_words(tasks)
+
+    junk, clean, uncertain = [], [], []
+    for task in tasks:
+        score = junk_score(task.get('title'), known)
+        if score >= junk_threshold:
+            junk.append(task)
+        elif score <= clean_threshold:
+            clean.append(task)
+        else:
+            uncertain.append(task)
+    return Screen(junk, clean, uncertain)
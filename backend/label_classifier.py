@@ -0,0 +1,371 @@
+"""
+Per-user label classifier that settles most label analyses without the model.
+
+Each user's own labelled tasks are the training data. A multinomial naive
+Bayes model over hashed title features (words and word pairs) is fitted per
+user. It is kept in process memory and refit on a background thread once
+the user's data version (versions.py) has moved, so labels the user sets
+change the next analysis without it waiting for a refit. Completed or
+archived tasks that never got a user label train a "no label" class, so
+the model is not forced to pick a label for everything.
+
+For a label analysis, `screen()` sorts the active tasks:
+
+- Tasks that already carry a user label go to the model without a local
+  prediction, as before, so the model can still add a further label.
+- When the user's classifier is trusted and predicts a label with a
+  posterior of at least LABEL_CONFIDENCE, the label is assigned locally.
+- Everything else (no confident prediction, "no label", or an untrusted
+  classifier) goes to AIService.analyze_labels as before.
+
+Trust is per user and comes from audits. While a classifier is untrusted,
+its confident predictions for the tasks sent to the model are compared with
+the model's answers. Once it is trusted, a sample (LABEL_AUDIT_RATE) of
+them still goes to the model. Precision is a decaying average over about
+the last LABEL_PRECISION_WINDOW audits, stored in the `label_classifiers`
+collection. A classifier is trusted with at least LABEL_MIN_AUDITS audits
+and a precision of LABEL_MIN_PRECISION or more, and it loses that trust
+again as soon as the audits disagree.
+
+Environment:
+    LABEL_CLASSIFIER: Classify locally before the model, default 1
+    LABEL_CONFIDENCE: Posterior at or above which a prediction counts as confident, default 0.9
+    LABEL_MIN_EXAMPLES: Labelled tasks a label needs before it is predicted, default 3
+    LABEL_MIN_AUDITS: Audited predictions needed before a classifier is trusted, default 20
+    LABEL_MIN_PRECISION: Audited precision needed to trust a classifier, default 0.9
+    LABEL_AUDIT_RATE: Share of a trusted classifier's confident predictions still checked, default 0.1
+    LABEL_PRECISION_WINDOW: Audits the precision average roughly spans, default 200
+    LABEL_RETRAIN_SECONDS: How often a classifier is refit when other
+        processes' writes may not bump this process's versions, default 300
+"""
+import logging
+import math
+import os
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+
+from ai_resilience import unavailable
+from app_logging import start_thread
+from theme_clustering import SYSTEM_LABELS, tokenize
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 20
+SMOOTHING = 1.0
+NO_LABEL = None  # The "no label fits" class
+
+# Final states: a task left unlabelled there was judged to fit no label
+CLOSED_STATUSES = ["Closed", "completed", "Archived", "archived"]
+DELETED_STATUSES = ["Deleted", "deleted"]
+
+
+def _enabled(name, default):
+    return os.getenv(name, default).lower() not in ('0', 'false', 'no')
+
+
+def _user_key(user_email):
+    return user_email or ''
+
+
+def features(title):
+    """Hashed words and adjacent word pairs of a title."""
+    words = tokenize(title)
+    terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return [zlib.crc32(term.encode('utf-8')) & ((1 << HASH_BITS) - 1) for term in terms]
+
+
+def user_labels(task):
+    """The task's labels other than the ones the analysis passes manage."""
+    return [label for label in task.get('labels') or []
+            if isinstance(label, str) and label.lower() not in SYSTEM_LABELS]
+
+
+def training_query(user_email):
+    """Every task of the user that can teach the classifier something."""
+    query = {'status': {'$nin': DELETED_STATUSES}}
+    if user_email:
+        query['user_email'] = user_email
+    else:
+        query['$or'] = [{'user_email': None}, {'user_email': {'$exists': False}}]
+    return query
+
+
+TRAINING_PROJECTION = {'title': 1, 'labels': 1, 'status': 1}
+
+
+class NaiveBayes:
+    """Multinomial naive Bayes over hashed features, with add-one smoothing."""
+
+    def __init__(self):
+        self.documents = Counter()
+        self.counts = {}
+        self.totals = Counter()
+        self.vocabulary = set()
+
+    def add(self, task_features, label):
+        self.documents[label] += 1
+        self.counts.setdefault(label, Counter()).update(task_features)
+        self.totals[label] += len(task_features)
+        self.vocabulary.update(task_features)
+
+    @classmethod
+    def fit(cls, tasks):
+        model = cls()
+        for task in tasks:
+            labels = user_labels(task)
+            if labels:
+                task_features = features(task.get('title'))
+                for label in labels:
+                    model.add(task_features, label)
+            elif task.get('status') in CLOSED_STATUSES:
+                model.add(features(task.get('title')), NO_LABEL)
+        return model
+
+    def predict(self, task_features, candidates):
+        """
+        Most probable class among `candidates` and its posterior.
+
+        Returns:
+            tuple: (label or NO_LABEL, posterior), or None when no feature
+                was seen in training or fewer than two classes compete
+        """
+        known = [f for f in task_features if f in self.vocabulary]
+        if not known or len(candidates) < 2:
+            return None
+        total_documents = sum(self.documents[c] for c in candidates)
+        size = len(self.vocabulary)
+        scores = {}
+        for label in candidates:
+            counts, denominator = self.counts[label], self.totals[label] + SMOOTHING * size
+            scores[label] = math.log(self.documents[label] / total_documents) + sum(
+                math.log((counts[f] + SMOOTHING) / denominator) for f in known)
+        best = max(scores, key=scores.get)
+        posterior = 1.0 / sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, posterior
+
+
+class LabelScreen:
+    """
+    Local decisions for one label analysis.
+
+    Args:
+        assigned (dict): Task ID -> [label] decided locally
+        labeled (int): Deferred tasks that already carry a user label and got no prediction
+        deferred (list): Tasks sent to the model
+        audits (dict): Task ID -> (user_email, predicted label) to check against the model's answer
+    """
+
+    def __init__(self, assigned, labeled, deferred, audits):
+        self.assigned = assigned
+        self.labeled = labeled
+        self.deferred = deferred
+        self.audits = audits
+
+    def report(self):
+        return {'local_labeled': len(self.assigned), 'already_labeled': self.labeled,
+                'sent_to_model': len(self.deferred), 'audited': len(self.audits)}
+
+
+class LabelClassifier:
+    """
+    Per-user classifiers with audited trust.
+
+    Args:
+        repos (Repositories): Storage for tasks and the `label_classifiers` collection
+        versions (VersionStore): Per-user data versions that mark classifiers for a refit
+    """
+
+    def __init__(self, repos, versions):
+        self.repos = repos
+        self.versions = versions
+        self.enabled = _enabled('LABEL_CLASSIFIER', '1')
+        self.confidence = float(os.getenv('LABEL_CONFIDENCE', 0.9))
+        self.min_examples = int(os.getenv('LABEL_MIN_EXAMPLES', 3))
+        self.min_audits = int(os.getenv('LABEL_MIN_AUDITS', 20))
+        self.min_precision = float(os.getenv('LABEL_MIN_PRECISION', 0.9))
+        self.audit_rate = float(os.getenv('LABEL_AUDIT_RATE', 0.1))
+        self.window = float(os.getenv('LABEL_PRECISION_WINDOW', 200))
+        self.retrain_seconds = float(os.getenv('LABEL_RETRAIN_SECONDS', 300))
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self._models = {}    # user key -> (model, trained tag, trained at)
+        self._trust = {}     # user key -> {'audited': float, 'agreed': float}
+        self._training = set()
+
+    def _tag(self, user_email):
+        # Versions are per process and restart at zero, hence the boot ID
+        return f"{self.versions.boot_id}-{self.versions.version(user_email)}"
+
+    def _is_stale(self, entry, user_email):
+        _, tag, trained_at = entry
+        if tag != self._tag(user_email):
+            return True
+        return not self.versions.sees_all_writes and time.monotonic() - trained_at >= self.retrain_seconds
+
+    # Precision
+
+    def precision(self, user_email):
+        """Audited precision of the user's confident predictions, or None before any audit."""
+        trust = self._trust.get(_user_key(user_email))
+        if not trust or not trust['audited']:
+            return None
+        return trust['agreed'] / trust['audited']
+
+    def trusted(self, user_email):
+        trust = self._trust.get(_user_key(user_email))
+        return bool(trust) and trust['audited'] >= self.min_audits and \
+            trust['agreed'] / trust['audited'] >= self.min_precision
+
+    def _observe(self, user_email, agreed):
+        # Exponentially decaying counts: old audits fade over about `window` new ones
+        decay = 1.0 - 1.0 / self.window
+        with self._lock:
+            trust = self._trust.setdefault(_user_key(user_email), {'audited': 0.0, 'agreed': 0.0})
+            trust['audited'] = trust['audited'] * decay + 1
+            trust['agreed'] = trust['agreed'] * decay + (1 if agreed else 0)
+
+    # Screening
+
+    def _candidates(self, model, label_names):
+        return [label for label in list(label_names) + [NO_LABEL]
+                if model.documents[label] >= self.min_examples]
+
+    def _screen(self, tasks, label_names):
+        allowed = {name for name in label_names if name.lower() not in SYSTEM_LABELS}
+        assigned, deferred, audits, labeled = {}, [], {}, 0
+        for task in tasks:
+            if user_labels(task):
+                labeled += 1
+                deferred.append(task)
+                continue
+            user_email = task.get('user_email')
+            entry = self._models.get(_user_key(user_email))
+            prediction = None
+            if entry:
+                model = entry[0]
+                prediction = model.predict(features(task.get('title')), self._candidates(model, allowed))
+            confident = prediction and prediction[0] is not NO_LABEL and prediction[1] >= self.confidence
+            if not confident:
+                deferred.append(task)
+            elif self.trusted(user_email) and self._random.random() >= self.audit_rate:
+                assigned[str(task['_id'])] = [prediction[0]]
+            else:
+                deferred.append(task)
+                audits[str(task['_id'])] = (user_email, prediction[0])
+        return LabelScreen(assigned, labeled, deferred, audits)
+
+    def _disabled(self, tasks):
+        return LabelScreen({}, 0, list(tasks), {})
+
+    def screen(self, tasks, label_names):
+        """
+        Split a label analysis into local assignments and tasks for the model.
+
+        Missing classifiers are fitted now; stale ones are refit in the
+        background and used as they are meanwhile.
+        """
+        if not self.enabled:
+            return self._disabled(tasks)
+        for user_email in {t.get('user_email') for t in tasks}:
+            entry = self._models.get(_user_key(user_email))
+            if entry is None:
+                self._load_trust(self.repos.label_classifiers.find_one({'_id': _user_key(user_email)}), user_email)
+                tasks_seen = list(self.repos.tasks.find(training_query(user_email), TRAINING_PROJECTION))
+                self._fitted(user_email, tasks_seen, self._tag(user_email))
+            elif self._is_stale(entry, user_email):
+                self.refit_in_background(user_email)
+        return self._screen(tasks, label_names)
+
+    async def screen_async(self, repos, tasks, label_names):
+        """`screen` for asgi.py on an async Repositories; refits still run on a background thread."""
+        if not self.enabled:
+            return self._disabled(tasks)
+        for user_email in {t.get('user_email') for t in tasks}:
+            entry = self._models.get(_user_key(user_email))
+            if entry is None:
+                self._load_trust(await repos.label_classifiers.find_one({'_id': _user_key(user_email)}), user_email)
+                tag = self._tag(user_email)
+                tasks_seen = await repos.tasks.find(training_query(user_email), TRAINING_PROJECTION).to_list(None)
+                self._fitted(user_email, tasks_seen, tag)
+            elif self._is_stale(entry, user_email):
+                self.refit_in_background(user_email)
+        return self._screen(tasks, label_names)
+
+    def _load_trust(self, doc, user_email):
+        if doc:
+            with self._lock:
+                self._trust.setdefault(_user_key(user_email), {'audited': doc.get('audited', 0.0),
+                                                               'agreed': doc.get('agreed', 0.0)})
+
+    def _fitted(self, user_email, tasks, tag):
+        model = NaiveBayes.fit(tasks)
+        with self._lock:
+            self._models[_user_key(user_email)] = (model, tag, time.monotonic())
+        return model
+
+    # Audits
+
+    def _audit(self, screen, answer):
+        users = set()
+        for task_id, (user_email, label) in screen.audits.items():
+            self._observe(user_email, label in (answer.get(task_id) or []))
+            users.add(user_email)
+        return [(_user_key(user_email), self._trust[_user_key(user_email)]) for user_email in users]
+
+    def record(self, screen, answer):
+        """Score the audited predictions against the model's answer and store the new precision."""
+        if unavailable(answer) or not isinstance(answer, dict):
+            return
+        for key, trust in self._audit(screen, answer):
+            self.repos.label_classifiers.update_one(
+                {'_id': key}, {'$set': dict(trust, updated_at=datetime.utcnow())}, upsert=True)
+
+    async def record_async(self, repos, screen, answer):
+        if unavailable(answer) or not isinstance(answer, dict):
+            return
+        for key, trust in self._audit(screen, answer):
+            await repos.label_classifiers.update_one(
+                {'_id': key}, {'$set': dict(trust, updated_at=datetime.utcnow())}, upsert=True)
+
+    def stats(self):
+        """Per user ('' for unowned tasks): labels learned, audits, precision and whether predictions are trusted."""
+        with self._lock:
+            models = dict(self._models)
+        return {key: {
+            'labels': len([label for label in model.documents if label is not NO_LABEL]),
+            'examples': sum(model.documents.values()),
+            'audited': round(self._trust.get(key, {}).get('audited', 0.0), 1),
+            'precision': self.precision(key),
+            'trusted': self.trusted(key),
+        } for key, (model, _, _) in models.items()}
+
+    # Refits
+
+    def refit(self, user_email=None):
+        tag = self._tag(user_email)
+        tasks = list(self.repos.tasks.find(training_query(user_email), TRAINING_PROJECTION))
+        model = self._fitted(user_email, tasks, tag)
+        logger.debug("Refit label classifier for %s on %d examples",
+                     _user_key(user_email) or 'unowned tasks', sum(model.documents.values()))
+
+    def refit_in_background(self, user_email=None):
+        """Start a refit unless one is already running for this user."""
+        key = _user_key(user_email)
+        with self._lock:
+            if key in self._training:
+                return
+            self._training.add(key)
+        start_thread(self._refit_and_release, user_email, name='label-classifier-refit')
+
+    def _refit_and_release(self, user_email):
+        try:
+            self.refit(user_email)
+        except Exception as e:
+            logger.exception("Error refitting label classifier: %s", e)
+        finally:
+            with self._lock:
+                self._training.discard(_user_key(user_email))
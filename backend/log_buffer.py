@@ -0,0 +1,158 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from pymongo.write_concern import WriteConcern
+
+logger = logging.getLogger(__name__)
+
+
+class LogBuffer:
+    """
+    Write-behind buffer for append-only audit logs (traffic_logs, login_logs).
+
+    Request handlers call `enqueue()` which never touches MongoDB. A single
+    background thread drains the queue and writes each collection's pending
+    documents with one `insert_many`, either when `batch_size` documents are
+    waiting or every `flush_interval` seconds, whichever comes first.
+
+    Logs are written with an unacknowledged write concern (w=0): losing a page
+    view is acceptable, blocking a request thread on it is not. When the queue
+    is full new entries are dropped and counted instead of blocking.
+    """
+
+    def __init__(self, db, max_size=None, batch_size=None, flush_interval=None):
+        """
+        Initialize the buffer.
+
+        Args:
+            db: MongoDB database instance
+            max_size (int): Maximum number of queued documents before dropping
+            batch_size (int): Number of queued documents that triggers a flush
+            flush_interval (float): Maximum seconds between flushes
+        """
+        self.db = db
+        self.max_size = max_size or int(os.getenv('LOG_BUFFER_MAX_SIZE', 10000))
+        self.batch_size = batch_size or int(os.getenv('LOG_BUFFER_BATCH_SIZE', 500))
+        self.flush_interval = flush_interval or float(os.getenv('LOG_BUFFER_FLUSH_INTERVAL', 2.0))
+
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._collections = {}
+        self._flush_listeners = []
+
+        self.dropped_count = 0
+        self.written_count = 0
+        self.failed_count = 0
+        self.flush_count = 0
+
+    def start(self):
+        """Start the background flusher thread and register the shutdown flush."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='log-buffer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=5.0):
+        """Stop the flusher thread and write out everything still queued."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+        self.flush()
+
+    def add_flush_listener(self, listener):
+        """
+        Register a callable run after each successful batch write.
+
+        Args:
+            listener: Callable taking (collection_name, docs)
+        """
+        self._flush_listeners.append(listener)
+
+    def enqueue(self, collection_name, doc):
+        """
+        Queue a log document for `collection_name`.
+
+        Returns:
+            bool: False if the buffer was full and the document was dropped
+        """
+        try:
+            self._queue.put_nowait((collection_name, doc))
+        except queue.Full:
+            with self._lock:
+                self.dropped_count += 1
+            return False
+
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        """Drain the queue and write pending documents, one insert_many per collection."""
+        with self._flush_lock:
+            batches = {}
+            while True:
+                try:
+                    collection_name, doc = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batches.setdefault(collection_name, []).append(doc)
+
+            for collection_name, docs in batches.items():
+                try:
+                    self._collection(collection_name).insert_many(docs, ordered=False)
+                    with self._lock:
+                        self.written_count += len(docs)
+                except Exception as e:
+                    logger.error("Error writing %d docs to %s: %s", len(docs), collection_name, e)
+                    with self._lock:
+                        self.failed_count += len(docs)
+                    continue
+
+                for listener in self._flush_listeners:
+                    listener(collection_name, docs)
+
+            if batches:
+                with self._lock:
+                    self.flush_count += 1
+
+    def stats(self):
+        """Return buffer counters for health/debug endpoints."""
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'max_size': self.max_size,
+                'written': self.written_count,
+                'dropped': self.dropped_count,
+                'failed': self.failed_count,
+                'flushes': self.flush_count
+            }
+
+    def _collection(self, collection_name):
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            collection = self.db[collection_name].with_options(write_concern=WriteConcern(w=0))
+            self._collections[collection_name] = collection
+        return collection
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop.is_set():
+            remaining = self.flush_interval - (time.monotonic() - last_flush)
+            if remaining > 0 and self._queue.qsize() < self.batch_size:
+                self._wakeup.wait(remaining)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            self.flush()
+            last_flush = time.monotonic()
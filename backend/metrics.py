@@ -0,0 +1,424 @@
+"""
+Minimal Prometheus instrumentation for the API.
+
+Exposes counters, gauges and histograms in the text exposition format
+(version 0.0.4) without a client library. `init_app()` wires request
+timing into Flask, `MongoCommandMetrics` is a pymongo CommandListener that
+counts commands per request, and `track_analysis()` / `observe_timer_tick()`
+cover the background analysis threads and timer jobs. `observe_ai_call()`
+is fed by ai_usage.AIUsageTracker for every model call.
+
+Each worker process keeps its own registry, so every sample carries a
+`worker` label with the process ID: a scrape answered by one gunicorn
+worker is told apart from the others', and dashboards aggregate with
+`sum without (worker)`. Prometheus should scrape every worker (or the
+workers behind a load balancer repeatedly) to see them all.
+"""
+import functools
+import inspect
+import os
+import threading
+import time
+
+from flask import Response, g, request
+from pymongo import monitoring
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self, const_labels=()):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value, list(const_labels)))
+        return lines
+
+    def _render_sample(self, key, value, const_labels):
+        return [f"{self.name}{_format_labels(self.labelnames, key, const_labels)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self, **labels):
+        """Return (count, sum) for one label set."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state[2], state[1]) if state else (0, 0.0)
+
+    def _render_sample(self, key, state, const_labels):
+        counts, total, count = state
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, const_labels + [('le', _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key, const_labels)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics in registration order and renders them for scraping, labelled with this worker."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        # Read per scrape: preloaded registries are inherited by forked workers
+        const_labels = [('worker', os.getpid())]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render(const_labels))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    'http_requests_total', 'HTTP requests by route and status.', ('method', 'endpoint', 'status'))
+http_latency = registry.histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by route.', ('method', 'endpoint'))
+http_in_flight = registry.gauge(
+    'http_requests_in_flight', 'Requests currently being handled.')
+request_mongo_commands = registry.histogram(
+    'http_request_mongo_commands', 'MongoDB commands issued while handling one request.',
+    ('method', 'endpoint'), buckets=COUNT_BUCKETS)
+request_mongo_seconds = registry.histogram(
+    'http_request_mongo_seconds', 'Total MongoDB command time while handling one request.', ('method', 'endpoint'))
+mongo_commands = registry.counter(
+    'mongo_commands_total', 'MongoDB commands by name and outcome.', ('command', 'outcome'))
+mongo_latency = registry.histogram(
+    'mongo_command_duration_seconds', 'MongoDB command round trip time.', ('command',))
+analysis_runs = registry.counter(
+    'analysis_runs_total', 'Background analysis runs by kind and outcome.', ('kind', 'outcome'))
+analysis_latency = registry.histogram(
+    'analysis_duration_seconds', 'Background analysis run time, including the model call.', ('kind',))
+analysis_in_progress = registry.gauge(
+    'analysis_in_progress', 'Analysis runs currently executing; values above 1 mean runs are stacking up.', ('kind',))
+timer_ticks = registry.counter(
+    'timer_ticks_total', 'Timer skill job executions by outcome.', ('outcome',))
+timer_latency = registry.histogram(
+    'timer_tick_duration_seconds', 'Timer skill job run time across all of its tasks.', ())
+ai_calls = registry.counter(
+    'ai_requests_total', 'Model calls by AIService method, model and outcome.', ('method', 'model', 'outcome'))
+ai_tokens = registry.counter(
+    'ai_tokens_total', 'Tokens billed by AIService method and model.', ('method', 'model', 'kind'))
+ai_latency = registry.histogram(
+    'ai_request_duration_seconds', 'Model call wall time, including response parsing.', ('method', 'model'))
+ai_admission_wait = registry.histogram(
+    'ai_admission_wait_seconds', 'Time model calls waited for admission, by priority class.', ('priority',))
+ai_admission_rejected = registry.counter(
+    'ai_admission_rejected_total', 'Model calls refused admission, by priority class and reason.',
+    ('priority', 'reason'))
+ai_admission_queued = registry.gauge(
+    'ai_admission_queued', 'Model calls waiting for admission, by priority class.', ('priority',))
+ai_admission_in_flight = registry.gauge(
+    'ai_admission_in_flight', 'Admitted model calls currently running.')
+ai_retries = registry.counter(
+    'ai_retries_total', 'Model call attempts retried after a retriable error, by method.', ('method',))
+ai_hedges = registry.counter(
+    'ai_hedged_requests_total', 'Duplicate requests sent for slow interactive calls, by which attempt answered.',
+    ('method', 'winner'))
+ai_routes = registry.counter(
+    'ai_model_routes_total', 'Model routing decisions by AIService method, model and reason.',
+    ('method', 'model', 'reason'))
+trash_prefilter = registry.counter(
+    'trash_prefilter_tasks_total', 'Tasks screened by the local trash pre-filter, by verdict.',
+    ('verdict',))
+label_classifier = registry.counter(
+    'label_classifier_tasks_total', 'Tasks screened by the local label classifier, by verdict.',
+    ('verdict',))
+priority_ranking = registry.counter(
+    'priority_ranking_tasks_total', 'Tasks ranked for priority analysis, by mode and whether the model saw them.',
+    ('mode', 'verdict'))
+ai_circuit_state = registry.gauge(
+    'ai_circuit_state', 'Model circuit breaker state: 0 closed, 1 half-open, 2 open.', ('model',))
+
+# Per-thread accumulator for the request currently being served. pymongo
+# publishes command events on the thread that issued the command.
+_request_state = threading.local()
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo CommandListener feeding the mongo_* metrics and the per-request totals."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, 'success')
+
+    def failed(self, event):
+        self._record(event, 'failure')
+
+    def _record(self, event, outcome):
+        seconds = event.duration_micros / 1e6
+        mongo_commands.inc(command=event.command_name, outcome=outcome)
+        mongo_latency.observe(seconds, command=event.command_name)
+        state = getattr(_request_state, 'mongo', None)
+        if state is not None:
+            state[0] += 1
+            state[1] += seconds
+
+
+def _endpoint():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def _before_request():
+    g._metrics_started = time.perf_counter()
+    _request_state.mongo = [0, 0.0]
+    http_in_flight.inc()
+
+
+def _after_request(response):
+    started = g.pop('_metrics_started', None)
+    if started is None:
+        return response
+    http_in_flight.dec()
+    method, endpoint = request.method, _endpoint()
+    http_requests.inc(method=method, endpoint=endpoint, status=response.status_code)
+    http_latency.observe(time.perf_counter() - started, method=method, endpoint=endpoint)
+    state = getattr(_request_state, 'mongo', None)
+    if state is not None:
+        request_mongo_commands.observe(state[0], method=method, endpoint=endpoint)
+        request_mongo_seconds.observe(state[1], method=method, endpoint=endpoint)
+        _request_state.mongo = None
+    return response
+
+
+def _teardown_request(error):
+    # Requests that raised never reach after_request
+    if g.pop('_metrics_started', None) is not None:
+        http_in_flight.dec()
+        http_requests.inc(method=request.method, endpoint=_endpoint(), status=500)
+    _request_state.mongo = None
+
+
+def metrics_response():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+def init_app(app):
+    """Register request hooks on `app`. Call before other after_request hooks so timing covers them."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+def track_analysis(kind):
+    """Decorate an analysis run (sync or async) with run counts, duration and in-progress gauge."""
+    def decorator(func):
+        def start():
+            analysis_in_progress.inc(kind=kind)
+            return time.perf_counter()
+
+        def finish(started, outcome, result=None):
+            if isinstance(result, dict) and 'error' in result:
+                # No model answer: nothing was written, unlike a failed write
+                outcome = 'unavailable' if result.get('ai_unavailable') else 'error'
+            analysis_in_progress.dec(kind=kind)
+            analysis_latency.observe(time.perf_counter() - started, kind=kind)
+            analysis_runs.inc(kind=kind, outcome=outcome)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = start()
+                try:
+                    result = await func(*args, **kwargs)
+                except BaseException:
+                    finish(started, 'error')
+                    raise
+                finish(started, 'success', result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = start()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                finish(started, 'error')
+                raise
+            finish(started, 'success', result)
+            return result
+        return wrapper
+    return decorator
+
+
+def observe_request(method, endpoint, status, seconds):
+    """Record a request served outside the Flask hooks (the async routes in asgi.py)."""
+    http_requests.inc(method=method, endpoint=endpoint, status=status)
+    http_latency.observe(seconds, method=method, endpoint=endpoint)
+
+
+def observe_timer_tick(seconds, outcome='success'):
+    timer_ticks.inc(outcome=outcome)
+    timer_latency.observe(seconds)
+
+
+def observe_ai_admission(priority, seconds):
+    ai_admission_wait.observe(seconds, priority=priority)
+
+
+def observe_ai_rejection(priority, reason):
+    ai_admission_rejected.inc(priority=priority, reason=reason)
+
+
+def observe_ai_retry(method):
+    ai_retries.inc(method=method)
+
+
+def observe_ai_hedge(method, winner):
+    ai_hedges.inc(method=method, winner=winner)
+
+
+def observe_ai_circuit(model, state):
+    ai_circuit_state.set({'closed': 0, 'half_open': 1, 'open': 2}[state], model=model)
+
+
+def observe_ai_route(method, model, reason):
+    ai_routes.inc(method=method, model=model, reason=reason)
+
+
+def observe_trash_prefilter(report):
+    """Count one junk_filter.Screen: local_trash, local_clean and sent_to_model tasks."""
+    for verdict, count in report.items():
+        if count:
+            trash_prefilter.inc(count, verdict=verdict)
+
+
+def observe_label_classifier(report):
+    """Count one label_classifier.LabelScreen: local_labeled, already_labeled, sent_to_model and audited tasks."""
+    for verdict, count in report.items():
+        if count:
+            label_classifier.inc(count, verdict=verdict)
+
+
+def observe_priority_ranking(report):
+    """Count one urgency.PriorityScreen: tasks sent to the model and tasks settled by the ranking alone."""
+    priority_ranking.inc(report['sent_to_model'], mode=report['mode'], verdict='sent_to_model')
+    priority_ranking.inc(report['ranked'] - report['sent_to_model'], mode=report['mode'], verdict='ranked_locally')
+
+
+def observe_ai_call(method, model, seconds, outcome, prompt_tokens=0, output_tokens=0):
+    model = model or 'none'
+    ai_calls.inc(method=method, model=model, outcome=outcome)
+    if outcome == 'cache_hit':
+        return
+    ai_latency.observe(seconds, method=method, model=model)
+    ai_tokens.inc(prompt_tokens, method=method, model=model, kind='prompt')
+    ai_tokens.inc(output_tokens, method=method, model=model, kind='output')
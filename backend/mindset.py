@@ -0,0 +1,250 @@
+"""
+Per-user mindset maps, stored and refreshed behind the page that shows them.
+
+A user's map is one document in the `mindsets` collection holding the map
+and a digest per contributing task (its ID, title and labels, the only task
+fields the map is built from). `GET /api/mindset` reads that document and answers with
+it straight away. When the user's data version (versions.py) has moved
+since the map was last checked, a background refresh:
+
+1. Reads the user's active tasks (titles and labels only).
+2. Compares their digests with the ones the map was built from.
+3. Rebuilds the map only when at least MINDSET_MIN_CHANGES tasks, and at
+   least MINDSET_CHANGE_RATIO of them, were added, removed or changed.
+   Otherwise it only records that the map is still current.
+
+Maps are built locally by theme_clustering.py, in milliseconds. With
+MINDSET_AI_NAMES=1 the model only names the clustered themes
+(`name_mindset_themes`). MINDSET_ENGINE=ai restores the former full model
+call (`generate_mindset_map`). Only a user's first visit waits for the
+build, and a failed rebuild keeps the previous map.
+
+Environment:
+    MINDSET_ENGINE: "local" (default) or "ai"
+    MINDSET_AI_NAMES: Name locally clustered themes with the model, default 0
+    MINDSET_MIN_CHANGES: Changed tasks that trigger a regeneration, default 3
+    MINDSET_CHANGE_RATIO: Changed fraction of the task set that triggers one, default 0.1
+    MINDSET_RECHECK_SECONDS: How often a map is rechecked when other
+        processes' writes may not bump this process's versions, default 60
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+from datetime import datetime
+
+import theme_clustering
+from ai_admission import BACKGROUND, priority as ai_priority
+from ai_usage import attribute as attribute_ai_usage
+from analysis import INACTIVE_STATUSES
+from app_logging import start_thread
+
+logger = logging.getLogger(__name__)
+
+
+def _user_key(user_email):
+    # Unowned (legacy) tasks get a map of their own, like versions.py scopes them
+    return user_email or ''
+
+
+def tasks_query(user_email):
+    """The tasks contributing to a user's map: active ones the user owns (or unowned ones without a user)."""
+    query = {'status': {'$nin': INACTIVE_STATUSES}}
+    if user_email:
+        query['user_email'] = user_email
+    else:
+        query['$or'] = [{'user_email': None}, {'user_email': {'$exists': False}}]
+    return query
+
+
+TASK_PROJECTION = {'title': 1, 'labels': 1}
+
+
+def _digest(task):
+    # System labels set by the analysis passes do not shape themes, so they do not count as changes
+    labels = '\x00'.join(sorted(label for label in task.get('labels') or []
+                                if isinstance(label, str) and label.lower() not in theme_clustering.SYSTEM_LABELS))
+    return hashlib.sha1(f"{task['_id']}\x00{task.get('title', '')}\x01{labels}".encode('utf-8')).hexdigest()[:12]
+
+
+def task_digests(tasks):
+    """Sorted short digests of (ID, title, labels), the task set's fingerprint."""
+    return sorted(_digest(t) for t in tasks)
+
+
+def changed_tasks(old_digests, new_digests):
+    """Tasks added, removed or changed between two fingerprints; a change counts once."""
+    old, new = set(old_digests), set(new_digests)
+    return max(len(old - new), len(new - old))
+
+
+class MindsetCache:
+    """
+    Stored mindset maps with stale-while-revalidate refreshes.
+
+    Args:
+        repos (Repositories): Storage for tasks and the `mindsets` collection
+        ai_service (AIService): Names themes, or generates whole maps with MINDSET_ENGINE=ai
+        versions (VersionStore): Per-user data versions that mark maps for a recheck
+        usage (AIUsageTracker): Records maps served from storage as cache hits
+    """
+
+    def __init__(self, repos, ai_service, versions, usage=None):
+        self.repos = repos
+        self.ai_service = ai_service
+        self.versions = versions
+        self.usage = usage
+        self.min_changes = int(os.getenv('MINDSET_MIN_CHANGES', 3))
+        self.change_ratio = float(os.getenv('MINDSET_CHANGE_RATIO', 0.1))
+        self.recheck_seconds = float(os.getenv('MINDSET_RECHECK_SECONDS', 60))
+        self.engine = os.getenv('MINDSET_ENGINE', 'local').lower()
+        self.ai_names = os.getenv('MINDSET_AI_NAMES', '0').lower() in ('1', 'true', 'yes')
+        self._lock = threading.Lock()
+        self._user_locks = {}
+        self._refreshing = set()
+
+    def _checked_tag(self, user_email):
+        # Versions are per process and restart at zero, hence the boot ID
+        return f"{self.versions.boot_id}-{self.versions.version(user_email)}"
+
+    def is_stale(self, doc, user_email):
+        """Whether writes since the map was last checked may have changed its task set."""
+        if doc.get('checked') != self._checked_tag(user_email):
+            return True
+        if self.versions.sees_all_writes:
+            return False
+        age = (datetime.utcnow() - doc['checked_at']).total_seconds()
+        return age >= self.recheck_seconds
+
+    def needs_regeneration(self, doc, digests):
+        if doc is None:
+            return True
+        previous = doc.get('tasks') or []
+        threshold = max(self.min_changes, math.ceil(self.change_ratio * len(previous)))
+        # An emptied or first-filled task set always changes the map
+        return (not previous) != (not digests) or changed_tasks(previous, digests) >= threshold
+
+    @property
+    def method(self):
+        """The AIService method a map costs, or None when it is built without the model."""
+        if self.engine == 'ai':
+            return 'generate_mindset_map'
+        return 'name_mindset_themes' if self.ai_names else None
+
+    def build(self, tasks):
+        """A fresh map for `tasks`, or None when the model was needed and failed."""
+        if self.engine == 'ai':
+            return self.ai_service.generate_mindset_map(tasks)
+        themes = theme_clustering.find_themes(tasks)
+        names = None
+        if self.ai_names and themes:
+            names = self.ai_service.name_mindset_themes(theme_clustering.naming_prompt(tasks, themes))
+        return theme_clustering.mindset_map(themes, names)
+
+    async def build_async(self, tasks):
+        if self.engine == 'ai':
+            return await self.ai_service.generate_mindset_map_async(tasks)
+        themes = theme_clustering.find_themes(tasks)
+        names = None
+        if self.ai_names and themes:
+            names = await self.ai_service.name_mindset_themes_async(theme_clustering.naming_prompt(tasks, themes))
+        return theme_clustering.mindset_map(themes, names)
+
+    def _served(self, doc, user_email):
+        if self.usage and self.method:
+            self.usage.record_cache_hit(self.method, user_email=user_email)
+        if self.is_stale(doc, user_email):
+            self.refresh_in_background(user_email)
+        return doc['map']
+
+    def get(self, user_email=None):
+        """
+        The user's map: the stored one (refreshed in the background when
+        stale), or on the first visit one generated now.
+
+        Returns:
+            dict: The map, or None when the first generation failed
+        """
+        doc = self.repos.mindsets.find_one({'_id': _user_key(user_email)})
+        if doc is not None:
+            return self._served(doc, user_email)
+        return self.refresh(user_email)
+
+    async def get_async(self, repos, user_email=None):
+        """`get` for asgi.py on an async Repositories; refreshes still run on a background thread."""
+        doc = await repos.mindsets.find_one({'_id': _user_key(user_email)})
+        if doc is not None:
+            return self._served(doc, user_email)
+
+        checked = self._checked_tag(user_email)
+        tasks = await repos.tasks.find(tasks_query(user_email), TASK_PROJECTION).to_list(None)
+        mindset_map = await self.build_async(tasks)
+        if mindset_map:
+            update = self._stored(user_email, tasks, mindset_map, checked)
+            await repos.mindsets.update_one({'_id': _user_key(user_email)}, update, upsert=True)
+        return mindset_map
+
+    def refresh(self, user_email=None):
+        """
+        Recheck the user's task set and regenerate the map if enough of it changed.
+
+        Returns:
+            dict: The current map, or None when there is none and generation failed
+        """
+        with self._user_lock(user_email):
+            # Taken before reading the tasks, so writes made meanwhile trigger another recheck
+            checked = self._checked_tag(user_email)
+            key = _user_key(user_email)
+            doc = self.repos.mindsets.find_one({'_id': key})
+            tasks = list(self.repos.tasks.find(tasks_query(user_email), TASK_PROJECTION))
+            digests = task_digests(tasks)
+
+            if not self.needs_regeneration(doc, digests):
+                self.repos.mindsets.update_one(
+                    {'_id': key}, {'$set': {'checked': checked, 'checked_at': datetime.utcnow()}})
+                return doc['map']
+
+            mindset_map = self.build(tasks)
+            if not mindset_map:
+                # Keep serving the previous map; the next stale read tries again
+                return doc['map'] if doc else None
+            self.repos.mindsets.update_one({'_id': key}, self._stored(user_email, tasks, mindset_map, checked),
+                                           upsert=True)
+            logger.info("Rebuilt mindset map for %s from %d tasks", key or 'unowned tasks', len(tasks))
+            return mindset_map
+
+    def _stored(self, user_email, tasks, mindset_map, checked):
+        now = datetime.utcnow()
+        return {'$set': {
+            'user_email': user_email,
+            'map': mindset_map,
+            'tasks': task_digests(tasks),
+            'task_count': len(tasks),
+            'generated_at': now,
+            'checked': checked,
+            'checked_at': now,
+        }}
+
+    def _user_lock(self, user_email):
+        with self._lock:
+            return self._user_locks.setdefault(_user_key(user_email), threading.Lock())
+
+    def refresh_in_background(self, user_email=None):
+        """Start a refresh unless one is already running for this user."""
+        key = _user_key(user_email)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        with ai_priority(BACKGROUND), attribute_ai_usage(user_email):
+            start_thread(self._refresh_and_release, user_email, name='mindset-refresh')
+
+    def _refresh_and_release(self, user_email):
+        try:
+            self.refresh(user_email)
+        except Exception as e:
+            logger.exception("Error refreshing mindset map: %s", e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(_user_key(user_email))
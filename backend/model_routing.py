@@ -0,0 +1,218 @@
+"""
+Chooses the Gemini model for each AIService call.
+
+Each method has a route (DEFAULT_ROUTES): its candidate models in order of
+preference, a latency SLO and an estimate of how much output it produces.
+The request builders only supply the prompt and the number of tasks in
+it. Per call, the router:
+
+1. Estimates prompt tokens from the prompt text, and output tokens from the
+   route (a base plus a per-task amount, since the bulk analyses answer per
+   task).
+2. Drops candidates whose input or output token limit the call would
+   exceed ("size").
+3. Takes the first remaining candidate whose estimated latency, computed
+   from the model's profile (DEFAULT_MODELS), is within the SLO. When none
+   is, it takes the fastest one ("slo").
+4. Keeps the next remaining candidate as the fallback. AIService switches
+   to it when the chosen model answers 429 RESOURCE_EXHAUSTED or its
+   circuit is open.
+
+So a three-task analysis goes to the fast model with the small output
+limit, and a three-thousand-task one goes to a model that can answer in
+full. Every decision is counted by method, model and reason
+(`ai_model_routes_total`, `stats()`).
+
+Environment:
+    AI_MODELS: JSON {"model": {profile field: value}} merged over DEFAULT_MODELS
+    AI_MODEL_ROUTES: JSON {"method": {route field: value}} merged over DEFAULT_ROUTES
+"""
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Limits and rough speeds per model. Speeds are planning estimates for the
+# SLO check, not guarantees; tune them with AI_MODELS from observed latencies
+# (ai_request_duration_seconds).
+DEFAULT_MODELS = {
+    'gemini-2.0-flash-exp': {
+        'input_tokens': 1048576, 'output_tokens': 8192,
+        'first_token_seconds': 0.4, 'prompt_tokens_per_second': 20000, 'output_tokens_per_second': 200,
+    },
+    'gemini-2.5-flash': {
+        'input_tokens': 1048576, 'output_tokens': 65536,
+        'first_token_seconds': 0.6, 'prompt_tokens_per_second': 15000, 'output_tokens_per_second': 180,
+    },
+    'gemini-3-flash-preview': {
+        'input_tokens': 1048576, 'output_tokens': 65536,
+        'first_token_seconds': 0.8, 'prompt_tokens_per_second': 12000, 'output_tokens_per_second': 150,
+    },
+}
+
+# Per method: candidate models in order of preference, latency SLO in
+# seconds, and expected output tokens (a base plus an amount per task).
+DEFAULT_ROUTES = {
+    # Gemini 3 Flash for single-task analysis (Pro has quota limits)
+    'analyze_task': {'models': ['gemini-3-flash-preview', 'gemini-2.0-flash-exp'],
+                     'slo_seconds': 10, 'output_tokens': 300, 'output_tokens_per_item': 0},
+    'analyze_importance': {'models': ['gemini-3-flash-preview', 'gemini-2.5-flash'],
+                           'slo_seconds': 60, 'output_tokens': 50, 'output_tokens_per_item': 8},
+    'analyze_priority': {'models': ['gemini-2.0-flash-exp', 'gemini-2.5-flash'],
+                         'slo_seconds': 60, 'output_tokens': 50, 'output_tokens_per_item': 4},
+    'analyze_duplicates': {'models': ['gemini-2.0-flash-exp', 'gemini-2.5-flash'],
+                           'slo_seconds': 60, 'output_tokens': 50, 'output_tokens_per_item': 4},
+    'analyze_labels': {'models': ['gemini-2.0-flash-exp', 'gemini-2.5-flash'],
+                       'slo_seconds': 60, 'output_tokens': 50, 'output_tokens_per_item': 20},
+    'analyze_trash': {'models': ['gemini-2.0-flash-exp', 'gemini-2.5-flash'],
+                      'slo_seconds': 60, 'output_tokens': 50, 'output_tokens_per_item': 4},
+    # Flash 2.0 for consistent chat quality and reliable tool use
+    'chat_with_task_context': {'models': ['gemini-2.0-flash-exp', 'gemini-2.5-flash'],
+                               'slo_seconds': 10, 'output_tokens': 500, 'output_tokens_per_item': 0},
+    'execute_instruction': {'models': ['gemini-2.0-flash-exp', 'gemini-2.5-flash'],
+                            'slo_seconds': 30, 'output_tokens': 200, 'output_tokens_per_item': 0},
+    'generate_mindset_map': {'models': ['gemini-2.0-flash-exp', 'gemini-2.5-flash'],
+                             'slo_seconds': 15, 'output_tokens': 600, 'output_tokens_per_item': 1},
+    'name_mindset_themes': {'models': ['gemini-2.0-flash-exp', 'gemini-2.5-flash'],
+                            'slo_seconds': 10, 'output_tokens': 50, 'output_tokens_per_item': 40},
+}
+DEFAULT_ROUTE = {'models': ['gemini-2.0-flash-exp', 'gemini-2.5-flash'],
+                 'slo_seconds': 30, 'output_tokens': 500, 'output_tokens_per_item': 0}
+
+# Routing reasons, as counted in stats() and ai_model_routes_total
+PREFERRED = 'preferred'   # first candidate fits and meets the SLO
+SIZE = 'size'             # an earlier candidate cannot hold the prompt or the answer
+SLO = 'slo'               # an earlier candidate would be too slow
+OVERSIZE = 'oversize'     # no candidate fits; the largest one is tried anyway
+QUOTA_FALLBACK = 'quota_fallback'
+CIRCUIT_FALLBACK = 'circuit_fallback'
+
+Route = namedtuple('Route', 'model fallback reason prompt_tokens output_tokens estimated_seconds')
+
+
+def estimate_tokens(contents):
+    """Rough token count of a prompt: Gemini averages about four characters per token."""
+    if not isinstance(contents, str):
+        contents = json.dumps(contents, default=str)
+    return max(1, len(contents) // 4)
+
+
+def is_quota_error(error):
+    """Whether the model refused the call for quota (429 RESOURCE_EXHAUSTED)."""
+    return getattr(error, 'code', None) == 429
+
+
+def _load(env_name, defaults):
+    table = {name: dict(entry) for name, entry in defaults.items()}
+    raw = os.getenv(env_name)
+    if raw:
+        try:
+            for name, entry in json.loads(raw).items():
+                table.setdefault(name, {}).update(entry)
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning("Ignoring invalid %s: %s", env_name, e)
+    return table
+
+
+class ModelRouter:
+    """
+    Picks a model and a fallback per call from the method's route.
+
+    Args:
+        models (dict): Model -> profile, merged over DEFAULT_MODELS and AI_MODELS
+        routes (dict): Method -> route, merged over DEFAULT_ROUTES and AI_MODEL_ROUTES
+        metrics: Metrics module exposing `observe_ai_route`
+    """
+
+    def __init__(self, models=None, routes=None, metrics=None):
+        self.models = _load('AI_MODELS', DEFAULT_MODELS)
+        for name, profile in (models or {}).items():
+            self.models.setdefault(name, {}).update(profile)
+        self.routes = _load('AI_MODEL_ROUTES', DEFAULT_ROUTES)
+        for method, route in (routes or {}).items():
+            self.routes.setdefault(method, {}).update(route)
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def route(self, method, contents, items=0):
+        """
+        Choose the model for one call and record the decision.
+
+        Args:
+            method (str): AIService method name
+            contents: Prompt passed to generate_content
+            items (int): Tasks in the prompt, for methods answering per task
+
+        Returns:
+            Route: model, fallback (or None), reason and the estimates behind them
+        """
+        route = dict(DEFAULT_ROUTE, **self.routes.get(method, {}))
+        prompt_tokens = estimate_tokens(contents)
+        output_tokens = int(route['output_tokens'] + route['output_tokens_per_item'] * items)
+
+        fitting = [model for model in route['models'] if self._fits(model, prompt_tokens, output_tokens)]
+        if not fitting:
+            model = max(route['models'], key=lambda name: self._profile(name).get('output_tokens', 0))
+            logger.warning("%s needs ~%d prompt and ~%d output tokens, more than any routed model; trying %s",
+                           method, prompt_tokens, output_tokens, model)
+            decision = Route(model, None, OVERSIZE, prompt_tokens, output_tokens,
+                             self.estimate_seconds(model, prompt_tokens, output_tokens))
+            self.record(method, model, OVERSIZE)
+            return decision
+
+        estimates = {model: self.estimate_seconds(model, prompt_tokens, output_tokens) for model in fitting}
+        within_slo = [model for model in fitting if estimates[model] <= route['slo_seconds']]
+        model = within_slo[0] if within_slo else min(fitting, key=estimates.get)
+        if model == route['models'][0]:
+            reason = PREFERRED
+        elif route['models'][0] not in fitting:
+            reason = SIZE
+        else:
+            reason = SLO
+        # The next fitting candidate after the chosen one, else the one before it
+        others = fitting[fitting.index(model) + 1:] + fitting[:fitting.index(model)]
+        decision = Route(model, others[0] if others else None, reason, prompt_tokens, output_tokens,
+                         estimates[model])
+        logger.debug("Routed %s to %s (%s): ~%d prompt, ~%d output tokens, ~%.1fs",
+                     method, model, reason, prompt_tokens, output_tokens, estimates[model])
+        self.record(method, model, reason)
+        return decision
+
+    def _profile(self, model):
+        return self.models.get(model, {})
+
+    def _fits(self, model, prompt_tokens, output_tokens):
+        profile = self._profile(model)
+        return (prompt_tokens <= profile.get('input_tokens', float('inf'))
+                and output_tokens <= profile.get('output_tokens', float('inf')))
+
+    def estimate_seconds(self, model, prompt_tokens, output_tokens):
+        """Planning estimate of a call's latency; 0 for models without a profile."""
+        profile = self._profile(model)
+        seconds = profile.get('first_token_seconds', 0.0)
+        if profile.get('prompt_tokens_per_second'):
+            seconds += prompt_tokens / profile['prompt_tokens_per_second']
+        if profile.get('output_tokens_per_second'):
+            seconds += output_tokens / profile['output_tokens_per_second']
+        return seconds
+
+    def record(self, method, model, reason):
+        """Count a routing decision, including fallbacks AIService makes after routing."""
+        with self._lock:
+            key = (method, model, reason)
+            self._counts[key] = self._counts.get(key, 0) + 1
+        if self.metrics:
+            self.metrics.observe_ai_route(method, model, reason)
+
+    def stats(self):
+        """Decisions since the process started: method -> model -> reason -> count."""
+        with self._lock:
+            counts = dict(self._counts)
+        stats = {}
+        for (method, model, reason), count in sorted(counts.items()):
+            stats.setdefault(method, {}).setdefault(model, {})[reason] = count
+        return stats
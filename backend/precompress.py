@@ -0,0 +1,66 @@
+"""
+Write brotli and gzip variants of the built frontend for static_files.py.
+
+    python precompress.py static
+
+Runs once at image build time, at maximum compression, so no request ever
+compresses an asset. Text-like files of at least --min-size bytes get a
+`.gz` and, when the brotli package is installed, a `.br` next to them.
+Variants that do not shrink the file are not written.
+"""
+import argparse
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional, gzip always works
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.html', '.js', '.mjs', '.css', '.json', '.map', '.svg', '.txt', '.xml', '.webmanifest', '.wasm', '.ico'
+}
+
+
+def precompress(path, min_size=512):
+    """Write the variants of one file. Returns the number written."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < min_size:
+        return 0
+
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+
+    written = 0
+    stat = os.stat(path)
+    for suffix, body in variants:
+        if len(body) >= len(data):
+            continue
+        with open(path + suffix, 'wb') as f:
+            f.write(body)
+        # Same mtime as the original, so ETags agree across rebuilt layers
+        os.utime(path + suffix, (stat.st_atime, stat.st_mtime))
+        written += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompress static files for static_files.py.")
+    parser.add_argument('root', help="Directory to walk, e.g. static")
+    parser.add_argument('--min-size', type=int, default=512, help="Smallest file worth compressing, in bytes")
+    args = parser.parse_args()
+
+    files = written = 0
+    for dirpath, _, filenames in os.walk(args.root):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                files += 1
+                written += precompress(os.path.join(dirpath, filename), args.min_size)
+    print(f"Wrote {written} compressed variants for {files} files under {args.root}"
+          f"{'' if brotli else ' (gzip only, brotli is not installed)'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+Run timer jobs without serving HTTP.
+
+Use beside web processes started with SCHEDULER_MODE=off:
+
+    SCHEDULER_MODE=off gunicorn -c gunicorn.conf.py app:app
+    python run_scheduler.py
+"""
+import logging
+import os
+import signal
+import threading
+
+os.environ['APP_DEFER_INIT'] = '1'
+
+import app as appmod
+
+logger = logging.getLogger('run_scheduler')
+
+
+def main():
+    appmod.init_services(run_scheduler=True)
+    logger.info("Scheduler running with %d timers", len(appmod.timer_skill.active_timers))
+
+    stopped = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *args: stopped.set())
+    stopped.wait()
+
+    logger.info("Shutting down scheduler")
+    appmod.shutdown_services()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Chooses the single process that runs timer jobs.
+
+With several gunicorn workers every process would otherwise start its own
+APScheduler and fire each timer once per worker. SCHEDULER_MODE:
+
+    auto (default)  The first process to take an exclusive lock on
+                    SCHEDULER_LOCK_FILE runs the jobs. The kernel drops the
+                    lock when that process exits, so the worker gunicorn
+                    starts in its place takes over.
+    on              This process runs the jobs (single-process deployments)
+    off             No web process does; run `python run_scheduler.py` beside them
+"""
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - no flock on Windows, every process is its own host
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+AUTO, ON, OFF = 'auto', 'on', 'off'
+
+
+def scheduler_mode():
+    mode = os.getenv('SCHEDULER_MODE', AUTO).lower()
+    return mode if mode in (AUTO, ON, OFF) else AUTO
+
+
+class SchedulerLock:
+    """Non-blocking exclusive flock held for the life of the process."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('SCHEDULER_LOCK_FILE', '/tmp/dorae-scheduler.lock')
+        self._fd = None
+
+    @property
+    def held(self):
+        return self._fd is not None
+
+    def acquire(self):
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # Record the owner for operators; the lock itself is the flock
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+def elect(lock, mode=None):
+    """
+    Decide whether this process runs timer jobs.
+
+    Args:
+        lock (SchedulerLock): Lock contended in "auto" mode
+        mode (str): Overrides SCHEDULER_MODE
+
+    Returns:
+        bool: True if this process should start the scheduler
+    """
+    mode = mode or scheduler_mode()
+    if mode == ON:
+        return True
+    if mode == OFF:
+        return False
+    if lock.acquire():
+        logger.info("Elected to run timer jobs (pid %d, lock %s)", os.getpid(), lock.path)
+        return True
+    logger.info("Another process runs timer jobs (lock %s)", lock.path)
+    return False
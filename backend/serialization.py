@@ -0,0 +1,141 @@
+import base64
+import gzip
+import json
+import os
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from bson import ObjectId, Decimal128, Binary, Timestamp
+from flask import request
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - MessagePack is optional
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional, gzip always works
+    brotli = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESSIBLE_MIMETYPES = {JSON_MIMETYPE, MSGPACK_MIMETYPE, 'text/plain', 'text/html'}
+
+
+def bson_default(value):
+    """Convert BSON and other non-JSON-native values to JSON-safe equivalents."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (Decimal128, Decimal)):
+        return str(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (Binary, bytes)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    if isinstance(value, Timestamp):
+        return value.as_datetime().isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Serialize to JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=bson_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=bson_default, separators=(',', ':')).encode('utf-8')
+
+
+def negotiated_format():
+    """Return the response mimetype the current request asked for."""
+    if msgpack is None or MSGPACK_MIMETYPE not in request.accept_mimetypes.values():
+        return JSON_MIMETYPE
+    return request.accept_mimetypes.best_match([JSON_MIMETYPE, MSGPACK_MIMETYPE], JSON_MIMETYPE)
+
+
+class BSONJSONProvider(JSONProvider):
+    """
+    Flask JSON provider used by every `jsonify` call and dict/list return.
+
+    ObjectId, datetime, Decimal128 and friends are encoded uniformly at any
+    nesting depth, orjson does the work when available, and clients that send
+    `Accept: application/msgpack` get MessagePack instead of JSON.
+    """
+
+    mimetype = JSON_MIMETYPE
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is not None:
+            return orjson.loads(s)
+        return json.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if negotiated_format() == MSGPACK_MIMETYPE:
+            body = msgpack.packb(obj, default=bson_default, use_bin_type=True, datetime=False)
+            response = self._app.response_class(body, mimetype=MSGPACK_MIMETYPE)
+        else:
+            response = self._app.response_class(dumps(obj), mimetype=JSON_MIMETYPE)
+        response.vary.add('Accept')
+        return response
+
+
+def negotiated_encoding():
+    """Return the Content-Encoding the current request accepts best: 'br', 'gzip' or None."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def encode_response(response, encoding):
+    """
+    Encode a buffered response body with `encoding` ('br', 'gzip' or None).
+
+    Streaming responses (SSE), already-encoded bodies, non-200 responses and
+    bodies under COMPRESS_MIN_SIZE bytes are left unchanged.
+
+    Returns:
+        str: The Content-Encoding applied, or None if the body was left as is
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return None
+
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if encoding is None or len(body) < COMPRESS_MIN_SIZE:
+        return None
+
+    if encoding == 'br':
+        response.set_data(brotli.compress(body, quality=4))
+    else:
+        response.set_data(gzip.compress(body, compresslevel=5))
+    response.headers['Content-Encoding'] = encoding
+    return encoding
+
+
+def compress_response(response):
+    """after_request hook: brotli/gzip-encode large buffered responses (see encode_response)."""
+    encode_response(response, negotiated_encoding())
+    return response
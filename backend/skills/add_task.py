@@ -1,7 +1,10 @@
+import logging
 import uuid
 from datetime import datetime
 from bson import ObjectId
 
+logger = logging.getLogger(__name__)
+
 class AddTaskSkill:
     """
     Add Task Skill - Enables AI agents to create tasks programmatically.
@@ -16,14 +19,16 @@ class AddTaskSkill:
     - Initial updates
     """
     
-    def __init__(self, db):
+    def __init__(self, db, versions=None):
         """
         Initialize the Add Task skill.
         
         Args:
             db: MongoDB database instance
+            versions: Optional VersionStore bumped when a task is created
         """
         self.db = db
+        self.versions = versions
         self.tasks_collection = db['tasks']
         self.agents_collection = db['agents']
     
@@ -48,10 +53,6 @@ class AddTaskSkill:
         Raises:
             ValueError: If title is missing or agent not found
         """
-        # Validate inputs
-        if not task_data or 'title' not in task_data:
-            raise ValueError("Task title is required")
-        
         # Verify agent exists if ID provided
         agent = None
         if agent_id:
@@ -59,7 +60,44 @@ class AddTaskSkill:
                 agent = self.agents_collection.find_one({"_id": ObjectId(agent_id)})
             except Exception:
                 pass
-        
+
+        new_task = self.build_task(agent_id, agent, task_data)
+
+        # Insert into database
+        result = self.tasks_collection.insert_one(new_task)
+        return self._created(agent_id, new_task, result.inserted_id)
+
+    async def create_task_async(self, db, agent_id, task_data):
+        """
+        `create_task()` against asyncio collections.
+
+        Args:
+            db: Repositories over AsyncMongoClient or storage.aio collections
+            agent_id (str): The ID of the agent creating the task
+            task_data (dict): See `create_task()`
+        """
+        agent = None
+        if agent_id:
+            try:
+                agent = await db['agents'].find_one({"_id": ObjectId(agent_id)})
+            except Exception:
+                pass
+
+        new_task = self.build_task(agent_id, agent, task_data)
+        result = await db['tasks'].insert_one(new_task)
+        return self._created(agent_id, new_task, result.inserted_id)
+
+    def build_task(self, agent_id, agent, task_data):
+        """
+        Build the task document without writing it.
+
+        Raises:
+            ValueError: If title is missing
+        """
+        # Validate inputs
+        if not task_data or 'title' not in task_data:
+            raise ValueError("Task title is required")
+
         # Build task document
         now = datetime.utcnow()
         
@@ -104,12 +142,15 @@ class AddTaskSkill:
                 "skill": "add_task"
             }
             new_task['updates'].append(initial_update)
+        return new_task
+
+    def _created(self, agent_id, new_task, inserted_id):
+        new_task['_id'] = inserted_id
+        if self.versions:
+            self.versions.bump(new_task.get('user_email'), 'task', id=str(inserted_id))
         
-        # Insert into database
-        result = self.tasks_collection.insert_one(new_task)
-        new_task['_id'] = result.inserted_id
-        
-        print(f"[AddTaskSkill] Agent {agent_id} created task: {task_data['title']} (ID: {result.inserted_id})")
+        logger.info("Agent %s created task: %s (ID: %s)", agent_id, new_task['title'], inserted_id,
+                    extra={'agent_id': agent_id, 'task_id': str(inserted_id)})
         
         return new_task
     
@@ -1,58 +1,145 @@
+import logging
+import os
+import threading
+import time
 import uuid
 from datetime import datetime
 from bson import ObjectId
 
+from ai_admission import TIMER, priority
+from ai_usage import attribute
+from app_logging import bind_request_id, current_request_id
+
+logger = logging.getLogger(__name__)
+
+SYNC_JOB_ID = 'timer-sync'
+
 class TimerSkill:
-    def __init__(self, scheduler, ai_service, db):
+    def __init__(self, scheduler, ai_service, db, versions=None, metrics=None, run_jobs=True):
+        """
+        Args:
+            scheduler: APScheduler the jobs run on; may be None until `start()`
+            run_jobs (bool): Whether this process runs the timer jobs. Only one
+                process does (see scheduler_lock.py); the others persist timers
+                and read them back from MongoDB, and the running process picks
+                up their changes every TIMER_SYNC_SECONDS.
+        """
         self.scheduler = scheduler
         self.ai_service = ai_service
         self.db = db
+        self.versions = versions
+        self.metrics = metrics
+        self.run_jobs = run_jobs
+        self.started = False
         self.timers_collection = db['timers']
         self.active_timers = {}
-        
-        # Restore active timers from DB
-        self._restore_timers()
+        # Serializes the sync job with start/stop requests, so a sync that read
+        # the timers before a stop can't reschedule the stopped timer
+        self._lock = threading.RLock()
+
+    @property
+    def jobs_running(self):
+        """True once this process has restored the timers and schedules their jobs."""
+        return self.run_jobs and self.started
+
+    def start(self, scheduler=None):
+        """
+        Restore active timers from the DB and follow timers other processes
+        start and stop. Until this runs the skill persists timers like a
+        process that does not run jobs; the restore then schedules them.
+
+        Args:
+            scheduler: Started APScheduler, replacing the one given to __init__
+        """
+        if not self.run_jobs or self.started:
+            return
+        if scheduler is not None:
+            self.scheduler = scheduler
+        with self._lock:
+            self._restore_timers()
+        self.scheduler.add_job(
+            id=SYNC_JOB_ID,
+            func=self.sync_timers,
+            trigger='interval',
+            seconds=int(os.getenv('TIMER_SYNC_SECONDS', 15)),
+            replace_existing=True
+        )
+        self.started = True
 
     def _restore_timers(self):
         """Restores timers from MongoDB on startup."""
         try:
             saved_timers = list(self.timers_collection.find())
-            print(f"[TimerSkill] Restoring {len(saved_timers)} timers from DB...")
+            logger.info("Restoring %d timers from DB...", len(saved_timers))
             
             for timer_data in saved_timers:
-                job_id = timer_data['job_id']
-                agent_id = timer_data['agent_id']
-                interval = timer_data['interval']
-                instruction = timer_data['instruction']
-                task_ids = timer_data['task_ids']
-                
-                # Check if job already exists in scheduler (unlikely on fresh start, but good safety)
-                if self.scheduler.get_job(job_id):
-                    print(f"[TimerSkill] Job {job_id} already exists in scheduler.")
-                    self.active_timers[job_id] = timer_data
-                    continue
-                    
-                self._schedule_job(job_id, agent_id, interval, instruction, task_ids)
-                
-                # Update in-memory dict
-                self.active_timers[job_id] = {
-                    "agent_id": agent_id,
-                    "interval": interval,
-                    "instruction": instruction,
-                    "task_ids": task_ids,
-                    "created_at": timer_data.get('created_at')
-                }
-                print(f"[TimerSkill] Restored timer {job_id} for agent {agent_id}")
+                self._restore_timer(timer_data)
                 
         except Exception as e:
-            print(f"[TimerSkill] Error restoring timers: {e}")
+            logger.exception("Error restoring timers: %s", e)
+
+    def _restore_timer(self, timer_data):
+        job_id = timer_data['job_id']
+        agent_id = timer_data['agent_id']
+        interval = timer_data['interval']
+        instruction = timer_data['instruction']
+        task_ids = timer_data['task_ids']
+        
+        # Check if job already exists in scheduler (unlikely on fresh start, but good safety)
+        if self.scheduler.get_job(job_id):
+            logger.info("Job %s already exists in scheduler.", job_id)
+            self.active_timers[job_id] = timer_data
+            return
+            
+        self._schedule_job(job_id, agent_id, interval, instruction, task_ids)
+        
+        # Update in-memory dict
+        self.active_timers[job_id] = {
+            "agent_id": agent_id,
+            "interval": interval,
+            "instruction": instruction,
+            "task_ids": task_ids,
+            "created_at": timer_data.get('created_at')
+        }
+        logger.info("Restored timer %s for agent %s", job_id, agent_id)
+
+    def sync_timers(self):
+        """Schedule timers started by other processes and drop the ones they stopped."""
+        with self._lock:
+            try:
+                saved = {t['job_id']: t for t in self.timers_collection.find()}
+            except Exception as e:
+                logger.error("Error syncing timers: %s", e)
+                return
+            for job_id in set(self.active_timers) - set(saved):
+                try:
+                    self.scheduler.remove_job(job_id)
+                except Exception:
+                    pass
+                del self.active_timers[job_id]
+                logger.info("Unscheduled timer %s stopped elsewhere", job_id)
+            for job_id, timer_data in saved.items():
+                if job_id not in self.active_timers:
+                    self._restore_timer(timer_data)
 
     def _schedule_job(self, job_id, agent_id, interval, instruction, task_ids):
         """Helper to create the closure and add job to scheduler."""
-        
+        # Ticks run on scheduler threads; each gets its own request ID and
+        # records the request that created the timer
+        origin_request_id = current_request_id()
+
         def job_function():
-            print(f"[TimerSkill] Executing Job {job_id} for Agent {agent_id}")
+            started = time.perf_counter()
+            with bind_request_id(), priority(TIMER):
+                failures = run_tasks()
+            if self.metrics:
+                self.metrics.observe_timer_tick(time.perf_counter() - started, 'error' if failures else 'success')
+
+        def run_tasks():
+            logger.info("Executing Job %s for Agent %s", job_id, agent_id,
+                        extra={'job_id': job_id, 'agent_id': agent_id, 'origin_request_id': origin_request_id})
             current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            failures = 0
             
             # Using the db reference captured from self.db
             tasks_collection = self.db['tasks']
@@ -61,7 +148,7 @@ class TimerSkill:
                 try:
                     task = tasks_collection.find_one({"_id": ObjectId(task_id)})
                     if not task:
-                        print(f"Task {task_id} not found, skipping.")
+                        logger.info("Task %s not found, skipping.", task_id)
                         continue
                         
                     # Prepare context for AI
@@ -72,7 +159,8 @@ class TimerSkill:
                     }
                     
                     # Execute Instruction via AI
-                    result = self.ai_service.execute_instruction(instruction, task_context, current_time)
+                    with attribute(task.get('user_email')):
+                        result = self.ai_service.execute_instruction(instruction, task_context, current_time)
                     
                     if result and result.get('action') == 'add_update':
                         content = result.get('content')
@@ -91,19 +179,24 @@ class TimerSkill:
                             {"_id": ObjectId(task_id)},
                             {"$push": {"updates": update_item}}
                         )
-                        print(f"[TimerSkill] Added update to task {task_id}: {content}")
+                        if self.versions:
+                            self.versions.bump(task.get('user_email'), 'timer', id=task_id, job_id=job_id)
+                        logger.debug("Added update to task %s: %s", task_id, content, extra={'job_id': job_id})
                     else:
-                        print(f"[TimerSkill] No action or invalid result: {result}")
+                        logger.debug("No action or invalid result: %s", result, extra={'job_id': job_id})
                         
                 except Exception as e:
-                    print(f"[TimerSkill] Error processing task {task_id}: {e}")
+                    failures += 1
+                    logger.error("Error processing task %s: %s", task_id, e, extra={'job_id': job_id})
+            return failures
 
         # Add job to scheduler
         self.scheduler.add_job(
             id=job_id,
             func=job_function,
             trigger='interval',
-            seconds=int(interval)
+            seconds=int(interval),
+            replace_existing=True  # start_timer and a concurrent sync may both schedule it
         )
 
     def start_timer(self, agent_id, interval, instruction, task_ids):
@@ -111,63 +204,82 @@ class TimerSkill:
         Starts a periodic timer that executes the instruction on the given tasks.
         Persists to MongoDB.
         """
-        job_id = str(uuid.uuid4())
-        created_at = datetime.utcnow().isoformat()
-        
-        # 1. Save to MongoDB
-        timer_doc = {
-            "job_id": job_id,
-            "agent_id": agent_id,
-            "interval": interval,
-            "instruction": instruction,
-            "task_ids": task_ids,
-            "created_at": created_at
-        }
-        
-        try:
-            self.timers_collection.insert_one(timer_doc)
-        except Exception as e:
-            print(f"[TimerSkill] Error persisting timer: {e}")
-            raise e
-        
-        # 2. Schedule the job
-        self._schedule_job(job_id, agent_id, interval, instruction, task_ids)
-        
-        # 3. Update in-memory
-        self.active_timers[job_id] = {
-            "agent_id": agent_id,
-            "interval": interval,
-            "instruction": instruction,
-            "task_ids": task_ids,
-            "created_at": created_at
-        }
-        
-        return job_id
+        with self._lock:
+            job_id = str(uuid.uuid4())
+            created_at = datetime.utcnow().isoformat()
+
+            # 1. Save to MongoDB
+            timer_doc = {
+                "job_id": job_id,
+                "agent_id": agent_id,
+                "interval": interval,
+                "instruction": instruction,
+                "task_ids": task_ids,
+                "created_at": created_at
+            }
+
+            try:
+                self.timers_collection.insert_one(timer_doc)
+            except Exception as e:
+                logger.error("Error persisting timer: %s", e)
+                raise e
+
+            # 2. Schedule the job (other processes leave it to the timer-sync job,
+            # and before `start()` the restore picks it up)
+            if not self.jobs_running:
+                return job_id
+            self._schedule_job(job_id, agent_id, interval, instruction, task_ids)
+
+            # 3. Update in-memory
+            self.active_timers[job_id] = {
+                "agent_id": agent_id,
+                "interval": interval,
+                "instruction": instruction,
+                "task_ids": task_ids,
+                "created_at": created_at
+            }
+
+            return job_id
 
     def stop_timer(self, job_id):
-        stopped = False
-        
-        # 1. Remove from Scheduler
-        try:
-            self.scheduler.remove_job(job_id)
-            stopped = True
-        except Exception as e:
-            print(f"Error removing job {job_id} from scheduler: {e}")
-            # If job not found in scheduler, we still proceed to clean DB
-            if "Job lookup error" in str(e):
-                stopped = True # Consider it stopped since it's not running
-            
-        # 2. Remove from MongoDB
-        try:
-            self.timers_collection.delete_one({"job_id": job_id})
-        except Exception as e:
-            print(f"Error removing job {job_id} from DB: {e}")
-            
-        # 3. Remove from Memory
-        if job_id in self.active_timers:
-            del self.active_timers[job_id]
-            
-        return stopped
+        with self._lock:
+            if not self.jobs_running:
+                # The process running the job drops it on its next sync
+                try:
+                    return self.timers_collection.delete_one({"job_id": job_id}).deleted_count > 0
+                except Exception as e:
+                    logger.error("Error removing job %s from DB: %s", job_id, e)
+                    return False
+
+            stopped = False
+
+            # 1. Remove from Scheduler
+            try:
+                self.scheduler.remove_job(job_id)
+                stopped = True
+            except Exception as e:
+                logger.warning("Error removing job %s from scheduler: %s", job_id, e)
+                # If job not found in scheduler, we still proceed to clean DB
+                if "Job lookup error" in str(e):
+                    stopped = True # Consider it stopped since it's not running
+
+            # 2. Remove from MongoDB
+            try:
+                self.timers_collection.delete_one({"job_id": job_id})
+            except Exception as e:
+                logger.error("Error removing job %s from DB: %s", job_id, e)
+
+            # 3. Remove from Memory
+            if job_id in self.active_timers:
+                del self.active_timers[job_id]
+
+            return stopped
 
     def get_agent_timers(self, agent_id):
-        return {k: v for k, v in self.active_timers.items() if v['agent_id'] == agent_id}
+        if not self.jobs_running:
+            return {
+                t['job_id']: {key: t.get(key) for key in ('agent_id', 'interval', 'instruction', 'task_ids', 'created_at')}
+                for t in self.timers_collection.find({"agent_id": agent_id})
+            }
+        with self._lock:
+            return {k: v for k, v in self.active_timers.items() if v['agent_id'] == agent_id}
@@ -0,0 +1,147 @@
+"""
+Startup phase timings, reported at /api/health?verbose=1.
+
+app.py marks the end of each import step with `mark()` and times each part of
+init_services() with `phase()`. Work moved off the startup path is timed when
+it eventually runs: `after_ready()` jobs once the first request arrives (or
+STARTUP_DEFER_SECONDS pass without one), lazily created clients on first use
+via `record()`.
+
+Environment:
+    STARTUP_DEFER_SECONDS: Longest wait for a first request before the
+        deferred jobs run anyway, default 10
+"""
+import contextlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _process_age():
+    """Seconds since this process was created, on platforms exposing /proc."""
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the parenthesized command name; starttime is field 22
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+# Interpreter start up to this import; forked workers inherit the master's figures
+_age_at_import = _process_age()
+_process_created = time.time() - (_age_at_import or 0.0)
+_last_mark = time.perf_counter()
+
+_lock = threading.Lock()
+_phases = {'import': [], 'init': [], 'deferred': [], 'lazy': []}
+_first_request_s = None
+_first_response_s = None
+
+_ready = threading.Event()
+_deferred = []
+_deferred_done = threading.Event()
+_deferred_thread = None
+
+
+def record(section, name, seconds):
+    with _lock:
+        _phases[section].append({'name': name, 'ms': round(seconds * 1000, 3)})
+
+
+def mark(name):
+    """Record the import step that ended now (time since the previous mark)."""
+    global _last_mark
+    now = time.perf_counter()
+    record('import', name, now - _last_mark)
+    _last_mark = now
+
+
+@contextlib.contextmanager
+def phase(name, section='init'):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(section, name, time.perf_counter() - started)
+
+
+def after_ready(name, func):
+    """Run `func` after the first request, off the request path."""
+    _deferred.append((name, func))
+
+
+def start_deferred():
+    """Start the thread running the `after_ready` jobs. Call once per process, after init."""
+    global _deferred_thread
+    _ready.clear()
+    _deferred_done.clear()
+    _deferred_thread = threading.Thread(target=_run_deferred, name='startup-deferred', daemon=True)
+    _deferred_thread.start()
+
+
+def _run_deferred():
+    _ready.wait(float(os.getenv('STARTUP_DEFER_SECONDS', 10)))
+    for name, func in _deferred:
+        try:
+            with phase(name, section='deferred'):
+                func()
+        except Exception as e:
+            logger.exception("Deferred startup job %s failed: %s", name, e)
+    _deferred_done.set()
+
+
+def run_deferred(timeout=None):
+    """Release the deferred jobs now and wait for them (benchmarks, scripts, tests)."""
+    _ready.set()
+    if _deferred_thread is not None:
+        _deferred_done.wait(timeout)
+
+
+def _since_start():
+    return time.time() - _process_created
+
+
+def request_started():
+    """Note a request arriving; the first one releases the deferred jobs."""
+    global _first_request_s
+    if _first_request_s is None:
+        _first_request_s = _since_start()
+        _ready.set()
+
+
+def response_sent():
+    global _first_response_s
+    if _first_response_s is None:
+        _first_response_s = _since_start()
+
+
+def _after_request(response):
+    response_sent()
+    return response
+
+
+def init_app(app):
+    """Note the first request and response; the first request releases the deferred jobs."""
+    app.before_request(request_started)
+    app.after_request(_after_request)
+
+
+def report():
+    with _lock:
+        phases = {section: list(entries) for section, entries in _phases.items()}
+    totals = {section: round(sum(p['ms'] for p in entries), 3) for section, entries in phases.items()}
+    return {
+        'interpreter_ms': round(_age_at_import * 1000, 3) if _age_at_import is not None else None,
+        'import_ms': totals['import'],
+        'init_ms': totals['init'],
+        'first_request_ms': round(_first_request_s * 1000, 3) if _first_request_s is not None else None,
+        'first_response_ms': round(_first_response_s * 1000, 3) if _first_response_s is not None else None,
+        'deferred_pending': bool(_deferred) and not _deferred_done.is_set(),
+        'phases': phases,
+    }
@@ -0,0 +1,165 @@
+"""
+Serves the built frontend (the Vite `dist/` copied to `static/`) in front of Flask.
+
+    app.wsgi_app = StaticFiles(app.wsgi_app, app.static_folder)
+
+The static directory is indexed once at startup, so answering an asset
+request is a dict lookup and a file handed to the server's
+`wsgi.file_wrapper` (sendfile under gunicorn). Flask routing, the request
+hooks, metrics and the access log are never entered for it.
+
+- `precompress.py` writes `.br`/`.gz` variants at image build time. They
+  are served by Accept-Encoding and never compressed per request.
+- Vite's content-hashed bundles under `assets/` are cached for a year as
+  `immutable`.
+- Everything else, `index.html` included, is revalidated with an ETag
+  built from mtime and size, so a revalidation is a 304 without a read.
+- Client-side routes (GET paths outside /api/ with no file extension) get
+  `index.html` here instead of going through Flask's 404 handler.
+
+Environment:
+    STATIC_MAX_AGE: Cache lifetime in seconds for unhashed files other
+        than index.html, default 3600
+"""
+import logging
+import mimetypes
+import os
+import re
+from wsgiref.util import FileWrapper
+
+from werkzeug.http import parse_accept_header, parse_etags
+
+logger = logging.getLogger(__name__)
+
+INDEX = 'index.html'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# Vite names bundles <name>-<hash>.<ext>, the hash being 8+ url-safe base64 chars
+HASHED_ASSET = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+
+# Precompressed variant suffix per Content-Encoding, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class StaticFile:
+    """
+    One servable file and its precompressed variants.
+
+    Args:
+        path (str): Absolute path of the uncompressed file
+        url_path (str): Path relative to the static root, e.g. "assets/index-Bx1.js"
+        max_age (int): Cache lifetime for unhashed files other than index.html
+    """
+
+    def __init__(self, path, url_path, max_age):
+        self.path = path
+        content_type, _ = mimetypes.guess_type(path)
+        if content_type is None:
+            content_type = 'application/octet-stream'
+        elif content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+
+        if HASHED_ASSET.match(url_path):
+            cache_control = IMMUTABLE
+        elif url_path == INDEX:
+            cache_control = REVALIDATE
+        else:
+            cache_control = f'public, max-age={max_age}'
+
+        # (encoding, path, size, etag); the identity variant last
+        self.variants = []
+        for encoding, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix):
+                self.variants.append((encoding,) + self._stat(path + suffix, encoding))
+        self.variants.append((None,) + self._stat(path, None))
+
+        self.headers = [('Content-Type', content_type), ('Cache-Control', cache_control)]
+        if len(self.variants) > 1:
+            self.headers.append(('Vary', 'Accept-Encoding'))
+
+    @staticmethod
+    def _stat(path, encoding):
+        st = os.stat(path)
+        etag = f'"{int(st.st_mtime):x}-{st.st_size:x}{"-" + encoding if encoding else ""}"'
+        return path, st.st_size, etag
+
+    def select(self, accept_encoding):
+        """Return (encoding, path, size, etag) of the best variant for an Accept-Encoding header."""
+        if len(self.variants) > 1 and accept_encoding:
+            accepted = parse_accept_header(accept_encoding)
+            for variant in self.variants[:-1]:
+                if accepted[variant[0]]:
+                    return variant
+        return self.variants[-1]
+
+
+class StaticFiles:
+    """
+    WSGI middleware answering GET/HEAD for files under `root` before the wrapped app.
+
+    Args:
+        app: The wrapped WSGI application (Flask's `wsgi_app`)
+        root (str): Static directory; a missing directory serves nothing
+        api_prefix (str): Paths never answered with the SPA fallback
+    """
+
+    def __init__(self, app, root, api_prefix='/api/'):
+        self.app = app
+        self.root = root
+        self.api_prefix = api_prefix
+        self.files = self._scan(root, int(os.getenv('STATIC_MAX_AGE', 3600)))
+        self.index = self.files.get('/' + INDEX)
+        if self.files:
+            logger.info("Serving %d static files from %s", len(self.files), root)
+
+    @staticmethod
+    def _scan(root, max_age):
+        files = {}
+        if not root or not os.path.isdir(root):
+            return files
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(tuple(suffix for _, suffix in ENCODINGS)) and \
+                        os.path.isfile(os.path.join(dirpath, filename.rsplit('.', 1)[0])):
+                    continue  # A variant, served through its original's entry
+                path = os.path.join(dirpath, filename)
+                url_path = os.path.relpath(path, root).replace(os.sep, '/')
+                files['/' + url_path] = StaticFile(path, url_path, max_age)
+        return files
+
+    def __call__(self, environ, start_response):
+        if environ['REQUEST_METHOD'] not in ('GET', 'HEAD') or not self.files:
+            return self.app(environ, start_response)
+
+        path = environ.get('PATH_INFO') or '/'
+        static_file = self.files.get(path)
+        if static_file is None:
+            if path == '/' or self._is_client_route(path):
+                static_file = self.index
+            if static_file is None:
+                return self.app(environ, start_response)
+        return self._serve(static_file, environ, start_response)
+
+    def _is_client_route(self, path):
+        """A path the SPA router handles: not the API and not a file name."""
+        return not path.startswith(self.api_prefix) and '.' not in path.rsplit('/', 1)[-1]
+
+    def _serve(self, static_file, environ, start_response):
+        encoding, path, size, etag = static_file.select(environ.get('HTTP_ACCEPT_ENCODING'))
+        headers = list(static_file.headers)
+        headers.append(('ETag', etag))
+
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and parse_etags(if_none_match).contains_weak(etag.strip('"')):
+            start_response('304 Not Modified', headers)
+            return []
+
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        headers.append(('Content-Length', str(size)))
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(open(path, 'rb'), 64 * 1024)
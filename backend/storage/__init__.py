@@ -0,0 +1,58 @@
+"""
+Storage backends behind the app's collections.
+
+`open_storage()` returns a (client, db) pair for the backend selected by
+STORAGE_BACKEND: "mongo" (default) connects to MONGO_URI, "memory" keeps
+everything in process so the API can be load-tested and profiled without a
+MongoDB server. Both expose the same pymongo-style Collection interface.
+`storage.aio.open_async_storage()` is the asyncio counterpart for asgi.py.
+"""
+import os
+
+from .repositories import Repositories
+
+MONGO_BACKEND = 'mongo'
+MEMORY_BACKEND = 'memory'
+
+
+def storage_backend():
+    return os.getenv('STORAGE_BACKEND', MONGO_BACKEND).lower()
+
+
+def _uses_tls(mongo_uri):
+    # Atlas (mongodb+srv) connections are TLS and need certifi's CA bundle;
+    # passing tlsCAFile would force TLS onto a plain local mongod as well
+    uri = (mongo_uri or '').lower()
+    return uri.startswith('mongodb+srv://') or 'tls=true' in uri or 'ssl=true' in uri
+
+
+def open_storage(mongo_uri=None, db_name=None, backend=None, event_listeners=None):
+    """
+    Open the configured storage backend.
+
+    Args:
+        mongo_uri (str): MongoDB connection string (ignored by the memory backend)
+        db_name (str): Database name (default from MONGO_DB_NAME, then "dorae_db")
+        backend (str): "mongo" or "memory" (default from STORAGE_BACKEND)
+        event_listeners (list): pymongo CommandListeners, honored by both backends
+
+    Returns:
+        tuple: (client, db) where client supports `admin.command('ping')`
+    """
+    backend = (backend or storage_backend()).lower()
+    if backend == MEMORY_BACKEND:
+        from .memory import MemoryClient
+        client = MemoryClient(event_listeners=event_listeners)
+    elif backend == MONGO_BACKEND:
+        from pymongo import MongoClient
+        if _uses_tls(mongo_uri):
+            import certifi
+            client = MongoClient(mongo_uri, tlsCAFile=certifi.where(), event_listeners=event_listeners)
+        else:
+            client = MongoClient(mongo_uri, event_listeners=event_listeners)
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    return client, client[db_name or os.getenv('MONGO_DB_NAME', 'dorae_db')]
+
+
+__all__ = ['open_storage', 'storage_backend', 'Repositories', 'MONGO_BACKEND', 'MEMORY_BACKEND']
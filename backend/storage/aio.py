@@ -0,0 +1,135 @@
+"""
+Asyncio access to the storage backends, used by the ASGI routes in asgi.py.
+
+With MongoDB this is pymongo's AsyncMongoClient. The memory backend is
+wrapped rather than reopened: the async collections delegate to the same
+MemoryDatabase the Flask app writes to, so both serving modes see one store.
+Memory operations never block on I/O and run inline on the event loop.
+"""
+import os
+
+from . import MEMORY_BACKEND, MONGO_BACKEND, _uses_tls, storage_backend
+
+# Collection methods that return a result rather than a cursor
+_AWAITABLE_METHODS = (
+    'find_one', 'count_documents', 'estimated_document_count', 'distinct',
+    'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+    'delete_one', 'delete_many', 'find_one_and_update', 'find_one_and_delete',
+    'bulk_write', 'create_index', 'create_indexes', 'index_information', 'drop',
+)
+
+
+class AsyncMemoryCursor:
+    """Async view of a MemoryCursor: chain sort/skip/limit, then `await to_list()` or `async for`."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, key_or_list, direction=None):
+        self._cursor.sort(key_or_list, direction)
+        return self
+
+    def skip(self, count):
+        self._cursor.skip(count)
+        return self
+
+    def limit(self, count):
+        self._cursor.limit(count)
+        return self
+
+    async def to_list(self, length=None):
+        return self._cursor.to_list(length)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._cursor:
+            yield doc
+
+
+class AsyncMemoryCollection:
+    """AsyncCollection-shaped wrapper around a MemoryCollection."""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.name = collection.name
+
+    def find(self, *args, **kwargs):
+        return AsyncMemoryCursor(self._collection.find(*args, **kwargs))
+
+
+def _awaitable(name):
+    async def method(self, *args, **kwargs):
+        return getattr(self._collection, name)(*args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+for _name in _AWAITABLE_METHODS:
+    setattr(AsyncMemoryCollection, _name, _awaitable(_name))
+
+
+class AsyncMemoryDatabase:
+    def __init__(self, database):
+        self._database = database
+        self._collections = {}
+        self.name = database.name
+
+    def __getitem__(self, name):
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = AsyncMemoryCollection(self._database[name])
+        return collection
+
+    def get_collection(self, name, **kwargs):
+        return self[name]
+
+    async def command(self, command, *args, **kwargs):
+        return self._database.command(command, *args, **kwargs)
+
+
+class AsyncMemoryClient:
+    def __init__(self, database):
+        self._database = AsyncMemoryDatabase(database)
+        self.admin = AsyncMemoryDatabase(database.client.admin)
+
+    def __getitem__(self, name):
+        if name != self._database.name:
+            raise KeyError(f"Only {self._database.name!r} is shared with the synchronous app")
+        return self._database
+
+    async def close(self):
+        pass
+
+
+def open_async_storage(mongo_uri=None, db_name=None, backend=None, event_listeners=None, memory_db=None):
+    """
+    Open the configured backend for asyncio callers. Call from inside the running event loop.
+
+    Args:
+        mongo_uri (str): MongoDB connection string (ignored by the memory backend)
+        db_name (str): Database name (default from MONGO_DB_NAME, then "dorae_db")
+        backend (str): "mongo" or "memory" (default from STORAGE_BACKEND)
+        event_listeners (list): pymongo CommandListeners for the async client
+        memory_db (MemoryDatabase): The synchronous app's database, required by the memory backend
+
+    Returns:
+        tuple: (client, db); `await client.close()` on shutdown
+    """
+    backend = (backend or storage_backend()).lower()
+    if backend == MEMORY_BACKEND:
+        if memory_db is None:
+            raise ValueError("The memory backend is shared with the synchronous app; pass memory_db")
+        client = AsyncMemoryClient(memory_db)
+        return client, client[memory_db.name]
+    if backend != MONGO_BACKEND:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+    from pymongo import AsyncMongoClient
+    kwargs = {'event_listeners': event_listeners}
+    if _uses_tls(mongo_uri):
+        import certifi
+        kwargs['tlsCAFile'] = certifi.where()
+    client = AsyncMongoClient(mongo_uri, **kwargs)
+    return client, client[db_name or os.getenv('MONGO_DB_NAME', 'dorae_db')]
@@ -0,0 +1,853 @@
+"""
+In-process stand-in for the parts of pymongo the app uses.
+
+Collections keep documents in insertion-ordered dicts guarded by a lock and
+implement the query, update, sort and bulk operators that appear in app.py,
+the skills and the background writers. Documents are copied on the way in
+and out, matching the isolation callers get from a real driver (several
+handlers mutate the documents they read, e.g. serialize_doc).
+"""
+import functools
+import itertools
+import re
+import threading
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import (
+    BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+)
+
+_MISSING = object()
+
+
+def _clone(value):
+    # Faster than copy.deepcopy for the JSON-like documents stored here
+    if isinstance(value, dict):
+        return {k: _clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clone(v) for v in value]
+    return value
+
+
+# --- Query matching ---
+
+def _resolve(doc, path):
+    """Return every value reachable at a dotted path, descending into arrays."""
+    values = [doc]
+    for part in path.split('.'):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict):
+                next_values.append(value.get(part, _MISSING))
+            elif isinstance(value, list):
+                if part.isdigit():
+                    index = int(part)
+                    next_values.append(value[index] if index < len(value) else _MISSING)
+                else:
+                    for item in value:
+                        if isinstance(item, dict):
+                            next_values.append(item.get(part, _MISSING))
+            else:
+                next_values.append(_MISSING)
+        values = next_values
+    return values
+
+
+def _getter(path):
+    if '.' not in path:
+        return lambda doc: (doc.get(path, _MISSING),)
+    return lambda doc: _resolve(doc, path)
+
+
+def _equals(value, expected):
+    if isinstance(expected, re.Pattern):
+        return isinstance(value, str) and expected.search(value) is not None
+    if expected is None:
+        return value is None or value is _MISSING
+    return value is not _MISSING and value == expected
+
+
+def _compare(value, expected, op):
+    if value is _MISSING or value is None or expected is None:
+        return False
+    try:
+        if op == '$gt':
+            return value > expected
+        if op == '$gte':
+            return value >= expected
+        if op == '$lt':
+            return value < expected
+        return value <= expected
+    except TypeError:
+        return False
+
+
+def _compile_regex(pattern, options=''):
+    flags = 0
+    for option in options or '':
+        flags |= {'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL, 'x': re.VERBOSE}.get(option, 0)
+    return re.compile(pattern, flags)
+
+
+def _any_candidate(get, test):
+    # A query against an array field matches the array itself or any element
+    def predicate(doc):
+        for value in get(doc):
+            if test(value):
+                return True
+            if isinstance(value, list):
+                for item in value:
+                    if test(item):
+                        return True
+        return False
+    return predicate
+
+
+def _eq_test(expected):
+    if isinstance(expected, re.Pattern) or expected is None:
+        return lambda value: _equals(value, expected)
+    return lambda value: value is not _MISSING and value == expected
+
+
+def _in_test(expected):
+    # Hashable scalars go through a set lookup; None, patterns and documents fall back to _equals
+    scalars, others, has_none = set(), [], False
+    for item in expected:
+        if item is None:
+            has_none = True
+        elif isinstance(item, (re.Pattern, list, dict)):
+            others.append(item)
+        else:
+            scalars.add(item)
+
+    def test(value):
+        if value is _MISSING or value is None:
+            return has_none
+        if not isinstance(value, (list, dict)):
+            try:
+                if value in scalars:
+                    return True
+            except TypeError:
+                pass
+        return any(_equals(value, other) for other in others)
+    return test
+
+
+def _compile_operators(path, condition):
+    get = _getter(path)
+    predicates = []
+    for op, expected in condition.items():
+        if op == '$options':
+            continue
+        if op == '$eq':
+            predicates.append(_any_candidate(get, _eq_test(expected)))
+        elif op == '$ne':
+            matches = _any_candidate(get, _eq_test(expected))
+            predicates.append(lambda doc, matches=matches: not matches(doc))
+        elif op == '$in':
+            predicates.append(_any_candidate(get, _in_test(expected)))
+        elif op == '$nin':
+            matches = _any_candidate(get, _in_test(expected))
+            predicates.append(lambda doc, matches=matches: not matches(doc))
+        elif op == '$exists':
+            wanted = bool(expected)
+            predicates.append(lambda doc, wanted=wanted: any(v is not _MISSING for v in get(doc)) == wanted)
+        elif op == '$regex':
+            regex = expected if isinstance(expected, re.Pattern) else _compile_regex(expected, condition.get('$options'))
+            predicates.append(_any_candidate(get, _eq_test(regex)))
+        elif op in ('$gt', '$gte', '$lt', '$lte'):
+            predicates.append(_any_candidate(get, lambda value, expected=expected, op=op: _compare(value, expected, op)))
+        elif op == '$size':
+            predicates.append(lambda doc, expected=expected: any(
+                isinstance(v, list) and len(v) == expected for v in get(doc)))
+        elif op == '$all':
+            predicates.append(lambda doc, expected=expected: any(
+                isinstance(v, list) and all(e in v for e in expected) for v in get(doc)))
+        elif op == '$elemMatch':
+            element = _compile_element(expected)
+            predicates.append(lambda doc, element=element: any(
+                isinstance(v, list) and any(element(item) for item in v) for v in get(doc)))
+        elif op == '$not':
+            negated = _compile_operators(path, expected)
+            predicates.append(lambda doc, negated=negated: not negated(doc))
+        else:
+            raise OperationFailure(f"Unsupported query operator in memory storage: {op}")
+    return _all(predicates)
+
+
+def _compile_element(condition):
+    if not any(k.startswith('$') for k in condition):
+        predicate = compile_query(condition)
+        return lambda item: isinstance(item, dict) and predicate(item)
+    predicate = _compile_operators('v', condition)
+    return lambda item: predicate({'v': item})
+
+
+def _all(predicates):
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda doc: all(predicate(doc) for predicate in predicates)
+
+
+def _is_operator_dict(value):
+    return isinstance(value, dict) and value and all(k.startswith('$') for k in value)
+
+
+def compile_query(query):
+    """Compile a MongoDB-style query into a predicate taking a document."""
+    predicates = []
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            predicates.append(_all([compile_query(sub) for sub in condition]))
+        elif key == '$or':
+            branches = [compile_query(sub) for sub in condition]
+            predicates.append(lambda doc, branches=branches: any(branch(doc) for branch in branches))
+        elif key == '$nor':
+            branches = [compile_query(sub) for sub in condition]
+            predicates.append(lambda doc, branches=branches: not any(branch(doc) for branch in branches))
+        elif _is_operator_dict(condition):
+            predicates.append(_compile_operators(key, condition))
+        else:
+            predicates.append(_any_candidate(_getter(key), _eq_test(condition)))
+    if not predicates:
+        return lambda doc: True
+    return _all(predicates)
+
+
+def match(doc, query):
+    """Return True if `doc` satisfies the MongoDB-style `query`."""
+    return compile_query(query)(doc)
+
+
+# --- Updates ---
+
+def _split(path):
+    return path.split('.')
+
+
+def _positional_index(doc, array_path, query):
+    # Index of the first element of array_path matched by the query, for "$"
+    prefix = array_path + '.'
+    sub_query = {k[len(prefix):]: v for k, v in (query or {}).items() if k.startswith(prefix)}
+    direct = (query or {}).get(array_path, _MISSING)
+    array = _resolve(doc, array_path)[0]
+    if not isinstance(array, list):
+        raise OperationFailure("The positional operator did not find the match needed from the query.")
+    for index, item in enumerate(array):
+        if sub_query and isinstance(item, dict) and match(item, sub_query):
+            return index
+        if direct is not _MISSING and match({'v': item}, {'v': direct}):
+            return index
+    raise OperationFailure("The positional operator did not find the match needed from the query.")
+
+
+def _expand_positional(doc, path, query):
+    parts = _split(path)
+    if '$' not in parts:
+        return parts
+    position = parts.index('$')
+    array_path = '.'.join(parts[:position])
+    parts[position] = str(_positional_index(doc, array_path, query))
+    return parts
+
+
+def _walk(doc, parts, create):
+    target = doc
+    for part in parts[:-1]:
+        if isinstance(target, list):
+            target = target[int(part)]
+            continue
+        if part not in target or not isinstance(target[part], (dict, list)):
+            if not create:
+                return None
+            target[part] = {}
+        target = target[part]
+    return target
+
+
+def _set_path(doc, parts, value):
+    target = _walk(doc, parts, create=True)
+    if isinstance(target, list):
+        target[int(parts[-1])] = value
+    else:
+        target[parts[-1]] = value
+
+
+def _get_path(doc, parts):
+    target = _walk(doc, parts, create=False)
+    if target is None:
+        return _MISSING
+    if isinstance(target, list):
+        index = int(parts[-1])
+        return target[index] if index < len(target) else _MISSING
+    return target.get(parts[-1], _MISSING)
+
+
+def _unset_path(doc, parts):
+    target = _walk(doc, parts, create=False)
+    if isinstance(target, dict):
+        target.pop(parts[-1], None)
+    elif isinstance(target, list):
+        target[int(parts[-1])] = None
+
+
+def _each(value):
+    if isinstance(value, dict) and '$each' in value:
+        return list(value['$each'])
+    return [value]
+
+
+def _pull_matches(item, condition):
+    if isinstance(condition, dict):
+        if _is_operator_dict(condition):
+            return match({'v': item}, {'v': condition})
+        return isinstance(item, dict) and match(item, condition)
+    return item == condition
+
+
+def apply_update(doc, update, query=None, is_insert=False):
+    """Apply an update document in place. Returns True if `doc` changed."""
+    before = _clone(doc)
+    if not any(k.startswith('$') for k in update):
+        preserved_id = doc.get('_id')
+        doc.clear()
+        doc.update(_clone(update))
+        if preserved_id is not None:
+            doc['_id'] = preserved_id
+        return doc != before
+
+    for op, fields in update.items():
+        if op == '$setOnInsert' and not is_insert:
+            continue
+        for path, value in fields.items():
+            parts = _expand_positional(doc, path, query)
+            if op in ('$set', '$setOnInsert'):
+                _set_path(doc, parts, _clone(value))
+            elif op == '$unset':
+                _unset_path(doc, parts)
+            elif op == '$inc':
+                current = _get_path(doc, parts)
+                _set_path(doc, parts, (0 if current is _MISSING else current) + value)
+            elif op in ('$min', '$max'):
+                current = _get_path(doc, parts)
+                if current is _MISSING or (value < current if op == '$min' else value > current):
+                    _set_path(doc, parts, _clone(value))
+            elif op in ('$push', '$addToSet'):
+                current = _get_path(doc, parts)
+                if current is _MISSING:
+                    current = []
+                    _set_path(doc, parts, current)
+                if not isinstance(current, list):
+                    raise OperationFailure(f"Cannot apply {op} to non-array field {path}")
+                for item in _each(value):
+                    if op == '$push' or item not in current:
+                        current.append(_clone(item))
+            elif op == '$pull':
+                current = _get_path(doc, parts)
+                if isinstance(current, list):
+                    current[:] = [item for item in current if not _pull_matches(item, value)]
+            elif op == '$currentDate':
+                _set_path(doc, parts, datetime.utcnow())
+            else:
+                raise OperationFailure(f"Unsupported update operator in memory storage: {op}")
+    return doc != before
+
+
+def _upsert_seed(query):
+    seed = {}
+    for key, value in (query or {}).items():
+        if key.startswith('$') or _is_operator_dict(value):
+            continue
+        _set_path(seed, _split(key), _clone(value))
+    return seed
+
+
+# --- Command monitoring ---
+
+class CommandEvent:
+    """The subset of pymongo's command monitoring events that listeners in this app read."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, command_name, database_name, duration_micros=0, failure=None, request_id=None):
+        self.command_name = command_name
+        self.database_name = database_name
+        self.duration_micros = duration_micros
+        self.failure = failure
+        self.request_id = request_id if request_id is not None else next(self._ids)
+
+
+def _command(name):
+    """Report a collection method to the client's event_listeners as the equivalent server command."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            listeners = self.database.client.event_listeners
+            if not listeners:
+                return method(self, *args, **kwargs)
+            return _monitored(listeners, name, self.database.name, lambda: method(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def _monitored(listeners, name, database_name, func):
+    started_event = CommandEvent(name, database_name)
+    for listener in listeners:
+        listener.started(started_event)
+    started = time.perf_counter()
+    try:
+        result = func()
+    except Exception as e:
+        event = CommandEvent(name, database_name, int((time.perf_counter() - started) * 1e6),
+                             failure={'errmsg': str(e)}, request_id=started_event.request_id)
+        for listener in listeners:
+            listener.failed(event)
+        raise
+    event = CommandEvent(name, database_name, int((time.perf_counter() - started) * 1e6),
+                         request_id=started_event.request_id)
+    for listener in listeners:
+        listener.succeeded(event)
+    return result
+
+
+# --- Sorting and projection ---
+
+def _sort_key(value):
+    # MongoDB's cross-type ordering, roughly: null < numbers < strings < objects < ...
+    if value is _MISSING or value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (5, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, dict):
+        return (3, str(value))
+    if isinstance(value, list):
+        return (4, str(value))
+    if isinstance(value, ObjectId):
+        return (6, str(value))
+    if isinstance(value, datetime):
+        return (7, value)
+    return (8, str(value))
+
+
+def _normalize_sort(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return list(key_or_list)
+
+
+def sort_documents(docs, sort_spec):
+    docs = list(docs)
+    # Stable sorts applied from the least to the most significant key
+    for key, direction in reversed(sort_spec):
+        docs.sort(key=lambda d: _sort_key(_resolve(d, key)[0]), reverse=direction == -1)
+    return docs
+
+
+def project(doc, projection):
+    if not projection:
+        return _clone(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include_id = projection.get('_id', 1)
+    fields = {k: v for k, v in projection.items() if k != '_id'}
+    if fields and any(fields.values()):
+        result = {}
+        for field in fields:
+            top = field.split('.')[0]
+            if top in doc:
+                result[top] = _clone(doc[top])
+    else:
+        result = {k: _clone(v) for k, v in doc.items() if k not in fields}
+    if include_id and '_id' in doc:
+        result['_id'] = doc['_id']
+    elif not include_id:
+        result.pop('_id', None)
+    return result
+
+
+class MemoryCursor:
+    """Lazily evaluated cursor supporting sort/skip/limit chaining."""
+
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+        self._results = None
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def _evaluate(self):
+        if self._results is None:
+            listeners = self._collection.database.client.event_listeners
+            if listeners:
+                _monitored(listeners, 'find', self._collection.database.name, self._run)
+            else:
+                self._run()
+        return self._results
+
+    def _run(self):
+        docs = self._collection._matching(self._query)
+        if self._sort:
+            docs = sort_documents(docs, self._sort)
+        if self._skip:
+            docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        self._results = [project(doc, self._projection) for doc in docs]
+
+    def __iter__(self):
+        return iter(self._evaluate())
+
+    def __next__(self):
+        return next(iter(self._evaluate()))
+
+    def to_list(self, length=None):
+        results = self._evaluate()
+        return list(results if length is None else results[:length])
+
+
+class MemoryCollection:
+    """Thread-safe in-memory collection with the pymongo Collection methods the app uses."""
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self._docs = {}
+        self._lock = threading.RLock()
+        self._indexes = {'_id_': {'key': [('_id', 1)]}}
+        self._unique_keys = []
+
+    def with_options(self, **kwargs):
+        return self
+
+    # Reads
+
+    def _candidates_by_id(self, query):
+        # Most writes address a single document by _id: skip the scan
+        doc_id = (query or {}).get('_id', _MISSING)
+        if doc_id is _MISSING or isinstance(doc_id, re.Pattern):
+            return None
+        if isinstance(doc_id, dict):
+            if set(doc_id) != {'$in'}:
+                return None
+            ids = doc_id['$in']
+        else:
+            ids = [doc_id]
+        try:
+            return [self._docs[i] for i in ids if i in self._docs]
+        except TypeError:
+            return None
+
+    def _matching(self, query):
+        predicate = compile_query(query)
+        with self._lock:
+            docs = self._candidates_by_id(query)
+            if docs is None:
+                docs = list(self._docs.values())
+        return [doc for doc in docs if predicate(doc)]
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0):
+        cursor = MemoryCursor(self, filter or {}, projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    def find_one(self, filter=None, projection=None, sort=None):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {'_id': filter}
+        for doc in self.find(filter, projection, sort=sort).limit(1):
+            return doc
+        return None
+
+    @_command('aggregate')
+    def count_documents(self, filter, **kwargs):
+        return len(self._matching(filter))
+
+    def estimated_document_count(self):
+        with self._lock:
+            return len(self._docs)
+
+    @_command('distinct')
+    def distinct(self, key, filter=None):
+        values = []
+        for doc in self._matching(filter or {}):
+            for value in _resolve(doc, key):
+                for item in (value if isinstance(value, list) else [value]):
+                    if item is not _MISSING and item not in values:
+                        values.append(item)
+        return values
+
+    # Writes
+
+    def _check_unique(self, doc, ignore_id=None):
+        for fields in self._unique_keys:
+            key = tuple(_resolve(doc, f)[0] for f in fields)
+            for other in self._docs.values():
+                if other['_id'] != ignore_id and tuple(_resolve(other, f)[0] for f in fields) == key:
+                    raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name}")
+
+    def _insert(self, doc):
+        doc = _clone(doc)
+        doc.setdefault('_id', ObjectId())
+        if doc['_id'] in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_")
+        self._check_unique(doc)
+        self._docs[doc['_id']] = doc
+        return doc['_id']
+
+    @_command('insert')
+    def insert_one(self, document, **kwargs):
+        with self._lock:
+            document.setdefault('_id', ObjectId())
+            inserted_id = self._insert(document)
+        self.database._notify(self.name, 'insert', inserted_id)
+        return InsertOneResult(inserted_id, True)
+
+    @_command('insert')
+    def insert_many(self, documents, ordered=True, **kwargs):
+        ids = []
+        with self._lock:
+            for document in documents:
+                document.setdefault('_id', ObjectId())
+                ids.append(self._insert(document))
+        for inserted_id in ids:
+            self.database._notify(self.name, 'insert', inserted_id)
+        return InsertManyResult(ids, True)
+
+    def _update(self, filter, update, upsert=False, multi=False):
+        matched = modified = 0
+        upserted_id = None
+        changed_ids = []
+        with self._lock:
+            for doc in self._matching(filter):
+                matched += 1
+                if apply_update(doc, update, filter):
+                    self._check_unique(doc, ignore_id=doc['_id'])
+                    modified += 1
+                    changed_ids.append(doc['_id'])
+                if not multi:
+                    break
+            if matched == 0 and upsert:
+                seed = _upsert_seed(filter)
+                apply_update(seed, update, filter, is_insert=True)
+                upserted_id = self._insert(seed)
+                changed_ids.append(upserted_id)
+        for doc_id in changed_ids:
+            self.database._notify(self.name, 'update', doc_id)
+        return matched, modified, upserted_id
+
+    @_command('update')
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        return self._update_result(*self._update(filter, update, upsert))
+
+    @_command('update')
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        return self._update_result(*self._update(filter, update, upsert, multi=True))
+
+    def _update_result(self, matched, modified, upserted_id):
+        raw = {'n': matched or (1 if upserted_id is not None else 0), 'nModified': modified}
+        if upserted_id is not None:
+            raw['upserted'] = upserted_id
+        return UpdateResult(raw, True)
+
+    @_command('update')
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        return self._update_result(*self._update(filter, replacement, upsert))
+
+    def _delete(self, filter, multi):
+        deleted = []
+        with self._lock:
+            for doc in self._matching(filter):
+                del self._docs[doc['_id']]
+                deleted.append(doc['_id'])
+                if not multi:
+                    break
+        for doc_id in deleted:
+            self.database._notify(self.name, 'delete', doc_id)
+        return deleted
+
+    @_command('delete')
+    def delete_one(self, filter, **kwargs):
+        return DeleteResult({'n': len(self._delete(filter, multi=False))}, True)
+
+    @_command('delete')
+    def delete_many(self, filter, **kwargs):
+        return DeleteResult({'n': len(self._delete(filter, multi=True))}, True)
+
+    @_command('findAndModify')
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE, **kwargs):
+        with self._lock:
+            docs = self._matching(filter)
+            if sort:
+                docs = sort_documents(docs, _normalize_sort(sort))
+            if not docs:
+                if not upsert:
+                    return None
+                _, _, upserted_id = self._update(filter, update, upsert=True)
+                if return_document == ReturnDocument.AFTER:
+                    return project(self._docs[upserted_id], projection)
+                return None
+            doc = docs[0]
+            before = project(doc, projection)
+            changed = apply_update(doc, update, filter)
+            after = project(doc, projection)
+        if changed:
+            self.database._notify(self.name, 'update', doc['_id'])
+        return after if return_document == ReturnDocument.AFTER else before
+
+    @_command('findAndModify')
+    def find_one_and_delete(self, filter, projection=None, sort=None, **kwargs):
+        with self._lock:
+            docs = self._matching(filter)
+            if sort:
+                docs = sort_documents(docs, _normalize_sort(sort))
+            if not docs:
+                return None
+            doc = docs[0]
+            del self._docs[doc['_id']]
+        self.database._notify(self.name, 'delete', doc['_id'])
+        return project(doc, projection)
+
+    @_command('bulkWrite')
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        result = {'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []}
+        for index, op in enumerate(requests):
+            if isinstance(op, InsertOne):
+                with self._lock:
+                    op._doc.setdefault('_id', ObjectId())
+                    inserted_id = self._insert(op._doc)
+                self.database._notify(self.name, 'insert', inserted_id)
+                result['nInserted'] += 1
+            elif isinstance(op, (UpdateOne, UpdateMany, ReplaceOne)):
+                matched, modified, upserted_id = self._update(
+                    op._filter, op._doc, op._upsert, multi=isinstance(op, UpdateMany)
+                )
+                result['nMatched'] += matched
+                result['nModified'] += modified
+                if upserted_id is not None:
+                    result['nUpserted'] += 1
+                    result['upserted'].append({'index': index, '_id': upserted_id})
+            elif isinstance(op, (DeleteOne, DeleteMany)):
+                result['nRemoved'] += len(self._delete(op._filter, multi=isinstance(op, DeleteMany)))
+            else:
+                raise OperationFailure(f"Unsupported bulk operation in memory storage: {type(op).__name__}")
+        return BulkWriteResult(result, True)
+
+    # Indexes
+
+    @_command('createIndexes')
+    def create_index(self, keys, unique=False, name=None, **kwargs):
+        keys = _normalize_sort(keys, 1)
+        name = name or '_'.join(f"{field}_{direction}" for field, direction in keys)
+        self._indexes[name] = dict(kwargs, key=keys, unique=unique)
+        if unique:
+            self._unique_keys.append([field for field, _ in keys])
+        return name
+
+    def create_indexes(self, indexes):
+        return [self.create_index(index.document['key'].items(), **{
+            k: v for k, v in index.document.items() if k != 'key'
+        }) for index in indexes]
+
+    def index_information(self):
+        return {name: dict(info) for name, info in self._indexes.items()}
+
+    def drop(self):
+        with self._lock:
+            self._docs.clear()
+
+    def watch(self, *args, **kwargs):
+        return self.database.watch(*args, **kwargs)
+
+
+class MemoryDatabase:
+    """Dict of MemoryCollections created on first access, like a pymongo Database."""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._collections = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def __getitem__(self, name):
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = MemoryCollection(self, name)
+                self._collections[name] = collection
+            return collection
+
+    def get_collection(self, name, **kwargs):
+        return self[name]
+
+    def list_collection_names(self):
+        with self._lock:
+            return list(self._collections)
+
+    def command(self, command, *args, **kwargs):
+        if command == 'ping':
+            return {'ok': 1.0}
+        raise OperationFailure(f"Unsupported command in memory storage: {command}")
+
+    def add_listener(self, listener):
+        """Register a callable taking (collection_name, operation, document_id) run after writes."""
+        self._listeners.append(listener)
+
+    def _notify(self, collection_name, operation, document_id):
+        for listener in self._listeners:
+            listener(collection_name, operation, document_id)
+
+    def watch(self, *args, **kwargs):
+        # Same failure a standalone mongod reports, so callers take their fallback path
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+
+class MemoryClient:
+    """Stand-in for MongoClient holding any number of in-memory databases."""
+
+    def __init__(self, event_listeners=None):
+        # Same contract as MongoClient(event_listeners=...) for CommandListeners
+        self.event_listeners = list(event_listeners or [])
+        self._databases = {}
+        self._lock = threading.Lock()
+        self.admin = MemoryDatabase(self, 'admin')
+
+    def __getitem__(self, name):
+        with self._lock:
+            database = self._databases.get(name)
+            if database is None:
+                database = MemoryDatabase(self, name)
+                self._databases[name] = database
+            return database
+
+    def get_database(self, name, **kwargs):
+        return self[name]
+
+    def close(self):
+        pass
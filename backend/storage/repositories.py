@@ -0,0 +1,34 @@
+class Repositories:
+    """
+    Named access to every collection the app reads or writes.
+
+    Route handlers, skills and background writers get their collections from
+    here instead of indexing the database by name, so the backend behind them
+    (MongoDB or the in-memory store) is chosen in one place. Indexing by name
+    (`repos['tasks']`) is kept so components written against a pymongo
+    Database, like the skills, accept a Repositories unchanged.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.tasks = db['tasks']
+        self.labels = db['labels']
+        self.folders = db['folders']
+        self.agents = db['agents']
+        self.timers = db['timers']
+        self.users = db['users']
+        self.login_logs = db['login_logs']
+        self.traffic_logs = db['traffic_logs']
+        self.traffic_rollups = db['traffic_rollups']
+        self.mindsets = db['mindsets']
+        self.label_classifiers = db['label_classifiers']
+
+    def __getitem__(self, name):
+        # Collections don't support truth testing, so no `getattr(...) or ...`
+        collection = self.__dict__.get(name)
+        if collection is None or name == 'db':
+            return self.db[name]
+        return collection
+
+    def watch(self, *args, **kwargs):
+        return self.db.watch(*args, **kwargs)
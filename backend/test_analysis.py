@@ -0,0 +1,78 @@
+"""
+Unit tests for the analysis write plans and the analyzer pipeline (memory backend, no model).
+
+    cd backend && python -m pytest -q test_analysis.py
+"""
+from bson import ObjectId
+
+import analysis
+from analyzers import AnalysisPipeline, DuplicationAnalyzer, ImportanceAnalyzer
+from storage import Repositories, open_storage
+from versions import VersionStore
+
+
+class StubAI:
+    """Answers the importance and duplicate passes with every task."""
+
+    def analyze_importance(self, tasks):
+        return {'critical_task_ids': [str(t['_id']) for t in tasks], 'notable_task_ids': []}
+
+    def analyze_duplicates(self, tasks):
+        return [str(t['_id']) for t in tasks]
+
+
+def make_repos():
+    _, db = open_storage(backend='memory', db_name='test_analysis')
+    return Repositories(db)
+
+
+def add_task(repos, labels, **fields):
+    doc = dict({'title': 'task', 'status': 'Active', 'labels': labels, 'user_email': 'a@x'}, **fields)
+    return repos.tasks.insert_one(doc).inserted_id
+
+
+def test_change_skips_tasks_already_in_the_wanted_state():
+    task = {'_id': ObjectId(), 'labels': ['Important', 'mine'], 'priority': 'high', 'user_email': 'a@x'}
+    plan = analysis.AnalysisPlan({})
+    plan.change(task, add=['Important'], remove=['Notable'], fields={'priority': 'high'})
+    assert plan.operations == []
+    assert plan.owners == []
+
+
+def test_change_writes_only_the_labels_that_differ():
+    task = {'_id': ObjectId(), 'labels': ['Notable', 'mine'], 'priority': 'medium', 'user_email': 'a@x'}
+    plan = analysis.AnalysisPlan({})
+    plan.change(task, add=['Important'], remove=['Notable', 'Duplicate'], fields={'priority': 'high'})
+    updates = [op._doc for op in plan.operations]
+    assert updates == [{'$pull': {'labels': {'$in': ['Notable']}}},
+                       {'$addToSet': {'labels': {'$each': ['Important']}}, '$set': {'priority': 'high'}}]
+    assert plan.owners == ['a@x']
+
+
+def test_change_keeps_labels_edited_after_the_load():
+    repos = make_repos()
+    task_id = add_task(repos, ['mine'])
+    loaded = repos.tasks.find_one({'_id': task_id})
+    repos.tasks.update_one({'_id': task_id}, {'$addToSet': {'labels': 'edited'}})
+
+    plan = analysis.AnalysisPlan({})
+    plan.change(loaded, add=['Trash'])
+    repos.tasks.bulk_write(plan.operations)
+    assert repos.tasks.find_one({'_id': task_id})['labels'] == ['mine', 'edited', 'Trash']
+
+
+def test_passes_of_one_run_all_land_on_the_same_task():
+    repos = make_repos()
+    ids = [add_task(repos, ['mine']) for _ in range(3)]
+    pipeline = AnalysisPipeline(repos, VersionStore(), StubAI(), [ImportanceAnalyzer(), DuplicationAnalyzer()])
+
+    results = pipeline.run(['importance', 'duplication'])
+    assert results['importance']['updated_count'] == 3
+    assert results['duplication']['updated_count'] == 3
+    for task_id in ids:
+        assert sorted(repos.tasks.find_one({'_id': task_id})['labels']) == ['Duplicate', 'Important', 'mine']
+
+    # Nothing changed, so a second run writes nothing
+    results = pipeline.run(['importance', 'duplication'])
+    assert results['importance']['updated_count'] == 0
+    assert results['duplication']['updated_count'] == 0
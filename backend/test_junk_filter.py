@@ -0,0 +1,61 @@
+"""
+Unit tests for the local trash scorer.
+
+    cd backend && python -m pytest -q test_junk_filter.py
+"""
+from bson import ObjectId
+
+import junk_filter
+from junk_filter import junk_score
+
+
+def task(title):
+    return {'_id': ObjectId(), 'title': title}
+
+
+def test_placeholders_and_empty_titles_are_junk():
+    for title in ('asdf', 'Test', 'untitled', 'lorem ipsum', 'xx', '', '  ', '!!!', None):
+        assert junk_score(title) == 1.0, title
+
+
+def test_keyboard_walks_and_repeats_are_junk():
+    for title in ('qwerasdf', 'sdfghj', 'zxcvbn', 'aaaaaa', 'lol lol lol'):
+        assert junk_score(title) >= 0.8, title
+
+
+def test_acronyms_are_left_to_the_model():
+    for title in ('HTML', 'SQL', 'CSS', 'GPT'):
+        assert 0.25 < junk_score(title) < 0.8, title
+
+
+def test_short_titles_are_left_to_the_model():
+    for title in ('Go', 'PR', 'UI', 'CV', 'ok', 'a'):
+        assert 0.25 < junk_score(title) < 0.8, title
+
+
+def test_real_titles_are_clean():
+    for title in ('Pay rent', 'Email the doctor', 'Review HTML report', 'Buy milk tomorrow'):
+        assert junk_score(title) <= 0.25, title
+
+
+def test_recurring_words_count_as_known():
+    assert junk_score('Kubernetes') == 0.35
+    assert junk_score('Kubernetes', known={'kubernetes'}) == 0.0
+
+
+def test_screen_splits_tasks_into_three_bands():
+    tasks = [task('asdf'), task('Pay rent'), task('PR'), task('qwerty'), task('HTML')]
+    result = junk_filter.screen(tasks, junk_threshold=0.8, clean_threshold=0.25)
+    assert [t['title'] for t in result.junk] == ['asdf', 'qwerty']
+    assert [t['title'] for t in result.clean] == ['Pay rent']
+    assert [t['title'] for t in result.uncertain] == ['PR', 'HTML']
+    assert result.junk_ids == [tasks[0]['_id'], tasks[3]['_id']]
+    assert result.report() == {'local_trash': 2, 'local_clean': 1, 'sent_to_model': 2}
+
+
+def test_screen_sends_everything_to_the_model_when_disabled(monkeypatch):
+    monkeypatch.setenv('TRASH_PREFILTER', '0')
+    tasks = [task('asdf'), task('Pay rent')]
+    result = junk_filter.screen(tasks)
+    assert result.junk == [] and result.clean == []
+    assert result.uncertain == tasks
@@ -0,0 +1,107 @@
+"""
+Unit tests for the per-user label classifier (memory backend, no model).
+
+    cd backend && python -m pytest -q test_label_classifier.py
+"""
+import pytest
+from bson import ObjectId
+
+from label_classifier import NO_LABEL, LabelClassifier, NaiveBayes, features
+from storage import Repositories, open_storage
+from versions import VersionStore
+
+TRAINING = [
+    ('Pay electricity bill', ['Finance']), ('Pay rent', ['Finance']), ('Pay credit card bill', ['Finance']),
+    ('Gym leg day', ['Health']), ('Book doctor appointment', ['Health']), ('Gym cardio', ['Health']),
+]
+
+
+def task(title, labels=(), status='Active', user_email='a@x'):
+    return {'_id': ObjectId(), 'title': title, 'labels': list(labels), 'status': status, 'user_email': user_email}
+
+
+def make_classifier(tasks=()):
+    _, db = open_storage(backend='memory', db_name='test_label_classifier')
+    repos = Repositories(db)
+    for t in tasks:
+        repos.tasks.insert_one(t)
+    return LabelClassifier(repos, VersionStore())
+
+
+def fitted_model():
+    return NaiveBayes.fit([task(title, labels) for title, labels in TRAINING])
+
+
+def test_predict_picks_the_label_whose_words_match():
+    label, posterior = fitted_model().predict(features('Pay phone bill'), ['Finance', 'Health'])
+    assert label == 'Finance'
+    assert 0.9 < posterior <= 1.0
+
+
+def test_predict_needs_a_known_feature_and_two_classes():
+    model = fitted_model()
+    assert model.predict(features('Water the plants'), ['Finance', 'Health']) is None
+    assert model.predict(features('Pay rent'), ['Finance']) is None
+
+
+def test_fit_ignores_system_labels_and_learns_no_label_from_closed_tasks():
+    model = NaiveBayes.fit([task('Pay rent', ['Finance', 'Important']), task('Old chore', status='completed'),
+                            task('Open chore')])
+    assert model.documents == {'Finance': 1, NO_LABEL: 1}
+
+
+def test_precision_decays_towards_recent_audits(monkeypatch):
+    monkeypatch.setenv('LABEL_PRECISION_WINDOW', '10')
+    monkeypatch.setenv('LABEL_MIN_AUDITS', '5')
+    monkeypatch.setenv('LABEL_MIN_PRECISION', '0.8')
+    classifier = make_classifier()
+    assert classifier.precision('a@x') is None
+    assert not classifier.trusted('a@x')
+
+    for _ in range(4):
+        classifier._observe('a@x', True)
+    assert classifier.precision('a@x') == pytest.approx(1.0)
+    assert not classifier.trusted('a@x')  # decayed audits: 1 + 0.9 + 0.81 + 0.729 < 5
+
+    for _ in range(6):
+        classifier._observe('a@x', True)
+    assert classifier.trusted('a@x')
+
+    # Disagreement costs trust right away, and old agreements fade
+    classifier._observe('a@x', False)
+    classifier._observe('a@x', False)
+    assert classifier.precision('a@x') < 0.8
+    assert not classifier.trusted('a@x')
+    assert not classifier.trusted('b@x')
+
+
+def test_record_scores_audits_and_stores_the_precision():
+    classifier = make_classifier()
+    pending = task('Pay water bill')
+    screen = classifier._screen([pending], ['Finance', 'Health'])  # no model yet: everything deferred
+    screen.audits[str(pending['_id'])] = ('a@x', 'Finance')
+    classifier.record(screen, {str(pending['_id']): ['Finance']})
+    assert classifier.precision('a@x') == 1.0
+    stored = classifier.repos.label_classifiers.find_one({'_id': 'a@x'})
+    assert stored['audited'] == 1.0 and stored['agreed'] == 1.0
+
+
+def test_screen_assigns_trusted_predictions_and_sends_labelled_tasks_to_the_model(monkeypatch):
+    monkeypatch.setenv('LABEL_AUDIT_RATE', '0')
+    classifier = make_classifier([task(title, labels) for title, labels in TRAINING])
+    classifier._trust['a@x'] = {'audited': 100.0, 'agreed': 100.0}
+    unlabelled, labelled, unknown = task('Pay phone bill'), task('Pay gas bill', ['Finance']), task('Water plants')
+
+    screen = classifier.screen([unlabelled, labelled, unknown], ['Finance', 'Health', 'Important'])
+    assert screen.assigned == {str(unlabelled['_id']): ['Finance']}
+    assert screen.deferred == [labelled, unknown]
+    assert screen.report() == {'local_labeled': 1, 'already_labeled': 1, 'sent_to_model': 2, 'audited': 0}
+
+
+def test_untrusted_predictions_go_to_the_model_as_audits():
+    classifier = make_classifier([task(title, labels) for title, labels in TRAINING])
+    pending = task('Pay phone bill')
+    screen = classifier.screen([pending], ['Finance', 'Health'])
+    assert screen.assigned == {}
+    assert screen.deferred == [pending]
+    assert screen.audits == {str(pending['_id']): ('a@x', 'Finance')}
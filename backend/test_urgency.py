@@ -0,0 +1,75 @@
+"""
+Unit tests for the local urgency ranking used by priority analysis.
+
+    cd backend && python -m pytest -q test_urgency.py
+"""
+import time
+
+import pytest
+from bson import ObjectId
+
+import urgency
+from urgency import term_weight
+
+NOW = time.time()
+
+
+def task(title, **fields):
+    return dict({'_id': ObjectId(), 'title': title}, **fields)
+
+
+def _iso(epoch):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(epoch))
+
+
+def test_term_weight_matches_terms_and_close_typos():
+    assert term_weight('urgent') == 1.0
+    assert term_weight('urgnet') == pytest.approx(0.8)        # one transposition
+    assert term_weight('immeditately') == pytest.approx(0.8)  # one missing letter
+    assert term_weight('blokcer') == pytest.approx(0.72)
+
+
+def test_term_weight_rejects_other_words():
+    assert term_weight('argent') == 0.0   # first letter differs
+    assert term_weight('nowt') == 0.0     # short terms allow no edits
+    assert term_weight('groceries') == 0.0
+    assert term_weight('') == 0.0
+
+
+def test_weak_terms_alone_are_below_the_fast_threshold(monkeypatch):
+    monkeypatch.delenv('PRIORITY_FAST_THRESHOLD', raising=False)
+    tasks = [task('Fix it today'), task('Printer broken'), task('Call now'), task('Urgnet: renew passport'),
+             task('Release deadline')]
+    result = urgency.screen(tasks, mode=urgency.FAST, now=NOW)
+    assert [t['title'] for t in result.urgent] == ['Urgnet: renew passport', 'Release deadline']
+
+
+def test_fast_mode_sends_nothing_to_the_model():
+    tasks = [task('ASAP: pay invoice'), task('Water plants')]
+    result = urgency.screen(tasks, mode=urgency.FAST, now=NOW)
+    assert result.candidates == []
+    assert result.urgent_ids == [tasks[0]['_id']]
+    assert result.report() == {'mode': 'fast', 'ranked': 2, 'sent_to_model': 0, 'keyword_matches': 1}
+
+
+def test_model_mode_sends_every_task():
+    tasks = [task('Water plants'), task('Urgent: server outage'), task('Read book')]
+    result = urgency.screen(tasks, mode=urgency.MODEL, candidates=1, now=NOW)
+    assert result.candidates == tasks
+    assert result.ranked[0] is tasks[1]
+
+
+def test_hybrid_mode_sends_the_best_ranked_candidates():
+    day = 86400
+    tasks = [task('Water plants', created_at=_iso(NOW - 60 * day)),
+             task('Hotfix login outage', created_at=_iso(NOW - 60 * day)),
+             task('Read book', created_at=_iso(NOW)),
+             task('Clean desk', created_at=_iso(NOW - 60 * day), priority='high')]
+    result = urgency.screen(tasks, mode=urgency.HYBRID, candidates=2, now=NOW)
+    assert [t['title'] for t in result.candidates] == ['Hotfix login outage', 'Read book']
+    assert len(result.ranked) == 4
+
+
+def test_empty_task_list():
+    result = urgency.screen([], mode=urgency.HYBRID, now=NOW)
+    assert result.ranked == [] and result.candidates == [] and result.urgent == []
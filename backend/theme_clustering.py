@@ -0,0 +1,337 @@
+"""
+Groups tasks into the 3-5 themes of the mindset map without a model call.
+
+    themes = find_themes(tasks)
+    mindset_map(themes)  # same shape as AIService.generate_mindset_map
+
+1. Each task becomes a bag of words from its title and its user labels.
+   Labels count double. The analyses' system labels (Important, Trash, ...)
+   say nothing about the theme and are left out.
+2. The bags are weighted with TF-IDF (sublinear term frequency) and
+   L2-normalised. The sparse matrix is kept as (row, column, value)
+   arrays and never densified.
+3. Spherical k-means (k-means++ seeding, then cosine assignment) runs for
+   each k from MIN_THEMES to MAX_THEMES. Similarities to the centers and
+   the center updates are bincounts over the nonzeros. The k with the best
+   silhouette on a sample of at most SILHOUETTE_SAMPLE tasks wins.
+4. Each theme's keywords are the terms weighing most in it compared with
+   the other themes (class-based TF-IDF). They name the theme unless
+   `mindset_map` is given names, e.g. from AIService.name_mindset_themes.
+
+Every step is a handful of NumPy array operations over all tasks, so tens
+of thousands of tasks take milliseconds, with tokenization the largest
+part. Results are deterministic for a given task list.
+"""
+import re
+
+import numpy as np
+
+MIN_THEMES, MAX_THEMES = 3, 5
+KEYWORDS_PER_THEME = 3
+LABEL_WEIGHT = 2.0
+SILHOUETTE_SAMPLE = 1000
+KMEANS_ITERATIONS = 25
+SEED = 7
+
+# Words starting with a letter; digits, IDs and punctuation are dropped
+_WORD = re.compile(r"[^\W\d_][\w'-]*")
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both
+but by can could did do does doing done down during each few for from further get got had has have having he
+her here hers him his how i if in into is it its itself just let me more most my myself need needs new no nor
+not now of off on once only or other our ours out over own same she should so some still such than that the
+their theirs them then there these they this those through to too under until up us very want was we were what
+when where which while who whom why will with would you your yours
+task tasks todo to-do item items thing things stuff untitled misc etc
+""".split())
+
+# Labels the analysis passes manage (analysis.py); they cut across themes
+SYSTEM_LABELS = frozenset({'important', 'notable', 'duplicate', 'priority', 'trash'})
+
+EMPTY_MAP = {"name": "Empty Mind", "children": []}
+
+
+def _is_keyword(word):
+    return len(word) > 2 and word not in STOPWORDS
+
+
+def tokenize(text):
+    return [word for word in _WORD.findall((text or '').lower()) if _is_keyword(word)]
+
+
+class TermMatrix:
+    """
+    L2-normalised TF-IDF rows in coordinate form, sorted by row.
+
+    Args:
+        rows, cols (ndarray): Task index and term index of every nonzero
+        values (ndarray): Weight of every nonzero
+        terms (list): Term of every column
+        n (int): Number of tasks, including ones without terms
+    """
+
+    def __init__(self, rows, cols, values, terms, n):
+        self.rows, self.cols, self.values = rows, cols, values
+        self.terms = terms
+        self.n = n
+
+
+def tfidf(tasks):
+    """
+    TF-IDF of every task's title words, plus its user labels' words at LABEL_WEIGHT.
+
+    The Python loop only splits text; counting, the vocabulary and the
+    stopword filter are array operations over all words at once.
+    """
+    words, rows, weights = [], [], []
+    for i, task in enumerate(tasks):
+        title = _WORD.findall((task.get('title') or '').lower())
+        words += title
+        rows += [i] * len(title)
+        for label in task.get('labels') or []:
+            if isinstance(label, str) and label.lower() not in SYSTEM_LABELS:
+                label_words = _WORD.findall(label.lower())
+                words += label_words
+                rows += [i] * len(label_words)
+                weights += [(len(words) - len(label_words), len(words))]
+
+    n = len(tasks)
+    weight = np.ones(len(words))
+    for start, end in weights:
+        weight[start:end] = LABEL_WEIGHT
+    terms, term_of_word = np.unique(np.asarray(words, dtype=str), return_inverse=True)
+    keep = np.fromiter((_is_keyword(term) for term in terms), dtype=bool, count=len(terms))
+    # Renumber the kept terms 0..V-1 and drop the other words
+    column = np.cumsum(keep) - 1
+    kept = keep[term_of_word.reshape(-1)] if len(words) else np.zeros(0, dtype=bool)
+    vocabulary = int(keep.sum())
+    cell = np.asarray(rows, dtype=np.int64)[kept] * vocabulary + column[term_of_word.reshape(-1)[kept]]
+
+    # One nonzero per (task, term), summing repeated words; sorted by task
+    cells, counts = np.unique(cell, return_inverse=True)
+    frequency = np.bincount(counts.reshape(-1), weights=weight[kept], minlength=len(cells))
+    rows, cols = np.divmod(cells, max(vocabulary, 1))
+    values = 1.0 + np.log(frequency)
+    document_frequency = np.bincount(cols, minlength=vocabulary)
+    values *= np.log((1.0 + n) / (1.0 + document_frequency))[cols] + 1.0
+    norms = np.sqrt(np.bincount(rows, weights=values * values, minlength=n))
+    if len(values):
+        values /= norms[rows]
+    return TermMatrix(rows, cols, values, terms[keep].tolist(), n)
+
+
+def _rows(matrix, selected):
+    """The sub-matrix of the `selected` rows (sorted indices), renumbered 0..len(selected)-1."""
+    mask = np.isin(matrix.rows, selected)
+    return TermMatrix(np.searchsorted(selected, matrix.rows[mask]), matrix.cols[mask], matrix.values[mask],
+                      matrix.terms, len(selected))
+
+
+def _similarities(matrix, centers):
+    """Cosine similarity of every row to every (unit) center, one bincount per center."""
+    similarities = np.empty((matrix.n, len(centers)))
+    for c, center in enumerate(centers):
+        similarities[:, c] = np.bincount(matrix.rows, weights=matrix.values * center[matrix.cols],
+                                         minlength=matrix.n)
+    return similarities
+
+
+def _cluster_weights(matrix, assignment, k):
+    """Summed TF-IDF weight of every term in every cluster, a k x vocabulary array."""
+    vocabulary = len(matrix.terms)
+    cell = assignment[matrix.rows] * vocabulary + matrix.cols
+    return np.bincount(cell, weights=matrix.values, minlength=k * vocabulary).reshape(k, vocabulary)
+
+
+def _dense(matrix, row):
+    vector = np.zeros(len(matrix.terms))
+    start, end = np.searchsorted(matrix.rows, [row, row + 1])
+    vector[matrix.cols[start:end]] = matrix.values[start:end]
+    return vector
+
+
+def kmeans(matrix, k, rng, iterations=KMEANS_ITERATIONS):
+    """
+    Spherical k-means on the unit rows of a TermMatrix whose rows all have terms.
+
+    Returns:
+        ndarray: Cluster of every row, 0..k-1, every cluster non-empty
+    """
+    n = matrix.n
+    centers = np.empty((k, len(matrix.terms)))
+    centers[0] = _dense(matrix, rng.integers(n))
+    distance = 1.0 - _similarities(matrix, centers[:1])[:, 0]
+    for c in range(1, k):
+        weights = np.clip(distance, 0.0, None)
+        total = weights.sum()
+        centers[c] = _dense(matrix, rng.choice(n, p=weights / total) if total > 0 else rng.integers(n))
+        distance = np.minimum(distance, 1.0 - _similarities(matrix, centers[c:c + 1])[:, 0])
+
+    assignment = None
+    for _ in range(iterations):
+        similarity = _similarities(matrix, centers)
+        updated = similarity.argmax(axis=1)
+        # Clusters left empty take the rows furthest from their own centers
+        empty = np.setdiff1d(np.arange(k), updated)
+        if len(empty):
+            furthest = np.argsort(similarity[np.arange(n), updated])[:len(empty)]
+            updated[furthest] = empty
+        if assignment is not None and np.array_equal(updated, assignment):
+            break
+        assignment = updated
+        centers = _cluster_weights(matrix, assignment, k)
+        norms = np.linalg.norm(centers, axis=1, keepdims=True)
+        np.divide(centers, norms, out=centers, where=norms > 0)
+    return assignment
+
+
+def silhouette(matrix, assignment, k):
+    """Mean silhouette under cosine distance, for a (sampled) TermMatrix."""
+    # Dense over just the terms the rows use
+    used, local_cols = np.unique(matrix.cols, return_inverse=True)
+    points = np.zeros((matrix.n, len(used)))
+    points[matrix.rows, local_cols] = matrix.values
+    distance = 1.0 - points @ points.T
+    membership = (assignment[:, None] == np.arange(k)[None, :]).astype(points.dtype)
+    sizes = membership.sum(axis=0)
+    totals = distance @ membership
+    own = np.arange(matrix.n), assignment
+    # Mean distance to the rest of the row's own cluster, and to the nearest other cluster
+    inner = totals[own] / np.maximum(sizes[assignment] - 1, 1)
+    means = totals / np.maximum(sizes, 1)
+    means[own] = np.inf
+    outer = means.min(axis=1)
+    scores = (outer - inner) / np.maximum(np.maximum(inner, outer), 1e-12)
+    scores[sizes[assignment] <= 1] = 0.0
+    return float(scores.mean())
+
+
+def _distinct_rows(matrix, rng):
+    # Rows projected on a random direction; equal rows collide, different ones practically never
+    direction = rng.standard_normal(len(matrix.terms))
+    projected = np.bincount(matrix.rows, weights=matrix.values * direction[matrix.cols], minlength=matrix.n)
+    return len(np.unique(projected.round(9)))
+
+
+class Theme:
+    """
+    One cluster of tasks.
+
+    Args:
+        members (ndarray): Indices of the theme's tasks in the clustered list
+        keywords (list): (term, tasks containing it), most distinctive first
+    """
+
+    def __init__(self, members, keywords):
+        self.members = members
+        self.keywords = keywords
+
+    @property
+    def size(self):
+        return len(self.members)
+
+
+def find_themes(tasks, min_themes=MIN_THEMES, max_themes=MAX_THEMES, seed=SEED):
+    """
+    Cluster tasks into themes, largest first.
+
+    Tasks without any usable word (e.g. "...", "Untitled") form a trailing
+    "other" theme with no keywords, so they neither distort a cluster nor
+    vanish from the counts.
+    """
+    if not tasks:
+        return []
+    full = tfidf(tasks)
+    indexed = np.unique(full.rows)
+    matrix = _rows(full, indexed)
+
+    themes = []
+    if len(indexed):
+        rng = np.random.default_rng(seed)
+        distinct = _distinct_rows(matrix, rng)
+        sample = np.sort(rng.choice(matrix.n, size=min(matrix.n, SILHOUETTE_SAMPLE), replace=False))
+        sampled = _rows(matrix, sample)
+        best = None
+        for k in range(min(min_themes, distinct), min(max_themes, distinct) + 1):
+            assignment = kmeans(matrix, k, rng)
+            score = silhouette(sampled, assignment[sample], k) if k > 1 else 0.0
+            if best is None or score > best[0]:
+                best = (score, k, assignment)
+        _, k, assignment = best
+        themes = _themes_with_keywords(matrix, indexed, assignment, k)
+
+    unindexed = np.setdiff1d(np.arange(len(tasks)), indexed)
+    if len(unindexed):
+        themes.append(Theme(unindexed, []))
+    return themes
+
+
+def _themes_with_keywords(matrix, indexed, assignment, k):
+    weight = _cluster_weights(matrix, assignment, k)
+    vocabulary = len(matrix.terms)
+    containing = np.bincount(assignment[matrix.rows] * vocabulary + matrix.cols,
+                             minlength=k * vocabulary).reshape(k, vocabulary)
+    sizes = np.bincount(assignment, minlength=k)
+
+    # Mean weight inside the theme minus the mean weight in the rest
+    inside = weight / sizes[:, None]
+    outside = (weight.sum(axis=0) - weight) / np.maximum(matrix.n - sizes, 1)[:, None]
+    distinctiveness = inside - outside
+
+    themes = []
+    for c in np.argsort(-sizes, kind='stable'):
+        order = np.argsort(-distinctiveness[c], kind='stable')[:KEYWORDS_PER_THEME]
+        keywords = [(matrix.terms[t], int(containing[c, t])) for t in order if containing[c, t]]
+        themes.append(Theme(indexed[assignment == c], keywords))
+    return themes
+
+
+def _count(size):
+    return f"{size} task" if size == 1 else f"{size} tasks"
+
+
+def describe(theme):
+    """Default name and description of a theme, from its keywords."""
+    words = [term for term, _ in theme.keywords]
+    if not words:
+        return "Other", f"{_count(theme.size)} without a clear subject."
+    name = " & ".join(word.capitalize() for word in words[:2])
+    listed = words[0] if len(words) == 1 else f"{', '.join(words[:-1])} and {words[-1]}"
+    return name, f"{_count(theme.size)} around {listed}."
+
+
+def naming_prompt(tasks, themes, samples=5):
+    """Keywords and sample titles per theme, for AIService.name_mindset_themes."""
+    return [{
+        'keywords': [term for term, _ in theme.keywords],
+        'titles': [tasks[i].get('title', 'Untitled') for i in theme.members[:samples]],
+    } for theme in themes]
+
+
+def mindset_map(themes, names=None):
+    """
+    The mindset map for clustered themes.
+
+    Args:
+        themes (list): Themes from `find_themes`
+        names (list): Optional {"name", "description"} per theme, replacing the keyword-based ones
+
+    Returns:
+        dict: {"name", "children": [{"name", "description", "value", "children": [{"name", "value"}]}]}
+    """
+    if not themes:
+        return dict(EMPTY_MAP)
+    children = []
+    for i, theme in enumerate(themes):
+        name, description = describe(theme)
+        if names and i < len(names) and isinstance(names[i], dict):
+            name = names[i].get('name') or name
+            description = names[i].get('description') or description
+        children.append({
+            'name': name,
+            'description': description,
+            'value': theme.size,
+            'children': [{'name': term.capitalize(), 'value': count} for term, count in theme.keywords],
+        })
+    return {'name': 'My Mindset', 'children': children}
@@ -0,0 +1,181 @@
+import logging
+import os
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Raw log collections that feed the rollups: source name and the document
+# fields used for the per-path and per-user dimensions.
+ROLLUP_SOURCES = {
+    'traffic_logs': {'source': 'traffic', 'path_field': 'path', 'user_field': 'user_email'},
+    'login_logs': {'source': 'login', 'path_field': None, 'user_field': 'email'},
+}
+
+GRANULARITIES = ('hour', 'day')
+
+
+def bucket_start(timestamp, granularity):
+    """Truncate a datetime to the start of its hour or day bucket."""
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class TrafficRollups:
+    """
+    Hourly and daily counters for traffic and login logs.
+
+    Every raw log document increments a small set of counters in
+    `traffic_rollups` (total, per path, per user) for its hour and day bucket.
+    Raw logs expire through a TTL index, so analytics are served from the
+    rollups and cost the same no matter how much history has accumulated.
+    """
+
+    def __init__(self, db, raw_ttl_days=None):
+        """
+        Initialize the rollup store.
+
+        Args:
+            db: MongoDB database instance
+            raw_ttl_days (int): Days to keep raw traffic/login logs (0 disables expiry)
+        """
+        self.db = db
+        self.rollups_collection = db['traffic_rollups']
+        if raw_ttl_days is None:
+            raw_ttl_days = int(os.getenv('TRAFFIC_LOG_TTL_DAYS', 90))
+        self.raw_ttl_days = raw_ttl_days
+
+    def ensure_indexes(self):
+        """Create the rollup lookup index and the TTL indexes on raw logs."""
+        try:
+            self.rollups_collection.create_index(
+                [('source', ASCENDING), ('granularity', ASCENDING), ('bucket', ASCENDING),
+                 ('dimension', ASCENDING), ('key', ASCENDING)],
+                unique=True,
+                name='rollup_bucket_key'
+            )
+        except Exception as e:
+            logger.error("Error creating rollup index: %s", e)
+
+        if not self.raw_ttl_days:
+            return
+        for collection_name in ROLLUP_SOURCES:
+            try:
+                self.db[collection_name].create_index(
+                    'timestamp',
+                    expireAfterSeconds=int(self.raw_ttl_days * 86400),
+                    name='timestamp_ttl'
+                )
+            except Exception as e:
+                logger.error("Error creating TTL index on %s: %s", collection_name, e)
+
+    def record(self, collection_name, docs):
+        """
+        Fold a batch of raw log documents into the rollup counters.
+
+        Counts are aggregated in memory first so a batch costs one upsert per
+        distinct (bucket, dimension, key), not one per document.
+        """
+        spec = ROLLUP_SOURCES.get(collection_name)
+        if not spec or not docs:
+            return 0
+
+        counts = {}
+        for doc in docs:
+            timestamp = doc.get('timestamp')
+            if not isinstance(timestamp, datetime):
+                continue
+            dimensions = [('total', None)]
+            if spec['path_field'] and doc.get(spec['path_field']):
+                dimensions.append(('path', doc[spec['path_field']]))
+            if doc.get(spec['user_field']):
+                dimensions.append(('user', doc[spec['user_field']]))
+
+            for granularity in GRANULARITIES:
+                bucket = bucket_start(timestamp, granularity)
+                for dimension, key in dimensions:
+                    counter_key = (granularity, bucket, dimension, key)
+                    counts[counter_key] = counts.get(counter_key, 0) + 1
+
+        operations = [
+            UpdateOne(
+                {
+                    'source': spec['source'],
+                    'granularity': granularity,
+                    'bucket': bucket,
+                    'dimension': dimension,
+                    'key': key
+                },
+                {'$inc': {'count': count}},
+                upsert=True
+            )
+            for (granularity, bucket, dimension, key), count in counts.items()
+        ]
+        if operations:
+            self.rollups_collection.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    def on_flush(self, collection_name, docs):
+        """LogBuffer flush listener."""
+        try:
+            self.record(collection_name, docs)
+        except Exception as e:
+            logger.error("Error rolling up %s: %s", collection_name, e)
+
+    def summary(self, source='traffic', granularity='day', since=None, until=None, user_email=None, top=10):
+        """
+        Build a dashboard summary from the rollups for a time range.
+
+        Args:
+            source (str): "traffic" or "login"
+            granularity (str): "hour" or "day"
+            since (datetime): Start of the range (inclusive)
+            until (datetime): End of the range (exclusive), defaults to now
+            user_email (str, optional): Restrict the series to a single user
+            top (int): Number of top paths/users to return
+
+        Returns:
+            dict: Per-bucket series, range total and top paths/users
+        """
+        until = until or datetime.utcnow()
+        if since is None:
+            since = until - (timedelta(hours=24) if granularity == 'hour' else timedelta(days=7))
+
+        query = {
+            'source': source,
+            'granularity': granularity,
+            'bucket': {'$gte': bucket_start(since, granularity), '$lt': until}
+        }
+        if user_email:
+            query['dimension'] = 'user'
+            query['key'] = user_email
+
+        series = {}
+        paths = {}
+        users = {}
+        for doc in self.rollups_collection.find(query, {'_id': 0, 'bucket': 1, 'dimension': 1, 'key': 1, 'count': 1}):
+            dimension = doc['dimension']
+            if dimension == 'total' or user_email:
+                bucket = doc['bucket'].isoformat()
+                series[bucket] = series.get(bucket, 0) + doc['count']
+            elif dimension == 'path':
+                paths[doc['key']] = paths.get(doc['key'], 0) + doc['count']
+            elif dimension == 'user':
+                users[doc['key']] = users.get(doc['key'], 0) + doc['count']
+
+        def top_items(counts):
+            ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:top]
+            return [{'key': key, 'count': count} for key, count in ranked]
+
+        return {
+            'source': source,
+            'granularity': granularity,
+            'since': since.isoformat(),
+            'until': until.isoformat(),
+            'total': sum(series.values()),
+            'series': [{'bucket': bucket, 'count': series[bucket]} for bucket in sorted(series)],
+            'top_paths': top_items(paths),
+            'top_users': top_items(users)
+        }
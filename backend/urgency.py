@@ -0,0 +1,247 @@
+"""
+Local urgency scores that pre-rank tasks for priority analysis.
+
+Each active task gets a score from features computed in one NumPy pass
+over all tasks:
+
+- keyword: the strongest urgency term in the title ("urgent", "ASAP",
+  "emergency", "blocker", ...), matched fuzzily so typos like "urgnet" or
+  "immeditately" still count. Candidate terms come from a trigram index and
+  are confirmed by Damerau-Levenshtein distance, with the first letter
+  unchanged. Terms of five to seven letters allow one edit, longer ones
+  two, and shorter ones none. Each distinct word is scored once per pass,
+  however many titles use it.
+- recency: tasks created in the last days rank higher.
+- activity: tasks with recent updates rank higher.
+- staleness: tasks untouched for weeks rank lower.
+- tasks already at priority "high" get a small boost, so rankings are stable.
+
+PRIORITY_MODE picks what happens with the ranking:
+
+- "hybrid" (default): only the PRIORITY_CANDIDATES best-ranked tasks go to
+  AIService.analyze_priority, which adjudicates them. Every other task is
+  treated as not top, which is what the model would decide for it anyway.
+- "fast": no model call. Tasks whose keyword score reaches
+  PRIORITY_FAST_THRESHOLD are top. The default, 0.7, takes a strong term
+  ("urgent", "blocker", "deadline") or a close typo of one; weak terms
+  such as "today" or "broken" only help the ranking.
+- "model": every task goes to the model, as before.
+
+Environment:
+    PRIORITY_MODE: "hybrid" (default), "fast" or "model"
+    PRIORITY_CANDIDATES: Best-ranked tasks the model adjudicates in hybrid mode, default 40
+    PRIORITY_FAST_THRESHOLD: Keyword score that makes a task top in fast mode, default 0.7
+"""
+import functools
+import math
+import os
+import re
+import time
+import warnings
+from datetime import datetime, timezone
+from itertools import chain
+
+import numpy as np
+
+HYBRID, FAST, MODEL = 'hybrid', 'fast', 'model'
+
+# Urgency terms and how strongly each one signals a top-priority task
+URGENT_TERMS = {
+    'urgent': 1.0, 'urgently': 1.0, 'asap': 1.0, 'emergency': 1.0, 'immediately': 1.0, 'immediate': 1.0,
+    'critical': 0.9, 'blocker': 0.9, 'outage': 0.9, 'hotfix': 0.9, 'blocking': 0.8, 'overdue': 0.8,
+    'deadline': 0.7, 'today': 0.6, 'tonight': 0.6, 'now': 0.6, 'broken': 0.6, 'important': 0.5,
+    'production': 0.5, 'prod': 0.5, 'fix': 0.4, 'due': 0.4,
+}
+
+# Feature weights of the combined score
+KEYWORD_WEIGHT = 1.0
+RECENCY_WEIGHT = 0.15
+ACTIVITY_WEIGHT = 0.2
+STALENESS_WEIGHT = 0.15
+HIGH_PRIORITY_WEIGHT = 0.1
+
+RECENCY_DAYS = 7         # Age at which the recency feature has fallen to 1/e
+ACTIVITY_DAYS = 7        # Updates within this window count as activity
+STALE_DAYS = 30          # Days without changes at which a task is fully stale
+RECENT_UPDATES = 20      # Only the latest updates are inspected for activity
+
+_WORD = re.compile(r"[^\W\d_]+")
+
+
+def _trigrams(word):
+    padded = f"$${word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+_TRIGRAM_INDEX = {}
+for _term in URGENT_TERMS:
+    for _gram in _trigrams(_term):
+        _TRIGRAM_INDEX.setdefault(_gram, set()).add(_term)
+
+
+def _allowed_edits(term):
+    return 0 if len(term) <= 4 else 1 if len(term) <= 7 else 2
+
+
+def edit_distance(a, b, limit):
+    """Damerau-Levenshtein distance (adjacent transpositions count once), or limit + 1 once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+@functools.lru_cache(maxsize=65536)
+def term_weight(word):
+    """Urgency weight of one lowercase word: its closest term's weight, less 20% per edit."""
+    if word in URGENT_TERMS:
+        return URGENT_TERMS[word]
+    if len(word) < 4:
+        return 0.0
+    candidates = set(chain.from_iterable(_TRIGRAM_INDEX.get(gram, ()) for gram in _trigrams(word)))
+    best = 0.0
+    for term in candidates:
+        limit = _allowed_edits(term)
+        # Typos rarely hit the first letter; requiring it keeps "argent" from reading as "urgent"
+        if limit and word[0] == term[0]:
+            distance = edit_distance(word, term, limit)
+            if distance <= limit:
+                best = max(best, URGENT_TERMS[term] * (1 - 0.2 * distance))
+    return best
+
+
+def _epoch(value):
+    """Seconds since the epoch of a stored timestamp (datetime or ISO string), or NaN."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return math.nan
+    if not isinstance(value, datetime):
+        return math.nan
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)  # stored timestamps are UTC
+    return value.timestamp()
+
+
+def _epochs(values):
+    """
+    `_epoch` over a list in one NumPy conversion.
+
+    Timestamps written by this app are naive UTC ISO strings, which
+    datetime64 parses in bulk; anything else falls back to `_epoch` per value.
+    """
+    texts = [v.isoformat() if isinstance(v, datetime) and v.tzinfo is None else v if isinstance(v, str) else
+             'NaT' if v is None else None for v in values]
+    if None not in texts:
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')
+                parsed = np.array(texts, dtype='datetime64[us]')
+            return np.where(np.isnat(parsed), np.nan, parsed.astype('int64') / 1e6)
+        except (ValueError, TypeError, DeprecationWarning):
+            pass
+    return np.array([_epoch(v) for v in values], dtype=float)
+
+
+def keyword_scores(tasks):
+    """Strongest urgency term per title; each distinct word is weighed once."""
+    words = [_WORD.findall((task.get('title') or '').lower()) for task in tasks]
+    scores = np.zeros(len(tasks))
+    flat = list(chain.from_iterable(words))
+    if flat:
+        vocabulary, inverse = np.unique(np.array(flat), return_inverse=True)
+        weights = np.fromiter((term_weight(str(word)) for word in vocabulary), float, len(vocabulary))
+        rows = np.repeat(np.arange(len(tasks)), [len(w) for w in words])
+        np.maximum.at(scores, rows, weights[inverse])
+    return scores
+
+
+def urgency_scores(tasks, now=None):
+    """
+    Combined urgency score per task, in the order given.
+
+    Returns:
+        tuple: (scores, keyword scores), both NumPy arrays
+    """
+    now = time.time() if now is None else now
+    keyword = keyword_scores(tasks)
+    created = _epochs([t.get('created_at') for t in tasks])
+    changed = _epochs([t.get('updated_at') or t.get('created_at') for t in tasks])
+    updates = [(t.get('updates') or [])[-RECENT_UPDATES:] for t in tasks]
+    update_times = _epochs([u.get('timestamp') for u in chain.from_iterable(updates)])
+    update_rows = np.repeat(np.arange(len(tasks)), [len(u) for u in updates])
+    recent_updates = np.bincount(update_rows, weights=update_times >= now - ACTIVITY_DAYS * 86400,
+                                 minlength=len(tasks))
+    high = np.array([t.get('priority') == 'high' for t in tasks], dtype=float)
+
+    # Missing timestamps (NaN) contribute nothing
+    recency = np.nan_to_num(np.exp(-np.maximum(now - created, 0) / (RECENCY_DAYS * 86400)))
+    staleness = np.nan_to_num(np.clip((now - changed) / (STALE_DAYS * 86400), 0, 1))
+    activity = 1 - np.exp(-recent_updates / 3)
+    scores = (KEYWORD_WEIGHT * keyword + RECENCY_WEIGHT * recency + ACTIVITY_WEIGHT * activity
+              - STALENESS_WEIGHT * staleness + HIGH_PRIORITY_WEIGHT * high)
+    return scores, keyword
+
+
+class PriorityScreen:
+    """
+    Local ranking for one priority analysis.
+
+    Args:
+        mode (str): HYBRID, FAST or MODEL
+        ranked (list): All tasks, most urgent first
+        candidates (list): Tasks to send to the model (empty in fast mode)
+        urgent (list): Tasks whose keyword score reaches the fast-mode threshold
+    """
+
+    def __init__(self, mode, ranked, candidates, urgent):
+        self.mode = mode
+        self.ranked = ranked
+        self.candidates = candidates
+        self.urgent = urgent
+
+    @property
+    def urgent_ids(self):
+        return [t['_id'] for t in self.urgent]
+
+    def report(self):
+        return {'mode': self.mode, 'ranked': len(self.ranked), 'sent_to_model': len(self.candidates),
+                'keyword_matches': len(self.urgent)}
+
+
+def priority_mode():
+    mode = os.getenv('PRIORITY_MODE', HYBRID).lower()
+    return mode if mode in (HYBRID, FAST, MODEL) else HYBRID
+
+
+def screen(tasks, mode=None, candidates=None, now=None):
+    """Rank tasks by local urgency and pick the ones the model adjudicates."""
+    mode = mode or priority_mode()
+    candidates = candidates if candidates is not None else int(os.getenv('PRIORITY_CANDIDATES', 40))
+    threshold = float(os.getenv('PRIORITY_FAST_THRESHOLD', 0.7))
+    tasks = list(tasks)
+    if not tasks:
+        return PriorityScreen(mode, [], [], [])
+
+    scores, keyword = urgency_scores(tasks, now)
+    order = np.argsort(-scores, kind='stable')
+    ranked = [tasks[i] for i in order]
+    urgent = [tasks[i] for i in order if keyword[i] >= threshold]
+    if mode == FAST:
+        sent = []
+    elif mode == MODEL:
+        sent = tasks
+    else:
+        sent = ranked[:candidates]
+    return PriorityScreen(mode, ranked, sent, urgent)
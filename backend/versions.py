@@ -0,0 +1,198 @@
+import functools
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+from flask import request, make_response
+
+from serialization import encode_response, negotiated_encoding, negotiated_format
+
+logger = logging.getLogger(__name__)
+
+
+def _user_key(user_email):
+    # Unowned (legacy) data is served to requests without a user_email
+    return user_email or ''
+
+
+class VersionStore:
+    """
+    Per-user monotonically increasing data versions.
+
+    Every write that can change what a user's read endpoints return bumps that
+    user's version. Writes whose owner is unknown bump a global counter that is
+    folded into every user's version, so a version never goes backwards and a
+    stale cached response can never be served as current.
+
+    Versions live in process memory; `boot_id` is part of every ETag so a
+    restarted process never matches ETags handed out by its predecessor.
+    When other processes write to the same database (`multi_process`),
+    their writes only arrive through a change stream (`external_invalidation`),
+    which lags: another worker could answer a client's next read before
+    its own write reached this one. Versioned reads therefore skip ETags and
+    the response cache in multi-process deployments. Background caches that
+    can tolerate the lag (mindset maps, label classifiers, the analysis
+    label registry) still rely on the change stream via `sees_all_writes`.
+    """
+
+    def __init__(self):
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.multi_process = False
+        self.external_invalidation = False
+        self._lock = threading.Lock()
+        self._global = 0
+        self._users = {}
+        self._listeners = []
+
+    @property
+    def authoritative(self):
+        """Whether writes reach these versions before they are acknowledged, so ETags and cached bodies are safe."""
+        return not self.multi_process
+
+    @property
+    def sees_all_writes(self):
+        """Whether every write reaches these versions, if only after the change stream's lag."""
+        return self.authoritative or self.external_invalidation
+
+    def add_listener(self, listener):
+        """
+        Register a callable notified after every bump.
+
+        Args:
+            listener: Callable taking (user_key or None for all users, kind, details)
+        """
+        self._listeners.append(listener)
+
+    def version(self, user_email=None):
+        with self._lock:
+            return self._global + self._users.get(_user_key(user_email), 0)
+
+    def bump(self, user_email=None, kind=None, notify=True, **details):
+        """
+        Bump a single user's version (None bumps the unowned data scope).
+
+        Args:
+            user_email (str): Owner of the changed data
+            kind (str): What changed ("task", "label", "folder", "agent", "timer")
+            notify (bool): Whether listeners (e.g. the change feed) are told
+            **details: Extra event payload such as the changed document id
+        """
+        key = _user_key(user_email)
+        with self._lock:
+            self._users[key] = self._users.get(key, 0) + 1
+        if notify:
+            self._notify(key, kind, details)
+
+    def bump_many(self, user_emails, kind=None, **details):
+        """Bump every distinct user in `user_emails` once."""
+        for key in {_user_key(email) for email in user_emails}:
+            self.bump(key, kind, **details)
+
+    def bump_all(self, kind=None, notify=True, **details):
+        """Bump every user's version at once, for writes with no known owner."""
+        with self._lock:
+            self._global += 1
+        if notify:
+            self._notify(None, kind, details)
+
+    def _notify(self, key, kind, details):
+        for listener in self._listeners:
+            try:
+                listener(key, kind, details)
+            except Exception as e:
+                logger.error("Listener error: %s", e)
+
+
+class ResponseCache:
+    """Bounded LRU of encoded response bodies keyed by (user, endpoint, params, version)."""
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or int(os.getenv('RESPONSE_CACHE_SIZE', 512))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def versioned_read(store, cache, endpoint, cacheable=None):
+    """
+    Decorate a GET handler with version-derived ETags and a response cache.
+
+    The user's version is read before the handler runs. A matching
+    If-None-Match is answered with 304 and a cached body for the same
+    (user, endpoint, params, version) is replayed, both without touching
+    MongoDB. Only 200 responses are cached, and they are cached after
+    compression: the negotiated Content-Encoding is part of the params, so a
+    hit is replayed without encoding the body again.
+
+    Args:
+        store (VersionStore): Source of per-user versions
+        cache (ResponseCache): Cache for serialized bodies
+        endpoint (str): Stable name used in cache keys and ETags
+        cacheable: Optional callable taking request.args; False bypasses caching
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not store.authoritative or (cacheable and not cacheable(request.args)):
+                return view(*args, **kwargs)
+
+            user_email = request.args.get('user_email')
+            # The negotiated body format (JSON or MessagePack) and encoding are part of the key
+            encoding = negotiated_encoding()
+            params = (negotiated_format(), encoding) + tuple(sorted(request.args.items(multi=True)))
+            version = store.version(user_email)
+            params_hash = hashlib.sha1(repr((endpoint, params)).encode()).hexdigest()[:12]
+            etag = f"{store.boot_id}-{version}-{params_hash}"
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+                response.set_etag(etag, weak=True)
+                return response
+
+            cache_key = (_user_key(user_email), endpoint, params, version)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                body, mimetype, content_encoding = cached
+                response = make_response(body, 200)
+                response.mimetype = mimetype
+                if content_encoding:
+                    response.headers['Content-Encoding'] = content_encoding
+                response.vary.add('Accept-Encoding')
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                content_encoding = encode_response(response, encoding)
+                cache.put(cache_key, (response.get_data(), response.mimetype, content_encoding))
+
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('Accept')
+            return response
+        return wrapper
+    return decorator
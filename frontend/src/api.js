@@ -410,7 +410,51 @@ export const api = {
     },
 
     getMindset: async () => {
-        const res = await fetch(`${API_BASE}/mindset`);
+        const query = new URLSearchParams();
+        const userEmail = getUserEmail();
+        if (userEmail) query.append('user_email', userEmail);
+        const res = await fetch(`${API_BASE}/mindset?${query.toString()}`);
         return res.json();
+    },
+
+    // Server-sent change events. `handlers` maps event kinds (task, label,
+    // folder, agent, stats, timer, reset) to callbacks. Returns an unsubscribe function.
+    // EventSource retries dropped connections itself, but stops for good on an
+    // error response (a proxy error, a server without SSE). Then the stream is
+    // reopened with backoff, and `reset` refetches what was missed meanwhile.
+    subscribeEvents: (handlers) => {
+        const query = new URLSearchParams();
+        const userEmail = getUserEmail();
+        if (userEmail) query.append('user_email', userEmail);
+        const url = `${API_BASE}/events?${query.toString()}`;
+        let source = null;
+        let reopenTimer = null;
+        let backoff = 5000;
+        let closed = false;
+
+        const open = (reopened) => {
+            source = new EventSource(url);
+            Object.entries(handlers).forEach(([kind, handler]) => {
+                source.addEventListener(kind, (event) => handler(JSON.parse(event.data || '{}')));
+            });
+            source.onopen = () => {
+                backoff = 5000;
+                if (reopened && handlers.reset) handlers.reset({});
+                reopened = false;
+            };
+            source.onerror = () => {
+                if (closed || source.readyState !== EventSource.CLOSED) return;
+                const delay = backoff * (0.5 + Math.random());
+                backoff = Math.min(backoff * 2, 300000);
+                reopenTimer = setTimeout(() => open(true), delay);
+            };
+        };
+        open(false);
+
+        return () => {
+            closed = true;
+            clearTimeout(reopenTimer);
+            source.close();
+        };
     }
 };
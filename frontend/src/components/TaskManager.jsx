@@ -534,6 +534,52 @@ export const TaskManager = () => {
         };
     }, [focusedAgentId, activeTab, selectedLabel, selectedFolder]);
 
+    // The latest fetchers, so the event stream below refetches with the
+    // current tab and filters without reconnecting when they change
+    const eventFetchersRef = useRef(null);
+    eventFetchersRef.current = { fetchTasks, fetchStats, fetchLabels, fetchFolders, fetchAgents };
+
+    // Server-pushed change events replace polling for background updates
+    // (analyses relabelling tasks, timer ticks, edits from other tabs).
+    // One stream per signed-in user, opened once for the page's lifetime;
+    // api.subscribeEvents reopens it if the browser gives up on it.
+    useEffect(() => {
+        let pendingTasks = null;
+        let pendingStats = null;
+        const fetchers = () => eventFetchersRef.current;
+        // Coalesce bursts, e.g. an analysis run touching many tasks at once
+        const refreshTasks = () => {
+            clearTimeout(pendingTasks);
+            pendingTasks = setTimeout(() => fetchers().fetchTasks(false), 250);
+        };
+        const refreshStats = () => {
+            clearTimeout(pendingStats);
+            pendingStats = setTimeout(() => fetchers().fetchStats(), 250);
+        };
+
+        const unsubscribe = api.subscribeEvents({
+            task: refreshTasks,
+            timer: refreshTasks,
+            stats: refreshStats,
+            label: () => fetchers().fetchLabels(),
+            folder: () => fetchers().fetchFolders(),
+            agent: () => fetchers().fetchAgents(),
+            reset: () => {
+                refreshTasks();
+                refreshStats();
+                fetchers().fetchLabels();
+                fetchers().fetchFolders();
+                fetchers().fetchAgents();
+            }
+        });
+
+        return () => {
+            clearTimeout(pendingTasks);
+            clearTimeout(pendingStats);
+            unsubscribe();
+        };
+    }, []);
+
     // Keyboard navigation
     useEffect(() => {
         const handleKeyDown = (event) => {